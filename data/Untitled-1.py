@@ -1,8 +1,20 @@
-import json
+import sys
+import time
+
 import mysql.connector
 from mysql.connector import Error
 import os
 
+# The field registry lives next to the main loader in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import batch_sizing
+import dimensions
+import metrics
+import property_summary
+from etl_script import fingerprinted, lookup_property_ids, match_key, natural_key
+from feed_reader import read_feed
+from field_registry import CHILD_MAPPINGS, CHILD_SOURCES, PROPERTIES, insert_statement
+
 # --- Configuration ---
 DB_CONFIG = {
     "host": "localhost",
@@ -13,13 +25,7 @@ DB_CONFIG = {
 }
 
 JSON_PATH = "full_data.json"  # change to full file path
-BATCH_SIZE = 100  # you can tune this
-
-
-# --- Load JSON data ---
-def load_data(path):
-    with open(path, 'r') as f:
-        return json.load(f)
+METRICS_PATH = "etl_metrics.json"  # run report with row counts and latency histograms
 
 
 # --- Connect to MySQL ---
@@ -29,159 +35,96 @@ def get_connection():
 
 # --- Insert batches using executemany ---
 def insert_batch(cursor, query, batch, label="batch"):
-    if not batch:
+    # One statement per chunk, sized by scripts/batch_sizing.py
+    for chunk in batch_sizing.chunks(label, batch):
+        start = time.perf_counter()
+        try:
+            cursor.executemany(query, chunk)
+        except Error as e:
+            print(f"❌ Error inserting into {label}: {e}")
+            return
+        seconds = time.perf_counter() - start
+        batch_sizing.record(label, len(chunk), seconds)
+        metrics.observe("insert_latency_seconds", seconds, table=label, sink="executemany")
+        metrics.count("rows_out", len(chunk), table=label, sink="executemany")
+
+
+# --- Insert a property batch followed by its children ---
+def flush_batch(cursor, conn, property_insert, child_inserts, pending_props):
+    if not pending_props:
         return
-    try:
-        cursor.executemany(query, batch)
-        print(f"✅ Inserted {len(batch)} rows into {label}")
-    except Error as e:
-        print(f"❌ Error inserting into {label}: {e}")
+
+    # Keys already loaded, by an earlier run or an earlier batch, are found
+    # through the natural key index; only the missing ones are inserted
+    keys = {match_key(natural_key(prop)): natural_key(prop) for prop in pending_props}
+    ids = lookup_property_ids(cursor, keys.values())
+    new_rows = {}
+    for prop in pending_props:
+        key = match_key(natural_key(prop))
+        if key not in ids and key not in new_rows:
+            new_rows[key] = PROPERTIES.extract(prop)
+
+    if new_rows:
+        # Dimension names become ids first (scripts/dimensions.py)
+        rows = dimensions.resolve_rows(cursor, conn, list(new_rows.values()))
+        insert_batch(cursor, property_insert, rows, "properties")
+        metrics.timed_commit(conn)
+        # Ids come from the unique index, not from lastrowid, so keys another
+        # loader inserted in the meantime resolve too
+        ids.update(lookup_property_ids(cursor, (keys[key] for key in new_rows)))
+
+    child_batches = [[] for _ in CHILD_MAPPINGS]
+    property_ids = set()
+
+    for prop in pending_props:
+        prop_id = ids.get(match_key(natural_key(prop)))
+        if prop_id is None:
+            continue
+        property_ids.add(prop_id)
+
+        for mapping, batch in zip(CHILD_MAPPINGS, child_batches):
+            for child in prop.get(CHILD_SOURCES[mapping.table], []):
+                values = mapping.extract(child)
+                batch.append((prop_id,) + fingerprinted(mapping.columns, values))
+
+    for mapping, query, batch in zip(CHILD_MAPPINGS, child_inserts, child_batches):
+        insert_batch(cursor, query, batch, mapping.table)
+    property_summary.refresh(cursor, property_ids)
+    metrics.timed_commit(conn)
 
 
 def main():
-    data = load_data(JSON_PATH)
     conn = get_connection()
     cursor = conn.cursor()
+    batch_sizing.read_packet_limit(cursor)
+
+    # SQL templates, generated from the field registry; a key inserted by
+    # another loader since the lookup is left as it is
+    property_insert = insert_statement("properties", PROPERTIES.columns,
+                                       " ON DUPLICATE KEY UPDATE id = id")
+    child_inserts = [
+        insert_statement(mapping.table, ("property_id",) + mapping.columns + ("row_hash",),
+                         " ON DUPLICATE KEY UPDATE id = id")
+        for mapping in CHILD_MAPPINGS
+    ]
+
+    pending_props = []  # source records of the current batch
+
+    for prop in read_feed(JSON_PATH):
+        metrics.count("rows_in")
+        pending_props.append(prop)
+
+        # Flush in batches of the size batch_sizing.py has settled on
+        if len(pending_props) >= batch_sizing.batch_rows("properties"):
+            flush_batch(cursor, conn, property_insert, child_inserts, pending_props)
+            pending_props = []
 
-    # SQL templates
-    property_insert = """INSERT INTO properties (
-        property_title, address, reviewed_status, most_recent_status, source, market,
-        occupancy, flood, street_address, city, state, zip, property_type, highway,
-        train, tax_rate, sqft_basement, htw, pool, commercial, water, sewage, year_built,
-        sqft_mu, sqft_total, parking, bed, bath, basement_yes_no, layout, net_yield,
-        irr, rent_restricted, neighborhood_rating, latitude, longitude, subdivision,
-        taxes, selling_reason, seller_retained_broker, final_reviewer, school_average
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-              %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-              %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    valuation_insert = """INSERT INTO valuations (
-        property_id, list_price, previous_rent, arv, expected_rent, zestimate,
-        rent_zestimate, low_fmr, high_fmr, redfin_value
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    hoa_insert = """INSERT INTO hoa_fees (
-        property_id, hoa, hoa_flag
-    ) VALUES (%s, %s, %s)"""
-
-    rehab_insert = """INSERT INTO rehab_estimates (
-        property_id, underwriting_rehab, rehab_calculation, paint, flooring_flag,
-        foundation_flag, roof_flag, hvac_flag, kitchen_flag, bathroom_flag,
-        appliances_flag, windows_flag, landscaping_flag, trashout_flag
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    property_batch = []
-    property_id_map = []  # tracks (temp_index, db_id) for assigning child rows
-
-    for idx, prop in enumerate(data):
-        values = (
-            prop.get("Property_Title"),
-            prop.get("Address"),
-            prop.get("Reviewed_Status"),
-            prop.get("Most_Recent_Status"),
-            prop.get("Source"),
-            prop.get("Market"),
-            prop.get("Occupancy"),
-            prop.get("Flood"),
-            prop.get("Street_Address"),
-            prop.get("City"),
-            prop.get("State"),
-            prop.get("Zip"),
-            prop.get("Property_Type"),
-            prop.get("Highway"),
-            prop.get("Train"),
-            prop.get("Tax_Rate"),
-            prop.get("SQFT_Basement"),
-            prop.get("HTW"),
-            prop.get("Pool"),
-            prop.get("Commercial"),
-            prop.get("Water"),
-            prop.get("Sewage"),
-            prop.get("Year_Built"),
-            prop.get("SQFT_MU"),
-            prop.get("SQFT_Total"),
-            prop.get("Parking"),
-            prop.get("Bed"),
-            prop.get("Bath"),
-            prop.get("BasementYesNo"),
-            prop.get("Layout"),
-            prop.get("Net_Yield"),
-            prop.get("IRR"),
-            prop.get("Rent_Restricted"),
-            prop.get("Neighborhood_Rating"),
-            prop.get("Latitude"),
-            prop.get("Longitude"),
-            prop.get("Subdivision"),
-            prop.get("Taxes"),
-            prop.get("Selling_Reason"),
-            prop.get("Seller_Retained_Broker"),
-            prop.get("Final_Reviewer"),
-            prop.get("School_Average")
-        )
-        property_batch.append(values)
-
-        # Insert in batches
-        if len(property_batch) == BATCH_SIZE or idx == len(data) - 1:
-            cursor.executemany(property_insert, property_batch)
-            conn.commit()
-            start_id = cursor.lastrowid - len(property_batch) + 1
-            for i, _ in enumerate(property_batch):
-                property_id_map.append(start_id + i)
-            print(f"🏠 Inserted {len(property_batch)} properties")
-            property_batch = []
-
-    # Second pass: Insert children
-    valuation_batch, hoa_batch, rehab_batch = [], [], []
-
-    for idx, prop in enumerate(data):
-        prop_id = property_id_map[idx]
-
-        for val in prop.get("Valuation", []):
-            valuation_batch.append((
-                prop_id,
-                val.get("List_Price"),
-                val.get("Previous_Rent"),
-                val.get("ARV"),
-                val.get("Expected_Rent"),
-                val.get("Zestimate"),
-                val.get("Rent_Zestimate"),
-                val.get("Low_FMR"),
-                val.get("High_FMR"),
-                val.get("Redfin_Value")
-            ))
-
-        for hoa in prop.get("HOA", []):
-            hoa_batch.append((
-                prop_id,
-                hoa.get("HOA"),
-                hoa.get("HOA_Flag")
-            ))
-
-        for rehab in prop.get("Rehab", []):
-            rehab_batch.append((
-                prop_id,
-                rehab.get("Underwriting_Rehab"),
-                rehab.get("Rehab_Calculation"),
-                rehab.get("Paint"),
-                rehab.get("Flooring_Flag"),
-                rehab.get("Foundation_Flag"),
-                rehab.get("Roof_Flag"),
-                rehab.get("HVAC_Flag"),
-                rehab.get("Kitchen_Flag"),
-                rehab.get("Bathroom_Flag"),
-                rehab.get("Appliances_Flag"),
-                rehab.get("Windows_Flag"),
-                rehab.get("Landscaping_Flag"),
-                rehab.get("Trashout_Flag")
-            ))
-
-    insert_batch(cursor, valuation_insert, valuation_batch, "valuations")
-    insert_batch(cursor, hoa_insert, hoa_batch, "hoa_fees")
-    insert_batch(cursor, rehab_insert, rehab_batch, "rehab_estimates")
+    flush_batch(cursor, conn, property_insert, child_inserts, pending_props)
 
     conn.commit()
     cursor.close()
     conn.close()
+    metrics.write_report(METRICS_PATH, feed=JSON_PATH, batch_sizes=batch_sizing.report())
     print("🎉 ETL completed successfully for full dataset.")
 
 
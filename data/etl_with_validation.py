@@ -1,7 +1,22 @@
-import json
+import os
+import sys
+import time
+from itertools import islice
+
 import mysql.connector
 from mysql.connector import Error
 
+# Validation and the field registry live next to the main loader in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import batch_sizing
+import dimensions
+import metrics
+import property_summary
+from etl_script import fingerprinted, lookup_property_ids, match_key, natural_key
+from feed_reader import read_feed
+from field_registry import CHILD_MAPPINGS, CHILD_SOURCES, PROPERTIES, insert_statement
+from validation import apply_coerced, validate_chunk, write_rejects
+
 # --- Configuration ---
 DB_CONFIG = {
     "host": "localhost",
@@ -13,49 +28,8 @@ DB_CONFIG = {
 
 JSON_PATH = "fake_property_data.json"
 LOG_FILE = "etl_validation_errors.log"
-BATCH_SIZE = 500  # Batch for children inserts
-
-# --- Validation Function ---
-def validate_property(prop, idx):
-    errors = []
-
-    if not prop.get("Address"):
-        errors.append("Missing Address")
-    if not prop.get("City"):
-        errors.append("Missing City")
-    if not prop.get("State"):
-        errors.append("Missing State")
-    if not prop.get("Zip"):
-        errors.append("Missing Zip")
-
-    try:
-        float(prop.get("Latitude", 0))
-        float(prop.get("Longitude", 0))
-    except (ValueError, TypeError):
-        errors.append("Invalid coordinates")
-
-    try:
-        if prop.get("Tax_Rate") and not (0 <= float(prop["Tax_Rate"]) <= 100):
-            errors.append("Invalid Tax_Rate")
-    except (ValueError, TypeError):
-        errors.append("Invalid Tax_Rate type")
-
-    try:
-        bed = int(prop.get("Bed", 0))
-        if bed < 0:
-            errors.append("Negative bed count")
-    except (ValueError, TypeError):
-        errors.append("Invalid bed count")
-
-    if prop.get("Pool") not in ("Yes", "No", None):
-        errors.append(f"Unexpected Pool value: {prop.get('Pool')}")
-
-    return errors
-
-# --- Load ---
-def load_data(path):
-    with open(path, 'r') as f:
-        return json.load(f)
+METRICS_PATH = "etl_metrics.json"  # run report with row counts and latency histograms
+
 
 # --- Get DB connection ---
 def get_connection():
@@ -63,136 +37,136 @@ def get_connection():
 
 # --- Insert batch ---
 def insert_batch(cursor, query, batch, label="batch"):
-    if not batch:
-        return
-    try:
-        cursor.executemany(query, batch)
-        print(f"✅ Inserted {len(batch)} into {label}")
-    except Error as e:
-        print(f"❌ Error inserting into {label}: {e}")
+    # One statement per chunk, sized by scripts/batch_sizing.py
+    for chunk in batch_sizing.chunks(label, batch):
+        start = time.perf_counter()
+        try:
+            cursor.executemany(query, chunk)
+        except Error as e:
+            print(f"❌ Error inserting into {label}: {e}")
+            return
+        seconds = time.perf_counter() - start
+        batch_sizing.record(label, len(chunk), seconds)
+        metrics.observe("insert_latency_seconds", seconds, table=label, sink="executemany")
+        metrics.count("rows_out", len(chunk), table=label, sink="executemany")
+
+
+def resolve_property_ids(cursor, conn, property_insert, pending):
+    keys = {match_key(natural_key(prop)): natural_key(prop) for _, prop in pending}
+    ids = lookup_property_ids(cursor, keys.values())
+
+    new_rows = {}
+    for _, prop in pending:
+        key = match_key(natural_key(prop))
+        if key not in ids and key not in new_rows:
+            new_rows[key] = PROPERTIES.extract(prop)
+
+    if new_rows:
+        try:
+            # Dimension names become ids first (scripts/dimensions.py)
+            rows = dimensions.resolve_rows(cursor, conn, list(new_rows.values()))
+            for chunk in batch_sizing.chunks("properties", rows):
+                start = time.perf_counter()
+                cursor.executemany(property_insert, chunk)
+                seconds = time.perf_counter() - start
+                batch_sizing.record("properties", len(chunk), seconds)
+                metrics.observe("insert_latency_seconds", seconds,
+                                table="properties", sink="executemany")
+                metrics.count("rows_out", len(chunk), table="properties", sink="executemany")
+            metrics.timed_commit(conn)
+        except Error as e:
+            conn.rollback()
+            print(f"❌ Property batch insert failed: {e}")
+        # Ids of the new rows come from the unique index, not from lastrowid
+        ids.update(lookup_property_ids(cursor, (keys[key] for key in new_rows)))
+
+    id_map = {}
+    for idx, prop in pending:
+        key = match_key(natural_key(prop))
+        if key in ids:
+            id_map[idx] = ids[key]
+    return id_map, sum(1 for key in new_rows if key in ids)
 
 # --- Main ETL ---
 def main():
-    data = load_data(JSON_PATH)
     conn = get_connection()
     cursor = conn.cursor()
+    batch_sizing.read_packet_limit(cursor)
     open(LOG_FILE, "w").close()
 
-    # SQL Templates
-    property_insert = """INSERT INTO properties (
-        property_title, address, reviewed_status, most_recent_status, source, market,
-        occupancy, flood, street_address, city, state, zip, property_type, highway,
-        train, tax_rate, sqft_basement, htw, pool, commercial, water, sewage, year_built,
-        sqft_mu, sqft_total, parking, bed, bath, basement_yes_no, layout, net_yield,
-        irr, rent_restricted, neighborhood_rating, latitude, longitude, subdivision,
-        taxes, selling_reason, seller_retained_broker, final_reviewer, school_average
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-              %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-              %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    valuation_insert = """INSERT INTO valuations (
-        property_id, list_price, previous_rent, arv, expected_rent, zestimate,
-        rent_zestimate, low_fmr, high_fmr, redfin_value
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    hoa_insert = """INSERT INTO hoa_fees (
-        property_id, hoa, hoa_flag
-    ) VALUES (%s, %s, %s)"""
-
-    rehab_insert = """INSERT INTO rehab_estimates (
-        property_id, underwriting_rehab, rehab_calculation, paint, flooring_flag,
-        foundation_flag, roof_flag, hvac_flag, kitchen_flag, bathroom_flag,
-        appliances_flag, windows_flag, landscaping_flag, trashout_flag
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+    # SQL Templates, generated from the field registry
+    # A key another loader inserted since the lookup keeps its row, and its
+    # id is read back with the others
+    property_insert = insert_statement("properties", PROPERTIES.columns,
+                                       " ON DUPLICATE KEY UPDATE id = id")
+    child_inserts = [
+        insert_statement(mapping.table, ("property_id",) + mapping.columns + ("row_hash",),
+                         " ON DUPLICATE KEY UPDATE id = id")
+        for mapping in CHILD_MAPPINGS
+    ]
 
     # Track inserted or existing properties
-    property_id_map = {}
+    properties_added = 0
     skipped_rows = 0
     duplicate_skips = 0
 
-    for idx, prop in enumerate(data):
-        validation_errors = validate_property(prop, idx)
-        if validation_errors:
-            with open(LOG_FILE, "a") as log:
-                log.write(f"Row {idx}: {validation_errors}\n")
-            skipped_rows += 1
-            continue
-
-        addr, city, state = prop.get("Address"), prop.get("City"), prop.get("State")
-
-        # Check for duplicate
-        cursor.execute("""
-            SELECT id FROM properties
-            WHERE address = %s AND city = %s AND state = %s
-        """, (addr, city, state))
-        row = cursor.fetchone()
-
-        if row:
-            property_id_map[idx] = row[0]
-            duplicate_skips += 1
-            continue
-
-        values = (
-            prop.get("Property_Title"), addr, prop.get("Reviewed_Status"),
-            prop.get("Most_Recent_Status"), prop.get("Source"), prop.get("Market"),
-            prop.get("Occupancy"), prop.get("Flood"), prop.get("Street_Address"),
-            city, state, prop.get("Zip"), prop.get("Property_Type"), prop.get("Highway"),
-            prop.get("Train"), prop.get("Tax_Rate"), prop.get("SQFT_Basement"),
-            prop.get("HTW"), prop.get("Pool"), prop.get("Commercial"), prop.get("Water"),
-            prop.get("Sewage"), prop.get("Year_Built"), prop.get("SQFT_MU"),
-            prop.get("SQFT_Total"), prop.get("Parking"), prop.get("Bed"), prop.get("Bath"),
-            prop.get("BasementYesNo"), prop.get("Layout"), prop.get("Net_Yield"),
-            prop.get("IRR"), prop.get("Rent_Restricted"), prop.get("Neighborhood_Rating"),
-            prop.get("Latitude"), prop.get("Longitude"), prop.get("Subdivision"),
-            prop.get("Taxes"), prop.get("Selling_Reason"), prop.get("Seller_Retained_Broker"),
-            prop.get("Final_Reviewer"), prop.get("School_Average")
-        )
-
-        try:
-            cursor.execute(property_insert, values)
-            conn.commit()
-            property_id_map[idx] = cursor.lastrowid
-        except Error as e:
-            print(f"❌ Property insert failed at row {idx}: {e}")
-            skipped_rows += 1
-
-    print(f"✅ Properties added: {len(property_id_map)} | Duplicates skipped: {duplicate_skips}")
-
-    # --- Insert child records ---
-    valuation_batch, hoa_batch, rehab_batch = [], [], []
-
-    for idx, prop in enumerate(data):
-        prop_id = property_id_map.get(idx)
-        if not prop_id:
-            continue
-
-        for val in prop.get("Valuation", []):
-            valuation_batch.append((
-                prop_id, val.get("List_Price"), val.get("Previous_Rent"), val.get("ARV"),
-                val.get("Expected_Rent"), val.get("Zestimate"), val.get("Rent_Zestimate"),
-                val.get("Low_FMR"), val.get("High_FMR"), val.get("Redfin_Value")
-            ))
-
-        for hoa in prop.get("HOA", []):
-            hoa_batch.append((prop_id, hoa.get("HOA"), hoa.get("HOA_Flag")))
-
-        for rehab in prop.get("Rehab", []):
-            rehab_batch.append((
-                prop_id, rehab.get("Underwriting_Rehab"), rehab.get("Rehab_Calculation"),
-                rehab.get("Paint"), rehab.get("Flooring_Flag"), rehab.get("Foundation_Flag"),
-                rehab.get("Roof_Flag"), rehab.get("HVAC_Flag"), rehab.get("Kitchen_Flag"),
-                rehab.get("Bathroom_Flag"), rehab.get("Appliances_Flag"), rehab.get("Windows_Flag"),
-                rehab.get("Landscaping_Flag"), rehab.get("Trashout_Flag")
-            ))
-
-    insert_batch(cursor, valuation_insert, valuation_batch, "valuations")
-    insert_batch(cursor, hoa_insert, hoa_batch, "hoa_fees")
-    insert_batch(cursor, rehab_insert, rehab_batch, "rehab_estimates")
+    def flush(pending):
+        nonlocal properties_added, skipped_rows, duplicate_skips
+        id_map, inserted = resolve_property_ids(cursor, conn, property_insert, pending)
+        properties_added += len(id_map)
+        duplicate_skips += len(id_map) - inserted
+        skipped_rows += len(pending) - len(id_map)
+
+        child_batches = [[] for _ in CHILD_MAPPINGS]
+
+        for idx, prop in pending:
+            prop_id = id_map.get(idx)
+            if not prop_id:
+                continue
+
+            for mapping, batch in zip(CHILD_MAPPINGS, child_batches):
+                for child in prop.get(CHILD_SOURCES[mapping.table], []):
+                    values = mapping.extract(child)
+                    batch.append((prop_id,) + fingerprinted(mapping.columns, values))
+
+        for mapping, query, batch in zip(CHILD_MAPPINGS, child_inserts, child_batches):
+            insert_batch(cursor, query, batch, mapping.table)
+        property_summary.refresh(cursor, id_map.values())
+        metrics.timed_commit(conn)
+
+    # Single pass: each chunk is validated as a whole, then its valid records
+    # are resolved against the natural key index and their children inserted.
+    # A chunk is as many records as batch_sizing.py currently puts in one
+    # properties statement.
+    records = read_feed(JSON_PATH)
+    row = 0
+    while True:
+        chunk = list(islice(records, batch_sizing.batch_rows("properties")))
+        if not chunk:
+            break
+
+        metrics.count("rows_in", len(chunk))
+        metrics.observe("batch_size", len(chunk))
+        columns, codes, bad_fields = validate_chunk(chunk)
+        rejected = write_rejects(LOG_FILE, range(row, row + len(chunk)), codes, bad_fields)
+        metrics.count("rejected", rejected)
+        skipped_rows += rejected
+        apply_coerced(chunk, columns)
+
+        pending = [(row + i, prop) for i, (prop, code) in enumerate(zip(chunk, codes)) if not code]
+        if pending:
+            flush(pending)
+        row += len(chunk)
+
+    print(f"✅ Properties added: {properties_added} | Duplicates skipped: {duplicate_skips}")
 
     conn.commit()
     cursor.close()
     conn.close()
 
+    metrics.count("inserted", properties_added - duplicate_skips)
+    metrics.count("duplicates", duplicate_skips)
+    metrics.write_report(METRICS_PATH, feed=JSON_PATH, batch_sizes=batch_sizing.report())
     print("🎉 ETL completed successfully.")
     if skipped_rows > 0:
         print(f"⚠️ Skipped {skipped_rows} invalid rows.")
@@ -0,0 +1,160 @@
+import threading
+
+import metrics
+
+# Rows per INSERT statement, chosen per table while the load runs. A
+# 42-column properties row is an order of magnitude bigger than a hoa_fees
+# row, so sizes are kept in rows but capped in bytes: executemany sends an
+# INSERT ... VALUES batch as one multi-row statement, which must stay below
+# max_allowed_packet. The row size is estimated from a sample of each batch.
+#
+# The size is then tuned from the observed insert and commit time of full
+# statements. Statements that take longer than TARGET_SECONDS are shrunk
+# straight away. Otherwise the controller measures rows/s over
+# SAMPLES_PER_STEP statements and grows the size by GROW as long as
+# throughput keeps improving by more than GAIN. It returns to the best size
+# seen when a bigger one does not pay off, and probes again after HOLD_STEPS
+# measurements at the best size. Each table therefore settles where more
+# rows per statement stop buying throughput.
+
+START_ROWS = 1000
+MIN_ROWS = 10
+MAX_ROWS = 50000
+TARGET_SECONDS = 1.0  # insert plus commit time per statement
+DEFAULT_PACKET = 4 << 20  # MySQL 5.7's max_allowed_packet, until the server reports its own
+PACKET_FILL = 0.5  # share of max_allowed_packet one statement may use
+SAMPLE_ROWS = 20  # rows per batch measured for the row size estimate
+GROW = 1.5
+GAIN = 0.05
+SAMPLES_PER_STEP = 3
+HOLD_STEPS = 10
+
+_lock = threading.Lock()
+_tables = {}  # table -> controller state
+_packet = [DEFAULT_PACKET]
+_workers = {}  # worker -> summary(), folded in by the coordinator
+
+def set_packet_limit(max_allowed_packet):
+    if max_allowed_packet:
+        _packet[0] = int(max_allowed_packet)
+
+def read_packet_limit(cursor):
+    cursor.execute("SELECT @@max_allowed_packet")
+    row = cursor.fetchone()
+    set_packet_limit(row[0] if row else None)
+
+def _state(table):
+    state = _tables.get(table)
+    if state is None:
+        state = _tables[table] = {
+            "rows": START_ROWS, "row_bytes": 0.0,
+            "samples": 0, "measured_rows": 0, "measured_seconds": 0.0,
+            "best_rows": None, "best_rate": 0.0, "hold": 0, "statements": 0,
+        }
+    return state
+
+def estimate_row_bytes(rows):
+    # Size of the rows as SQL literals, from up to SAMPLE_ROWS spread over
+    # the batch; repr is close to the quoted, comma-separated VALUES text
+    step = max(1, len(rows) // SAMPLE_ROWS)
+    sample = rows[::step][:SAMPLE_ROWS]
+    return sum(len(repr(row)) for row in sample) / len(sample)
+
+def _byte_cap(state):
+    if not state["row_bytes"]:
+        return MAX_ROWS
+    return max(MIN_ROWS, int(_packet[0] * PACKET_FILL / state["row_bytes"]))
+
+def batch_rows(table):
+    # The current rows per statement for a table
+    with _lock:
+        state = _state(table)
+        return max(MIN_ROWS, min(state["rows"], _byte_cap(state), MAX_ROWS))
+
+def measure_rows(table, rows):
+    # Updates the table's row size estimate, and so its packet cap
+    row_bytes = estimate_row_bytes(rows)
+    with _lock:
+        state = _state(table)
+        # Weighted so one odd batch does not swing the byte cap
+        state["row_bytes"] = row_bytes if not state["row_bytes"] else \
+            0.8 * state["row_bytes"] + 0.2 * row_bytes
+
+def chunks(table, rows):
+    # rows cut into statements; the size is read again before every slice,
+    # so record() between slices takes effect within one batch
+    if not rows:
+        return
+    measure_rows(table, rows)
+    start = 0
+    while start < len(rows):
+        size = batch_rows(table)
+        yield rows[start:start + size]
+        start += size
+
+def _move(state, rows):
+    state["rows"] = max(MIN_ROWS, min(int(rows), _byte_cap(state), MAX_ROWS))
+    state["samples"], state["measured_rows"], state["measured_seconds"] = 0, 0, 0.0
+
+def record(table, rows, seconds):
+    # Feeds back the insert plus commit time of one statement
+    metrics.observe("statement_rows", rows, table=table)
+    with _lock:
+        state = _state(table)
+        state["statements"] += 1
+        if rows < state["rows"] // 2:
+            return  # the tail of a batch says little about the setting
+        if seconds > TARGET_SECONDS:
+            _move(state, rows * max(0.5, TARGET_SECONDS / seconds))
+            if state["best_rows"] is not None:
+                state["best_rows"] = min(state["best_rows"], state["rows"])
+            return
+
+        state["samples"] += 1
+        state["measured_rows"] += rows
+        state["measured_seconds"] += seconds
+        if state["samples"] < SAMPLES_PER_STEP or not state["measured_seconds"]:
+            return
+        rate = state["measured_rows"] / state["measured_seconds"]
+
+        if state["best_rows"] is None or rate > state["best_rate"] * (1 + GAIN):
+            # Still improving: remember this size and try a bigger one
+            state["best_rows"], state["best_rate"] = state["rows"], rate
+            _move(state, state["rows"] * GROW)
+        elif state["rows"] != state["best_rows"]:
+            # The bigger size did not pay off
+            state["hold"] = HOLD_STEPS
+            _move(state, state["best_rows"])
+        else:
+            # At the best size: refresh its rate, and probe again after a while
+            state["best_rate"] = rate
+            if state["hold"]:
+                state["hold"] -= 1
+                _move(state, state["rows"])
+            else:
+                state["hold"] = HOLD_STEPS
+                _move(state, state["rows"] * GROW)
+
+def summary():
+    # {table: chosen rows per statement and what they were chosen from}
+    with _lock:
+        return {
+            table: {
+                "rows_per_statement": max(MIN_ROWS, min(state["rows"], _byte_cap(state), MAX_ROWS)),
+                "best_rows_per_second": round(state["best_rate"]),
+                "estimated_row_bytes": round(state["row_bytes"]),
+                "packet_cap_rows": _byte_cap(state),
+                "statements": state["statements"],
+            }
+            for table, state in sorted(_tables.items())
+        }
+
+def merge(worker, sizes):
+    with _lock:
+        _workers[worker] = sizes
+
+def report():
+    # This process's sizes, or each worker's after a parallel load
+    if _workers:
+        return {f"worker {worker}": sizes for worker, sizes in sorted(_workers.items())}
+    return summary()
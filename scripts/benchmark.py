@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import dimensions
+from etl_script import (CHUNK_SIZE, KEY_POSITIONS, SINKS, dedup_batch, get_connection,
+                        iter_batches, lookup_property_ids, match_key, transform_record,
+                        write_batch)
+from feed_reader import read_feed
+from generate_feed import generate_records, write_feed
+from validation import apply_coerced, validate_chunk
+
+# Times each loader stage over a feed and records rows/s and peak RSS. Every
+# stage runs in its own process that executes the pipeline up to and
+# including that stage, so its peak RSS is not hidden by a later stage. The
+# insert stage writes to MySQL (--mysql) or to MemoryConnection, an
+# in-process stand-in that answers the statements the lastrowid load issues.
+
+STAGES = ("parse", "validate", "transform", "dedup", "insert")
+TOLERANCE = 0.2  # allowed slowdown or RSS growth against a baseline report
+
+class MemoryCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        if query.startswith("SELECT address, city, state, id FROM properties"):
+            ids = self.db["properties"]
+            keys = [tuple(params[i:i + 3]) for i in range(0, len(params), 3)]
+            self.rows = [key + (ids[match_key(key)],) for key in keys if match_key(key) in ids]
+        elif query.startswith("SELECT name, id FROM dim_"):
+            ids = self.db.setdefault(query.split()[4], {})
+            self.rows = [(name, ids[name]) for name in params if name in ids]
+        elif query.startswith("SELECT @@warning_count"):
+            self.rows = [(0,)]
+        else:
+            raise NotImplementedError(f"MemoryConnection does not run: {query[:60]}")
+
+    def executemany(self, query, rows):
+        table = query.split()[2]
+        if table == "properties":
+            ids = self.db["properties"]
+            self.lastrowid = len(ids) + 1
+            for row in rows:
+                ids[match_key(tuple(row[i] for i in KEY_POSITIONS))] = len(ids) + 1
+        elif table.startswith("dim_"):
+            ids = self.db.setdefault(table, {})
+            for (name,) in rows:
+                ids.setdefault(name, len(ids) + 1)
+        else:
+            # (property_id, row_hash) is the unique key of every child table
+            seen = self.db.setdefault(table, set())
+            seen.update((row[0], row[-1]) for row in rows)
+        self.rowcount = len(rows)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+class MemoryConnection:
+    def __init__(self):
+        self.db = {"properties": {}}
+
+    def cursor(self):
+        return MemoryCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def run_stages(path, through, conn, sinks, chunk_size=CHUNK_SIZE):
+    # Runs the load pipeline up to `through` and returns {stage: [rows, seconds]}
+    last = STAGES.index(through)
+    stats = {stage: [0, 0.0] for stage in STAGES[:last + 1]}
+    cursor = conn.cursor() if last >= STAGES.index("dedup") else None
+    batches = iter_batches(read_feed(path), chunk_size)
+
+    def timed(stage, rows, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        stats[stage][0] += rows
+        stats[stage][1] += time.perf_counter() - start
+        return result
+
+    while True:
+        start = time.perf_counter()
+        records = next(batches, None)
+        stats["parse"][1] += time.perf_counter() - start
+        if records is None:
+            break
+        stats["parse"][0] += len(records)
+        if last < 1:
+            continue
+
+        columns, codes, _ = timed("validate", len(records), validate_chunk, records)
+        apply_coerced(records, columns)
+        records = [prop for prop, code in zip(records, codes) if not code]
+        if last < 2:
+            continue
+
+        batch = timed("transform", len(records),
+                      lambda: [transform_record(prop) for prop in records])
+        if last < 3:
+            continue
+
+        def dedup():
+            existing = lookup_property_ids(cursor, {key for key, _, _ in batch})
+            return dedup_batch(batch, existing)
+        prop_rows, pending_children, child_rows, _ = timed("dedup", len(batch), dedup)
+        if last < 4:
+            continue
+
+        # Rows written to every table, children included
+        written = len(prop_rows) + sum(len(rows) for rows in child_rows)
+        written += sum(len(values) for children_list in pending_children
+                       for children in children_list for values in children)
+        def insert():
+            rows = dimensions.resolve_rows(cursor, conn, prop_rows)
+            return write_batch(cursor, conn, rows, pending_children, child_rows, sinks)
+        timed("insert", written, insert)
+
+    return stats
+
+def run_stage(args):
+    # One stage in this process; prints a JSON line for the harness
+    conn = get_connection(allow_local_infile=args.sink == "load-data") if args.mysql \
+        else MemoryConnection()
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        stats = run_stages(args.feed, args.through, conn, {"default": args.sink},
+                           args.chunk_size)
+    conn.close()
+    rows, seconds = stats[args.through]
+    print(json.dumps({"stage": args.through, "rows": rows, "seconds": seconds,
+                      "peak_rss_mb": peak_rss_mb()}))
+
+def run_all(args):
+    results = {}
+    for stage in STAGES:
+        command = [sys.executable, os.path.abspath(__file__), args.feed, "--through", stage,
+                   "--chunk-size", str(args.chunk_size), "--sink", args.sink]
+        if args.mysql:
+            command.append("--mysql")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["rows_per_second"] = result["rows"] / result["seconds"] if result["seconds"] else 0.0
+        results[stage] = result
+    return results
+
+def report(results):
+    print(f"{'stage':<10} {'rows':>10} {'seconds':>9} {'rows/s':>11} {'peak RSS MB':>12}")
+    for stage, r in results.items():
+        print(f"{stage:<10} {r['rows']:>10} {r['seconds']:>9.2f} "
+              f"{r['rows_per_second']:>11.0f} {r['peak_rss_mb']:>12.1f}")
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Returns one message per stage that got slower or bigger than allowed
+    regressions = []
+    for stage, r in results.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        if r["rows_per_second"] < base["rows_per_second"] * (1 - tolerance):
+            regressions.append(f"{stage}: {r['rows_per_second']:.0f} rows/s, "
+                               f"baseline {base['rows_per_second']:.0f}")
+        if r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: peak RSS {r['peak_rss_mb']:.1f} MB, "
+                               f"baseline {base['peak_rss_mb']:.1f}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stages over a feed")
+    parser.add_argument("feed", help="feed to load, see generate_feed.py")
+    parser.add_argument("--generate", type=int, metavar="COUNT",
+                        help="first write a synthetic feed of COUNT records to FEED")
+    parser.add_argument("--mysql", action="store_true",
+                        help="insert into the DB_CONFIG database instead of the in-process "
+                             "stand-in")
+    parser.add_argument("--sink", choices=SINKS, default="executemany",
+                        help="child table backend; load-data needs --mysql")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--through", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.sink == "load-data" and not args.mysql:
+        parser.error("--sink load-data needs --mysql")
+    return args
+
+def main():
+    args = parse_args()
+    if args.through:
+        run_stage(args)
+        return
+
+    if args.generate:
+        write_feed(args.feed, generate_records(args.generate, duplicate_ratio=0.05,
+                                               invalid_ratio=0.02))
+    results = run_all(args)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"Regression in {message}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
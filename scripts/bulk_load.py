@@ -0,0 +1,175 @@
+import re
+import sys
+
+import metrics
+import property_summary
+from field_registry import CHILD_MAPPINGS, read_ddl_keys
+
+# Bulk-load mode for empty or near-empty targets. Child rows are inserted
+# without foreign key checks and without their secondary indexes; the keys
+# declared in sql/Creation tables.sql are rebuilt once at the end, after
+# which set-based queries check for orphans and duplicate natural keys.
+# properties keeps uq_properties_natural_key, because every batch looks
+# property ids up through it.
+#
+# The DDL, not the live schema, says what to rebuild, so a run that dies
+# with the keys dropped is repaired by the next --bulk-load run or by running
+# this module directly. property_summary is rebuilt in full at the end.
+# Every step takes a table name suffix, which shadow_tables.py uses to build
+# the shadow copies the same way.
+
+BULK_TABLES = tuple(mapping.table for mapping in CHILD_MAPPINGS)
+
+# Per connection; unique_checks lets InnoDB buffer secondary index changes
+# instead of reading index pages to check them on every insert
+SESSION_SETTINGS = "SET SESSION foreign_key_checks = 0, unique_checks = 0"
+
+DDL_KEYS = read_ddl_keys()
+
+def key_name(clause):
+    # uq_valuations_row for "UNIQUE KEY uq_valuations_row (...)", None for an
+    # unnamed foreign key
+    match = re.match(r"CONSTRAINT\s+(\w+)", clause, re.I) or \
+        re.match(r"(?:(?:UNIQUE|SPATIAL|FULLTEXT)\s+)?(?:KEY|INDEX)\s+(\w+)", clause, re.I)
+    return match.group(1) if match else None
+
+def is_foreign_key(clause):
+    return "FOREIGN KEY" in clause.upper()
+
+def with_suffix(clause, suffix):
+    # Points a foreign key at the parent table with the same suffix
+    return re.sub(r"(REFERENCES\s+)(\w+)", lambda m: m.group(1) + m.group(2) + suffix, clause,
+                  flags=re.I)
+
+def relax_session(cursor):
+    cursor.execute(SESSION_SETTINGS)
+
+def live_indexes(cursor, table):
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name <> 'PRIMARY'",
+        (table,)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+def live_foreign_keys(cursor, table):
+    cursor.execute(
+        "SELECT constraint_name FROM information_schema.referential_constraints "
+        "WHERE constraint_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def drop_keys(cursor, suffix="", tables=BULK_TABLES):
+    # Drops the foreign keys, then the declared secondary indexes, of each
+    # table; returns {table: [dropped names]}
+    dropped = {}
+    for base in tables:
+        table = base + suffix
+        foreign = live_foreign_keys(cursor, table)
+        if foreign:
+            cursor.execute(f"ALTER TABLE {table} "
+                           + ", ".join(f"DROP FOREIGN KEY {name}" for name in foreign))
+        declared = {key_name(clause) for clause in DDL_KEYS.get(base, ())
+                    if not is_foreign_key(clause)}
+        indexes = sorted(live_indexes(cursor, table) & declared)
+        if indexes:
+            cursor.execute(f"ALTER TABLE {table} "
+                           + ", ".join(f"DROP INDEX {name}" for name in indexes))
+        if foreign or indexes:
+            dropped[table] = foreign + indexes
+    return dropped
+
+def remove_duplicate_children(cursor, suffix="", tables=BULK_TABLES):
+    # Without the unique (property_id, row_hash) index a repeated child row
+    # is inserted again; keep the first copy so the index can be rebuilt
+    removed = 0
+    for table in (base + suffix for base in tables):
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id NOT IN ("
+            f"SELECT id FROM (SELECT MIN(id) AS id FROM {table} "
+            f"GROUP BY property_id, row_hash) AS keep)"
+        )
+        removed += cursor.rowcount
+    return removed
+
+def rebuild_keys(cursor, suffix="", tables=BULK_TABLES):
+    # Adds back every declared key that is missing, indexes before foreign
+    # keys so each foreign key finds its index. Foreign keys are added with
+    # checks off, so they are not validated here; find_orphans does that.
+    rebuilt = {}
+    for base in tables:
+        table = base + suffix
+        live = live_indexes(cursor, table)
+        clauses = [clause for clause in DDL_KEYS.get(base, ())
+                   if not is_foreign_key(clause) and key_name(clause) not in live]
+        if not live_foreign_keys(cursor, table):
+            clauses += [with_suffix(clause, suffix) for clause in DDL_KEYS.get(base, ())
+                        if is_foreign_key(clause)]
+        if clauses:
+            cursor.execute(f"ALTER TABLE {table} " + ", ".join(f"ADD {c}" for c in clauses))
+            rebuilt[table] = clauses
+    return rebuilt
+
+def find_orphans(cursor, suffix="", tables=BULK_TABLES):
+    # {table: child rows whose property does not exist}, as in
+    # sql/validation_queries.sql
+    orphans = {}
+    for table in (base + suffix for base in tables):
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {table} c "
+            f"WHERE NOT EXISTS (SELECT 1 FROM properties{suffix} p WHERE p.id = c.property_id)"
+        )
+        count = cursor.fetchone()[0]
+        if count:
+            orphans[table] = count
+    return orphans
+
+def count_duplicate_keys(cursor, suffix=""):
+    # Natural keys stored more than once; unique_checks = 0 lets InnoDB skip
+    # the uniqueness check, so it is verified here
+    cursor.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM properties{suffix} "
+        "GROUP BY address, city, state HAVING COUNT(*) > 1) AS copies"
+    )
+    return cursor.fetchone()[0]
+
+def start(cursor, suffix=""):
+    dropped = drop_keys(cursor, suffix)
+    for table, names in dropped.items():
+        print(f"Bulk load: dropped {', '.join(names)} on {table}")
+    return dropped
+
+def finish(cursor, conn, suffix=""):
+    # Rebuilds the keys and verifies the load; returns a list of problems
+    relax_session(cursor)
+    with metrics.stage("rebuild_keys"):
+        removed = remove_duplicate_children(cursor, suffix)
+        conn.commit()
+        rebuilt = rebuild_keys(cursor, suffix)
+    if removed:
+        print(f"Bulk load: removed {removed} repeated child rows")
+    for table, clauses in rebuilt.items():
+        print(f"Bulk load: rebuilt {len(clauses)} keys on {table}")
+
+    with metrics.stage("verify"):
+        problems = [f"{count} orphan rows in {table}"
+                    for table, count in find_orphans(cursor, suffix).items()]
+        duplicates = count_duplicate_keys(cursor, suffix)
+    if duplicates:
+        problems.append(f"{duplicates} natural keys stored more than once in properties{suffix}")
+    # Batches do not refresh property_summary while the child keys are gone
+    property_summary.rebuild(cursor, conn, suffix)
+    return problems
+
+if __name__ == "__main__":
+    # Rebuilds and verifies after a bulk load that did not finish
+    from etl_script import get_connection
+    conn = get_connection()
+    cursor = conn.cursor()
+    problems = finish(cursor, conn)
+    cursor.close()
+    conn.close()
+    for problem in problems:
+        print(f"Verification failed: {problem}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from feed_reader import feed_files
+
+STATE_PATH = "etl_state.sqlite"
+LOOKUP_SIZE = 500  # keys per IN (...) lookup, below SQLite's parameter limit
+
+def open_store(path=STATE_PATH, **options):
+    store = sqlite3.connect(path, **options)
+    store.execute("""CREATE TABLE IF NOT EXISTS record_fingerprints (
+        natural_key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL
+    )""")
+    store.execute("""CREATE TABLE IF NOT EXISTS load_chunks (
+        feed TEXT NOT NULL,
+        chunk TEXT NOT NULL,
+        rows INTEGER NOT NULL,
+        committed_at REAL NOT NULL,
+        PRIMARY KEY (feed, chunk)
+    )""")
+    store.commit()
+    return store
+
+def store_key(key):
+    return "\x1f".join("\\N" if v is None else str(v) for v in key)
+
+def record_fingerprint(record):
+    # --validate has already coerced the record, so DECIMAL fields are
+    # Decimal; str() keeps their scale, which the same feed always repeats
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+                           default=str)
+    return hashlib.md5(canonical.encode("utf-8")).hexdigest()
+
+def lookup_fingerprints(store, keys):
+    keys = list(keys)
+    found = {}
+    for i in range(0, len(keys), LOOKUP_SIZE):
+        chunk = keys[i:i + LOOKUP_SIZE]
+        rows = store.execute(
+            "SELECT natural_key, fingerprint FROM record_fingerprints "
+            f"WHERE natural_key IN ({', '.join(['?'] * len(chunk))})",
+            chunk
+        )
+        found.update(rows)
+    return found
+
+def filter_changed(store, records, key_func):
+    # Splits a batch of source records into the ones that are new or changed
+    # since the last committed run; unchanged records are dropped here, before
+    # any transform or database work. A key repeated inside the batch is
+    # fingerprinted over all of its records, so it is kept or skipped as a whole.
+    by_key = {}
+    for record in records:
+        by_key.setdefault(store_key(key_func(record)), []).append(record_fingerprint(record))
+    fingerprints = {
+        skey: fps[0] if len(fps) == 1 else hashlib.md5("".join(fps).encode()).hexdigest()
+        for skey, fps in by_key.items()
+    }
+    known = lookup_fingerprints(store, fingerprints)
+
+    pending = {skey: fp for skey, fp in fingerprints.items() if known.get(skey) != fp}
+    changed = {skey for skey in pending if skey in known}
+    keep = [record for record in records if store_key(key_func(record)) in pending]
+    return keep, changed, pending
+
+def save_fingerprints(store, fingerprints):
+    store.executemany(
+        "INSERT INTO record_fingerprints (natural_key, fingerprint) VALUES (?, ?) "
+        "ON CONFLICT(natural_key) DO UPDATE SET fingerprint = excluded.fingerprint",
+        fingerprints.items()
+    )
+    store.commit()
+
+# --- Load checkpoints ---
+# One row per chunk of the feed whose rows are all committed in MySQL, so
+# --resume can skip them. A feed is identified by path, size and mtime; a
+# rewritten file starts over.
+
+def feed_id(path):
+    # Changes when any of the feed's files does, so --resume never skips
+    # chunks of a different feed
+    files = feed_files(path)
+    if files == [path]:
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    digest = hashlib.md5()
+    for name in files:
+        stat = os.stat(name)
+        digest.update(f"{os.path.abspath(name)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return f"{path}:{len(files)} files:{digest.hexdigest()[:16]}"
+
+def committed_chunks(store, feed):
+    rows = store.execute("SELECT chunk FROM load_chunks WHERE feed = ?", (feed,))
+    return {row[0] for row in rows}
+
+def mark_committed(store, feed, chunk, rows):
+    store.execute(
+        "INSERT OR REPLACE INTO load_chunks (feed, chunk, rows, committed_at) VALUES (?, ?, ?, ?)",
+        (feed, chunk, rows, time.time())
+    )
+    store.commit()
+
+def clear_chunks(store, feed):
+    store.execute("DELETE FROM load_chunks WHERE feed = ?", (feed,))
+    store.commit()
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+import metrics
+from field_registry import PROPERTIES
+
+# Resolves the names of low-cardinality properties attributes to the ids of
+# their dimension tables (field_registry.DIMENSIONS). Each dimension keeps a
+# bounded LRU cache of name -> id per process. A batch costs one SELECT per
+# dimension with names outside the cache, plus one INSERT and a second
+# SELECT when some of those names are new. Names are committed before their
+# ids are cached, so a batch that rolls back never leaves a cached id behind.
+
+CACHE_SIZE = 4096  # names kept per dimension
+LOOKUP_SIZE = 500  # names per IN (...) lookup
+
+# (position in a properties row, dimension table)
+POSITIONS = tuple(
+    (PROPERTIES.columns.index(column), table) for column, table in PROPERTIES.dimensions.items()
+)
+
+_lock = threading.Lock()
+_caches = {table: OrderedDict() for _, table in POSITIONS}
+
+def dimension_name(value):
+    # The name column is a binary string; non-string feed values are stored
+    # as their text
+    return value if isinstance(value, str) else str(value)
+
+def fetch_ids(cursor, table, names):
+    found = {}
+    for i in range(0, len(names), LOOKUP_SIZE):
+        chunk = names[i:i + LOOKUP_SIZE]
+        cursor.execute(
+            f"SELECT name, id FROM {table} WHERE name IN ({', '.join(['%s'] * len(chunk))})",
+            chunk
+        )
+        found.update(cursor.fetchall())
+    return found
+
+def cache_ids(table, ids):
+    cache = _caches[table]
+    with _lock:
+        for name, dim_id in ids.items():
+            cache[name] = dim_id
+            cache.move_to_end(name)
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+def resolve(cursor, conn, table, names):
+    # {name: id} for every name, adding the ones the table does not have yet
+    cache = _caches[table]
+    ids, missing = {}, []
+    with _lock:
+        for name in names:
+            dim_id = cache.get(name)
+            if dim_id is None:
+                missing.append(name)
+            else:
+                cache.move_to_end(name)
+                ids[name] = dim_id
+    metrics.count("dimension_cache_hits", len(ids), dimension=table)
+    if not missing:
+        return ids
+
+    metrics.count("dimension_cache_misses", len(missing), dimension=table)
+    found = fetch_ids(cursor, table, missing)
+    new = [name for name in missing if name not in found]
+    if new:
+        # A concurrent loader may add the same name first; the unique index
+        # keeps one row and the second SELECT returns its id
+        cursor.executemany(
+            f"INSERT INTO {table} (name) VALUES (%s) ON DUPLICATE KEY UPDATE id = id",
+            [(name,) for name in new]
+        )
+        metrics.timed_commit(conn)
+        metrics.count("dimension_rows_added", len(new), dimension=table)
+        found.update(fetch_ids(cursor, table, new))
+    cache_ids(table, found)
+    ids.update(found)
+    return ids
+
+def resolve_rows(cursor, conn, rows):
+    # properties rows with every dimension name replaced by its id
+    rows = [list(row) for row in rows]
+    for position, table in POSITIONS:
+        names = {dimension_name(row[position]) for row in rows if row[position] is not None}
+        if not names:
+            continue
+        ids = resolve(cursor, conn, table, names)
+        for row in rows:
+            if row[position] is not None:
+                row[position] = ids[dimension_name(row[position])]
+    return [tuple(row) for row in rows]
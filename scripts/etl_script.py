@@ -1,7 +1,40 @@
-import json
+import argparse
+import contextlib
+import cProfile
+import hashlib
+import multiprocessing
+import os
+import pstats
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
 import mysql.connector
 from mysql.connector import Error
 
+import batch_sizing
+import bulk_load
+import dimensions
+import feed_reader
+import file_sinks
+import memory_budget
+import metrics
+import property_summary
+import seen_keys
+import shadow_tables
+from checkpoints import (STATE_PATH, clear_chunks, committed_chunks, feed_id, filter_changed,
+                         mark_committed, open_store, save_fingerprints, store_key)
+from field_registry import (CHILD_MAPPINGS, CHILD_SOURCES, PROPERTIES, decimal_scales,
+                            insert_statement)
+from validation import apply_coerced, validate_chunk, write_rejects
+
 DB_CONFIG = {
     "host": "localhost",
     "port": 3306,
@@ -11,161 +44,1269 @@ DB_CONFIG = {
 }
 
 JSON_PATH = "fake_property_data.json"
-CHUNK_SIZE = 1000
+LOG_FILE = "etl_validation_errors.log"
+CHUNK_SIZE = 1000  # records per batch with --workers; other modes size batches with batch_sizing.py
+SINKS = ("executemany", "load-data")
+TARGETS = ("mysql",) + tuple(file_sinks.FORMATS) + ("null",)
+EXPORT_DIR = "export"
+
+def iter_batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+def get_connection(**options):
+    return mysql.connector.connect(**DB_CONFIG, autocommit=False, connection_timeout=30, **options)
+
+def match_key(key):
+    # The key columns are utf8mb4_bin: binary strings that ignore trailing
+    # spaces. This is that comparison exactly, so Python-side matches agree
+    # with the unique (address, city, state) index.
+    return tuple(v.rstrip(" ") if isinstance(v, str) else v for v in key)
+
+def lookup_property_ids(cursor, keys, suffix=""):
+    # One indexed IN lookup per batch instead of preloading the whole table
+    keys = list(keys)
+    if not keys:
+        return {}
+    cursor.execute(
+        f"SELECT address, city, state, id FROM properties{suffix} "
+        f"WHERE (address, city, state) IN ({', '.join(['(%s, %s, %s)'] * len(keys))})",
+        [value for key in keys for value in key]
+    )
+    return {match_key(row[:3]): row[3] for row in cursor.fetchall()}
+
+# --- Child row fingerprints ---
+# Child rows carry an MD5 of their normalised values in row_hash, unique per
+# property_id, so duplicates are rejected by the index instead of a Python set
+# of every existing row. The normalisation matches what CAST(col AS CHAR)
+# returns for the stored value, which lets sql/add_child_row_hash.sql backfill
+# existing rows with the same formula.
+
+ROW_HASH = "row_hash"
+BINARY_COLUMNS = {ROW_HASH}  # sent as bytes, spooled as hex for LOAD DATA
+
+# Scale of every DECIMAL child column, from sql/Creation tables.sql
+DECIMAL_SCALES = {
+    column: scale for mapping in CHILD_MAPPINGS for column, scale in decimal_scales(mapping).items()
+}
+
+def _fingerprint_field(column, value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    scale = DECIMAL_SCALES.get(column)
+    if scale is not None:
+        try:
+            number = Decimal(repr(value) if isinstance(value, float) else str(value).strip())
+            number = number.quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+        except (InvalidOperation, ValueError):
+            return str(value)
+        return format(number if number else abs(number), "f")
+    return str(value)
+
+def row_fingerprint(columns, values):
+    joined = "\x1f".join(_fingerprint_field(col, val) for col, val in zip(columns, values))
+    return hashlib.md5(joined.encode("utf-8")).digest()
+
+def fingerprinted(columns, values):
+    return values + (row_fingerprint(columns, values),)
+
+# --- Sinks ---
+# Rows reach MySQL either through executemany with bound parameters or as a
+# TSV spool file loaded with LOAD DATA LOCAL INFILE.
+
+def _tsv_field(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        # Plain notation: DECIMAL columns should never see 1e-05
+        return format(Decimal(repr(value)), "f")
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    if isinstance(value, bytes):
+        return value.hex()
+    return (str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+            .replace("\0", "\\0"))
+
+def load_data_infile(cursor, table, columns, rows):
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n",
+                                     suffix=".tsv", delete=False) as spool:
+        for row in rows:
+            spool.write("\t".join(map(_tsv_field, row)))
+            spool.write("\n")
+    targets = [f"@{col}" if col in BINARY_COLUMNS else col for col in columns]
+    assignments = [f"{col} = UNHEX(@{col})" for col in columns if col in BINARY_COLUMNS]
+    set_clause = f" SET {', '.join(assignments)}" if assignments else ""
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(targets)}){set_clause}",
+            (spool.name,)
+        )
+    finally:
+        os.remove(spool.name)
+
+    # LOCAL loads downgrade conversion errors to warnings, so surface them
+    cursor.execute("SELECT @@warning_count")
+    warnings = cursor.fetchone()[0]
+    if warnings:
+        print(f"LOAD DATA into {table} raised {warnings} warnings")
 
-def load_data(path):
-    with open(path, 'r') as f:
-        return json.load(f)
+def sink_for(sinks, table):
+    return sinks.get(table, sinks["default"])
 
-def get_connection():
-    return mysql.connector.connect(**DB_CONFIG, autocommit=False, connection_timeout=30)
+def write_rows(cursor, sink, query, table, columns, rows):
+    start = time.perf_counter()
+    if sink == "load-data":
+        load_data_infile(cursor, table, columns, rows)
+    else:
+        cursor.executemany(query, rows)
+    metrics.observe("insert_latency_seconds", time.perf_counter() - start, table=table, sink=sink)
+    metrics.count("rows_out", len(rows), table=table, sink=sink)
 
-def preload_existing_properties(cursor):
-    cursor.execute("SELECT address, city, state, id FROM properties")
-    return {(row[0], row[1], row[2]): row[3] for row in cursor.fetchall()}
+def report_throughput():
+    for labels, (_, seconds) in sorted(metrics.histogram_totals("insert_latency_seconds").items()):
+        rows = metrics.value("rows_out", **dict(labels))
+        rate = rows / seconds if seconds else 0.0
+        table, sink = dict(labels)["table"], dict(labels)["sink"]
+        print(f"{table} via {sink}: {rows} rows in {seconds:.2f}s ({rate:.0f} rows/s)")
 
-def preload_existing_child_rows(cursor, table, fields):
-    cursor.execute(f"SELECT property_id, {', '.join(fields)} FROM {table}")
-    return set(tuple(row) for row in cursor.fetchall())
+# --- Transient errors ---
+# Deadlocks and lock wait timeouts roll back the transaction; lost or refused
+# connections need a new session. Both are retried with backoff by replaying
+# the whole batch, which is safe because every write is idempotent: parents
+# are deduplicated by the natural key index and children by row_hash.
 
-def insert_in_chunks(cursor, conn, query, data, label="batch", chunk_size=CHUNK_SIZE):
-    total = len(data)
-    for i in range(0, total, chunk_size):
-        chunk = data[i:i + chunk_size]
+LOCK_ERRORS = {1205, 1213}  # lock wait timeout, deadlock
+DUPLICATE_KEY = 1062
+CONNECTION_ERRORS = {2003, 2006, 2013, 2055}  # can't connect, gone away, lost connection
+RETRIES = 5
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled on every attempt
+RETRY_MAX_DELAY = 30.0
+
+def is_transient(error):
+    return getattr(error, "errno", None) in LOCK_ERRORS | CONNECTION_ERRORS
+
+def retry_delay(attempt, backoff=RETRY_BACKOFF):
+    # Exponential with jitter so parallel workers do not retry in lockstep
+    return min(RETRY_MAX_DELAY, backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def insert_in_chunks(cursor, conn, query, data, label="batch", columns=(), sink="executemany"):
+    # One statement and commit per chunk, sized by batch_sizing.py
+    failed = 0
+    for chunk in batch_sizing.chunks(label, data):
         try:
-            cursor.executemany(query, chunk)
-            conn.commit()
-            print(f"Inserted {len(chunk)} into {label} ({i + 1}/{total})")
+            start = time.perf_counter()
+            write_rows(cursor, sink, query, label, columns, chunk)
+            metrics.timed_commit(conn)
+            batch_sizing.record(label, len(chunk), time.perf_counter() - start)
         except Error as e:
+            # Transient errors abort the batch so write_with_retry can replay it
+            if is_transient(e):
+                raise
             print(f"Failed chunk insert into {label}: {e}")
+            failed += len(chunk)
+    return failed
 
-def main():
-    data = load_data(JSON_PATH)
-    conn = get_connection()
-    cursor = conn.cursor()
+# Column lists and statements come from the field registry (field_registry.py).
+# Statements take a table name suffix so --refresh can load shadow tables.
+PROPERTY_COLUMNS = PROPERTIES.columns
+
+CHILD_INSERT_SUFFIX = " ON DUPLICATE KEY UPDATE id = id"
+
+# (table, value columns after property_id, insert statement)
+CHILD_TABLES = tuple(
+    (mapping.table, mapping.columns + (ROW_HASH,),
+     insert_statement(mapping.table, ("property_id",) + mapping.columns + (ROW_HASH,),
+                      CHILD_INSERT_SUFFIX))
+    for mapping in CHILD_MAPPINGS
+)
+
+def property_insert(suffix=""):
+    return insert_statement("properties" + suffix, PROPERTY_COLUMNS)
+
+def child_insert(table, columns, suffix=""):
+    return insert_statement(table + suffix, ("property_id",) + columns, CHILD_INSERT_SUFFIX)
 
-    existing_props = preload_existing_properties(cursor)
+KEY_COLUMNS = ("address", "city", "state")
+KEY_POSITIONS = tuple(PROPERTY_COLUMNS.index(col) for col in KEY_COLUMNS)
+
+def natural_key(prop):
+    return (prop.get("Address"), prop.get("City"), prop.get("State"))
+
+def record_match_key(prop):
+    return match_key(natural_key(prop))
+
+def transform_record(prop):
+    # Single traversal of a source record: the parent row plus its Valuation,
+    # HOA and Rehab rows, which get their property_id once the parent has one.
+    key = natural_key(prop)
+
+    prop_row = PROPERTIES.extract(prop)
+    children = tuple(
+        [fingerprinted(mapping.columns, mapping.extract(row))
+         for row in prop.get(CHILD_SOURCES[mapping.table], [])]
+        for mapping in CHILD_MAPPINGS
+    )
+    return key, prop_row, children
+
+def new_child_rows(budget=None):
+    # One row list per child table; under --max-memory they spill to disk
+    if budget is None:
+        return tuple([] for _ in CHILD_TABLES)
+    return tuple(memory_budget.SpillList(budget, table, len(CHILD_TABLES))
+                 for table, _, _ in CHILD_TABLES)
+
+def attach_children(child_rows, prop_id, children):
+    for rows, values_list in zip(child_rows, children):
+        rows.extend((prop_id,) + values for values in values_list)
+
+def dedup_batch(batch, existing_props, budget=None):
+    # Splits a transformed batch into new parent rows and child rows. Keys that
+    # already have an id get their children attached straight away.
     prop_rows = []
-    index_id_map = {}
+    pending = {}  # match key -> position in prop_rows
+    pending_children = []  # children of prop_rows, waiting for their parent id
+    child_rows = new_child_rows(budget)
     duplicate_count = 0
 
-    property_insert = """INSERT INTO properties (
-        property_title, address, reviewed_status, most_recent_status, source, market,
-        occupancy, flood, street_address, city, state, zip, property_type, highway,
-        train, tax_rate, sqft_basement, htw, pool, commercial, water, sewage, year_built,
-        sqft_mu, sqft_total, parking, bed, bath, basement_yes_no, layout, net_yield,
-        irr, rent_restricted, neighborhood_rating, latitude, longitude, subdivision,
-        taxes, selling_reason, seller_retained_broker, final_reviewer, school_average
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-              %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-              %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    for idx, prop in enumerate(data):
-        key = (prop.get("Address"), prop.get("City"), prop.get("State"))
+    for key, prop_row, children in batch:
+        key = match_key(key)
         if key in existing_props:
-            index_id_map[idx] = existing_props[key]
+            attach_children(child_rows, existing_props[key], children)
             duplicate_count += 1
             continue
 
-        row = (
-            prop.get("Property_Title"), prop.get("Address"), prop.get("Reviewed_Status"),
-            prop.get("Most_Recent_Status"), prop.get("Source"), prop.get("Market"),
-            prop.get("Occupancy"), prop.get("Flood"), prop.get("Street_Address"),
-            prop.get("City"), prop.get("State"), prop.get("Zip"), prop.get("Property_Type"),
-            prop.get("Highway"), prop.get("Train"), prop.get("Tax_Rate"), prop.get("SQFT_Basement"),
-            prop.get("HTW"), prop.get("Pool"), prop.get("Commercial"), prop.get("Water"),
-            prop.get("Sewage"), prop.get("Year_Built"), prop.get("SQFT_MU"),
-            prop.get("SQFT_Total"), prop.get("Parking"), prop.get("Bed"), prop.get("Bath"),
-            prop.get("BasementYesNo"), prop.get("Layout"), prop.get("Net_Yield"),
-            prop.get("IRR"), prop.get("Rent_Restricted"), prop.get("Neighborhood_Rating"),
-            prop.get("Latitude"), prop.get("Longitude"), prop.get("Subdivision"),
-            prop.get("Taxes"), prop.get("Selling_Reason"), prop.get("Seller_Retained_Broker"),
-            prop.get("Final_Reviewer"), prop.get("School_Average")
+        # A repeated key inside the batch would trip the unique index, so its
+        # children are merged into the first occurrence
+        if key in pending:
+            pending_children[pending[key]].append(children)
+            duplicate_count += 1
+            continue
+
+        pending[key] = len(prop_rows)
+        prop_rows.append(prop_row)
+        pending_children.append([children])
+
+    return prop_rows, pending_children, child_rows, duplicate_count
+
+def write_batch(cursor, conn, prop_rows, pending_children, child_rows, sinks, suffix=""):
+    # Child ids come from lastrowid, which only executemany reports reliably.
+    # A multi-row INSERT gets consecutive ids starting at its lastrowid, so
+    # each statement's children are attached from its own lastrowid.
+    label = "properties" + suffix
+    offset = 0
+    failed = 0
+    for chunk in batch_sizing.chunks(label, prop_rows):
+        start = time.perf_counter()
+        try:
+            write_rows(cursor, "executemany", property_insert(suffix), label, PROPERTY_COLUMNS,
+                       chunk)
+            metrics.timed_commit(conn)
+        except Error as e:
+            if e.errno != DUPLICATE_KEY:
+                raise
+            conn.rollback()
+            ids = insert_properties_singly(cursor, conn, chunk, suffix)
+        else:
+            batch_sizing.record(label, len(chunk), time.perf_counter() - start)
+            ids = range(cursor.lastrowid, cursor.lastrowid + len(chunk))
+        for prop_id, children_list in zip(ids, pending_children[offset:offset + len(chunk)]):
+            if prop_id is None:
+                # No row to attach the children to; they are never written
+                # with a NULL property_id
+                failed += 1
+                continue
+            for children in children_list:
+                attach_children(child_rows, prop_id, children)
+        offset += len(chunk)
+
+    for (table, columns, query), rows in zip(CHILD_TABLES, child_rows):
+        if suffix:
+            query = child_insert(table, columns, suffix)
+        for part in memory_budget.row_chunks(rows):
+            failed += insert_in_chunks(cursor, conn, query, part, table + suffix,
+                                       columns=("property_id",) + columns,
+                                       sink=sink_for(sinks, table))
+    return failed
+
+def insert_properties_singly(cursor, conn, rows, suffix=""):
+    # Another loader inserted one of the keys after the batch's lookup, which
+    # failed the whole statement. Rows go in one at a time instead, and the
+    # ones whose key now exists take the existing id. Returns the ids in row
+    # order, with None for a key that is gone again by the time it is looked
+    # up, for example deleted by a concurrent --refresh.
+    label = "properties" + suffix
+    ids = []
+    for row in rows:
+        try:
+            write_rows(cursor, "executemany", property_insert(suffix), label, PROPERTY_COLUMNS,
+                       [row])
+            metrics.timed_commit(conn)
+            ids.append(cursor.lastrowid)
+        except Error as e:
+            if e.errno != DUPLICATE_KEY:
+                raise
+            conn.rollback()
+            key = tuple(row[i] for i in KEY_POSITIONS)
+            prop_id = lookup_property_ids(cursor, [key], suffix).get(match_key(key))
+            metrics.count("duplicate_key_races", table=label)
+            if prop_id is None:
+                print(f"Failed insert into {label}: {key} was a duplicate but is gone again")
+            ids.append(prop_id)
+    return ids
+
+def load_batch(cursor, conn, batch, sinks, suffix="", budget=None):
+    existing_props = lookup_property_ids(cursor, {key for key, _, _ in batch}, suffix)
+    prop_rows, pending_children, child_rows, duplicate_count = dedup_batch(batch, existing_props,
+                                                                           budget)
+    failed = write_batch(cursor, conn, prop_rows, pending_children, child_rows, sinks, suffix)
+    return len(prop_rows), duplicate_count, failed
+
+# --- Staging load mode ---
+# Parents and children are staged under their natural key in session-local
+# temporary tables and ids are resolved with one INSERT ... SELECT join per
+# table, so concurrent loaders never depend on consecutive auto-increment ids.
+
+def _key_join(left, right):
+    return " AND ".join(f"{left}.{col} <=> {right}.{col}" for col in KEY_COLUMNS)
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+STAGING_PROPERTY_INSERT = (
+    f"INSERT INTO stg_properties ({', '.join(PROPERTY_COLUMNS)}) "
+    f"VALUES ({_placeholders(len(PROPERTY_COLUMNS))})"
+)
+
+def property_resolve(suffix=""):
+    table = "properties" + suffix
+    return (
+        f"INSERT INTO {table} ({', '.join(PROPERTY_COLUMNS)}) "
+        f"SELECT {', '.join('s.' + col for col in PROPERTY_COLUMNS)} "
+        f"FROM stg_properties s LEFT JOIN {table} p ON {_key_join('p', 's')} "
+        f"WHERE p.id IS NULL "
+        # A concurrent loader may insert the same key between the join and the write
+        f"ON DUPLICATE KEY UPDATE id = {table}.id"
+    )
+
+def staging_child_insert(table, columns):
+    staged = KEY_COLUMNS + columns
+    return (
+        f"INSERT INTO stg_{table} ({', '.join(staged)}) "
+        f"VALUES ({_placeholders(len(staged))})"
+    )
+
+def child_resolve(table, columns, suffix=""):
+    # Rows already present are skipped by the (property_id, row_hash) index
+    return (
+        f"INSERT INTO {table}{suffix} (property_id, {', '.join(columns)}) "
+        f"SELECT p.id, {', '.join('s.' + col for col in columns)} "
+        f"FROM stg_{table} s JOIN properties{suffix} p ON {_key_join('p', 's')} "
+        f"ON DUPLICATE KEY UPDATE id = {table}{suffix}.id"
+    )
+
+def create_staging_tables(cursor):
+    # Not LIKE properties: temporary tables cannot have its SPATIAL index
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS stg_properties "
+        f"SELECT {', '.join(PROPERTY_COLUMNS)} FROM properties LIMIT 0"
+    )
+    for table, columns, _ in CHILD_TABLES:
+        # Copies the column types of the live tables without any rows
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS stg_{table} "
+            f"SELECT {', '.join('p.' + col for col in KEY_COLUMNS)}, "
+            f"{', '.join('c.' + col for col in columns)} "
+            f"FROM properties p JOIN {table} c ON c.property_id = p.id LIMIT 0"
         )
-        prop_rows.append((idx, row))
-
-    new_ids = []
-    for i in range(0, len(prop_rows), CHUNK_SIZE):
-        chunk = prop_rows[i:i + CHUNK_SIZE]
-        chunk_data = [row for _, row in chunk]
-        cursor.executemany(property_insert, chunk_data)
-        conn.commit()
-        first_id = cursor.lastrowid
-        for j, (orig_idx, _) in enumerate(chunk):
-            real_id = first_id + j
-            index_id_map[orig_idx] = real_id
-
-    print(f"Inserted new properties: {len(prop_rows)} | Skipped duplicates: {duplicate_count}")
-
-    # Child insert statements
-    valuation_insert = """INSERT INTO valuations (
-        property_id, list_price, previous_rent, arv, expected_rent, zestimate,
-        rent_zestimate, low_fmr, high_fmr, redfin_value
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    hoa_insert = """INSERT INTO hoa_fees (
-        property_id, hoa, hoa_flag
-    ) VALUES (%s, %s, %s)"""
-
-    rehab_insert = """INSERT INTO rehab_estimates (
-        property_id, underwriting_rehab, rehab_calculation, paint, flooring_flag,
-        foundation_flag, roof_flag, hvac_flag, kitchen_flag, bathroom_flag,
-        appliances_flag, windows_flag, landscaping_flag, trashout_flag
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-
-    existing_valuations = preload_existing_child_rows(cursor, "valuations", [
-        "list_price", "previous_rent", "arv", "expected_rent", "zestimate",
-        "rent_zestimate", "low_fmr", "high_fmr", "redfin_value"
-    ])
-
-    existing_hoas = preload_existing_child_rows(cursor, "hoa_fees", [
-        "hoa", "hoa_flag"
-    ])
-
-    existing_rehabs = preload_existing_child_rows(cursor, "rehab_estimates", [
-        "underwriting_rehab", "rehab_calculation", "paint", "flooring_flag",
-        "foundation_flag", "roof_flag", "hvac_flag", "kitchen_flag", "bathroom_flag",
-        "appliances_flag", "windows_flag", "landscaping_flag", "trashout_flag"
-    ])
-
-    valuation_rows, hoa_rows, rehab_rows = [], [], []
-
-    for idx, prop in enumerate(data):
-        prop_id = index_id_map.get(idx)
-        if not prop_id:
+
+def resolve_staged(cursor, table, query):
+    start = time.perf_counter()
+    cursor.execute(query)
+    metrics.observe("insert_latency_seconds", time.perf_counter() - start,
+                    table=table, sink="staging-resolve")
+    metrics.count("rows_out", cursor.rowcount, table=table, sink="staging-resolve")
+    return cursor.rowcount
+
+def write_staged(cursor, sink, query, table, columns, rows):
+    # Staging statements are sized like the others; the batch commits once
+    # after the resolve joins, so only the statement time is fed back
+    for chunk in batch_sizing.chunks(table, rows):
+        start = time.perf_counter()
+        write_rows(cursor, sink, query, table, columns, chunk)
+        batch_sizing.record(table, len(chunk), time.perf_counter() - start)
+
+def load_batch_staged(cursor, conn, batch, sinks, suffix="", budget=None):
+    parents = {}
+    child_rows = new_child_rows(budget)
+
+    for key, prop_row, children in batch:
+        parents.setdefault(match_key(key), prop_row)
+        for rows, values_list in zip(child_rows, children):
+            rows.extend(key + values for values in values_list)
+
+    cursor.execute("DELETE FROM stg_properties")
+    for table, _, _ in CHILD_TABLES:
+        cursor.execute(f"DELETE FROM stg_{table}")
+
+    write_staged(cursor, sink_for(sinks, "properties"), STAGING_PROPERTY_INSERT,
+                 "stg_properties", PROPERTY_COLUMNS, list(parents.values()))
+    for (table, columns, _), rows in zip(CHILD_TABLES, child_rows):
+        for part in memory_budget.row_chunks(rows):
+            write_staged(cursor, sink_for(sinks, table), staging_child_insert(table, columns),
+                         f"stg_{table}", KEY_COLUMNS + columns, part)
+
+    try:
+        inserted = resolve_staged(cursor, "properties" + suffix, property_resolve(suffix))
+        for table, columns, _ in CHILD_TABLES:
+            resolve_staged(cursor, table + suffix, child_resolve(table, columns, suffix))
+        metrics.timed_commit(conn)
+    except Error as e:
+        if is_transient(e):
+            raise
+        conn.rollback()
+        print(f"Failed staged batch: {e}")
+        return 0, 0, len(batch)
+
+    return inserted, len(batch) - inserted, 0
+
+# --- Incremental mode ---
+# A local SQLite store (checkpoints.py) remembers a fingerprint of every
+# source record that was committed. Unchanged records are skipped before they
+# are transformed; changed ones rewrite their parent row and drop child rows
+# that are no longer in the feed, and the regular load adds the new children.
+
+def property_update(suffix=""):
+    return (
+        f"UPDATE properties{suffix} SET {', '.join(col + ' = %s' for col in PROPERTY_COLUMNS)} "
+        f"WHERE address = %s AND city = %s AND state = %s"
+    )
+
+def refresh_changed(cursor, conn, batch, changed, suffix=""):
+    # Repeated keys in the batch share one parent, so their children are pooled
+    updates = {}
+    for key, prop_row, children in batch:
+        skey = store_key(match_key(key))
+        if skey not in changed:
             continue
+        _, _, hashes = updates.setdefault(skey, [key, prop_row, tuple(set() for _ in CHILD_TABLES)])
+        for table_hashes, values_list in zip(hashes, children):
+            table_hashes.update(values[-1] for values in values_list)
 
-        for val in prop.get("Valuation", []):
-            row = (
-                prop_id, val.get("List_Price"), val.get("Previous_Rent"), val.get("ARV"),
-                val.get("Expected_Rent"), val.get("Zestimate"), val.get("Rent_Zestimate"),
-                val.get("Low_FMR"), val.get("High_FMR"), val.get("Redfin_Value")
-            )
-            if row not in existing_valuations:
-                valuation_rows.append(row)
-
-        for hoa in prop.get("HOA", []):
-            row = (prop_id, hoa.get("HOA"), hoa.get("HOA_Flag"))
-            if row not in existing_hoas:
-                hoa_rows.append(row)
-
-        for rehab in prop.get("Rehab", []):
-            row = (
-                prop_id, rehab.get("Underwriting_Rehab"), rehab.get("Rehab_Calculation"),
-                rehab.get("Paint"), rehab.get("Flooring_Flag"), rehab.get("Foundation_Flag"),
-                rehab.get("Roof_Flag"), rehab.get("HVAC_Flag"), rehab.get("Kitchen_Flag"),
-                rehab.get("Bathroom_Flag"), rehab.get("Appliances_Flag"), rehab.get("Windows_Flag"),
-                rehab.get("Landscaping_Flag"), rehab.get("Trashout_Flag")
+    for key, prop_row, hashes in updates.values():
+        cursor.execute(property_update(suffix), prop_row + key)
+        for (table, _, _), table_hashes in zip(CHILD_TABLES, hashes):
+            keep = f" AND c.row_hash NOT IN ({_placeholders(len(table_hashes))})" \
+                if table_hashes else ""
+            cursor.execute(
+                f"DELETE c FROM {table}{suffix} c "
+                f"JOIN properties{suffix} p ON p.id = c.property_id "
+                f"WHERE p.address = %s AND p.city = %s AND p.state = %s{keep}",
+                key + tuple(table_hashes)
             )
-            if row not in existing_rehabs:
-                rehab_rows.append(row)
+    metrics.timed_commit(conn)
+
+# --- In-feed duplicates ---
+# What happens when a natural key repeats within one feed:
+#   merge  the first record makes the parent row, later ones only add children
+#   first  the first record wins and later ones are dropped with their children
+#   last   every repeat replaces the earlier record: the parent row is updated
+#          and children missing from the new record are deleted, the same way
+#          --incremental applies a changed record
+# first and last track the keys of the run in a seen_keys.py key set, which
+# spills to sorted runs behind a Bloom filter past --dedup-memory.
+
+DUPLICATE_POLICIES = ("merge", "first", "last")
+
+def apply_duplicate_policy(records, policy, keyset):
+    # Returns (records to load, store keys of records that replace an
+    # earlier batch's, number dropped)
+    skeys = [store_key(record_match_key(prop)) for prop in records]
+    digests = {skey: seen_keys.key_digest(skey) for skey in skeys}
+    earlier = seen_keys.seen_before(keyset, list(digests.values()))
+
+    replaced = set()
+    if policy == "first":
+        kept, taken = [], set()
+        for prop, skey in zip(records, skeys):
+            if digests[skey] not in earlier and skey not in taken:
+                taken.add(skey)
+                kept.append(prop)
+    else:
+        last = {skey: i for i, skey in enumerate(skeys)}
+        kept = [prop for i, (prop, skey) in enumerate(zip(records, skeys)) if last[skey] == i]
+        replaced = {skey for skey in last if digests[skey] in earlier}
+
+    seen_keys.add(keyset, [digest for digest in digests.values() if digest not in earlier])
+    return kept, replaced, len(records) - len(kept)
+
+def remember_keys(keyset, records, args):
+    # Adds the keys of chunks skipped by --resume, so repeats of them in the
+    # rest of the feed are still recognised
+    if args.validate:
+        _, codes, _ = validate_chunk(records)
+        records = [prop for prop, code in zip(records, codes) if not code]
+    digests = {seen_keys.key_digest(store_key(record_match_key(prop))) for prop in records}
+    earlier = seen_keys.seen_before(keyset, list(digests))
+    seen_keys.add(keyset, [digest for digest in digests if digest not in earlier])
+
+def open_key_set(args):
+    return seen_keys.open_key_set(args.dedup_memory) if args.duplicates != "merge" else None
 
-    insert_in_chunks(cursor, conn, valuation_insert, valuation_rows, "valuations")
-    insert_in_chunks(cursor, conn, hoa_insert, hoa_rows, "hoa_fees")
-    insert_in_chunks(cursor, conn, rehab_insert, rehab_rows, "rehab_estimates")
+# --- Batch processing ---
+
+COUNTS = ("inserted", "duplicates", "unchanged", "rejected", "repeats", "failed")
+
+def prepare_load(cursor, args):
+    if args.load_mode == "staging":
+        create_staging_tables(cursor)
+
+        def load(cursor, conn, batch):
+            return load_batch_staged(cursor, conn, batch, args.sinks, args.table_suffix,
+                                     args.budget)
+    else:
+        def load(cursor, conn, batch):
+            return load_batch(cursor, conn, batch, args.sinks, args.table_suffix, args.budget)
+    return load
+
+# A session is {"conn", "cursor", "load"}; conn is None after a lost connection
+def open_session(args):
+    conn = get_connection(allow_local_infile="load-data" in args.sinks.values())
+    cursor = conn.cursor()
+    batch_sizing.read_packet_limit(cursor)
+    if args.bulk_load or args.refresh:
+        bulk_load.relax_session(cursor)
+    return {"conn": conn, "cursor": cursor, "load": prepare_load(cursor, args)}
+
+def new_session(args, tag=None):
+    # The MySQL connection, when MySQL is a target, plus one open export per
+    # file target; "null" writes nothing, to time everything before the writes
+    session = open_session(args) if "mysql" in args.targets else \
+        {"conn": None, "cursor": None, "load": None}
+    session["exports"] = [
+        file_sinks.open_export(args.export_dir, target, args.partition_by, tag,
+                               memory_budget.export_rows(args.budget, file_sinks.BUFFER_ROWS))
+        for target in args.targets if target in file_sinks.FORMATS
+    ]
+    return session
+
+def end_session(session, keep=True):
+    # Closes the connection and the exports; a failed run's files are removed
+    close_session(session)
+    for export in session.pop("exports", ()):
+        file_sinks.close_export(export, keep)
+
+def close_session(session):
+    conn = session["conn"]
+    session.update(conn=None, cursor=None, load=None)
+    if conn is None:
+        return
+    for close in (conn.rollback, conn.close):
+        try:
+            close()
+        except Error:
+            pass
+
+def write_with_retry(session, args, work):
+    # Runs work(cursor, conn, load), retrying transient errors with backoff
+    attempt = 0
+    while True:
+        try:
+            if session["conn"] is None:
+                session.update(open_session(args))
+            return work(session["cursor"], session["conn"], session["load"])
+        except Error as e:
+            if not is_transient(e) or attempt >= args.retries:
+                raise
+            delay = retry_delay(attempt, args.retry_backoff)
+            attempt += 1
+            metrics.count("retries", errno=e.errno)
+            print(f"Transient error ({e}); retry {attempt}/{args.retries} in {delay:.1f}s")
+            if e.errno in LOCK_ERRORS and session["conn"] is not None:
+                try:
+                    session["conn"].rollback()
+                except Error:
+                    close_session(session)
+            else:
+                close_session(session)
+            time.sleep(delay)
+
+def chunk_key(rows):
+    return f"{rows.start}:{rows.stop}"
+
+def transform_batch(records, rows, args, store, counts, reject_lock=contextlib.nullcontext(),
+                    keyset=None):
+    # Validates, filters and transforms one batch of source records; rows
+    # holds their feed row numbers for the reject log
+    if args.validate:
+        with metrics.stage("validate"):
+            columns, codes, bad_fields = validate_chunk(records)
+            with reject_lock:
+                counts["rejected"] += write_rejects(args.reject_log, rows, codes, bad_fields)
+            apply_coerced(records, columns)
+            records = [prop for prop, code in zip(records, codes) if not code]
+
+    replaced = set()
+    if keyset is not None:
+        with metrics.stage("dedup"):
+            records, replaced, dropped = apply_duplicate_policy(records, args.duplicates, keyset)
+            counts["repeats"] += dropped
+
+    changed, fingerprints = replaced, {}
+    if store:
+        with metrics.stage("incremental"):
+            kept, changed, fingerprints = filter_changed(store, records, record_match_key)
+            counts["unchanged"] += len(records) - len(kept)
+            records = kept
+            changed = set(changed) | replaced
+    with metrics.stage("transform"):
+        batch = [transform_record(prop) for prop in records]
+    if args.budget is not None:
+        memory_budget.measure_batch(args.budget, records, batch)
+    return batch, changed, fingerprints
+
+def resolve_dimensions(cursor, conn, batch):
+    # Swaps dimension names in the parent rows for their ids (dimensions.py)
+    rows = dimensions.resolve_rows(cursor, conn, [prop_row for _, prop_row, _ in batch])
+    return [(key, row, children) for (key, _, children), row in zip(batch, rows)]
+
+def write_transformed(session, args, batch, changed, fingerprints, store, counts):
+    # Returns the number of rows that failed for good
+    def write(cursor, conn, load):
+        try:
+            resolved = resolve_dimensions(cursor, conn, batch)
+        except Error as e:
+            if is_transient(e):
+                raise
+            conn.rollback()
+            print(f"Failed dimension lookup: {e}")
+            return 0, 0, len(batch)
+        if changed:
+            refresh_changed(cursor, conn, resolved, changed, args.table_suffix)
+        result = load(cursor, conn, resolved)
+        if args.summary:
+            # Inside the retried write and before the checkpoint, so a batch is
+            # never marked done without its summary rows
+            ids = lookup_property_ids(cursor, {key for key, _, _ in resolved}, args.table_suffix)
+            property_summary.refresh(cursor, ids.values(), args.table_suffix)
+            metrics.timed_commit(conn)
+        return result
+
+    metrics.observe("batch_size", len(batch))
+    inserted, duplicates, failed = len(batch), 0, 0
+    if "mysql" in args.targets:
+        with metrics.stage("load"):
+            inserted, duplicates, failed = write_with_retry(session, args, write)
+    if session["exports"]:
+        with metrics.stage("export"):
+            for export in session["exports"]:
+                file_sinks.write_export(export, batch)
+    counts["inserted"] += inserted
+    counts["duplicates"] += duplicates
+    counts["failed"] += failed
+
+    # Fingerprints are only recorded once the whole batch is committed,
+    # so failed rows are retried by the next incremental run
+    if store and not failed:
+        save_fingerprints(store, fingerprints)
+    return failed
+
+def process_batch(session, records, rows, args, store, counts,
+                  reject_lock=contextlib.nullcontext(), keyset=None):
+    batch, changed, fingerprints = transform_batch(records, rows, args, store, counts,
+                                                   reject_lock, keyset)
+    del records
+    return write_transformed(session, args, batch, changed, fingerprints, store, counts)
+
+def batch_records(args):
+    # Records per batch: the rows per statement batch_sizing.py has settled
+    # on for properties, so a batch's parents go out in about one statement,
+    # unless --max-memory allows fewer
+    table = "stg_properties" if args.load_mode == "staging" else "properties" + args.table_suffix
+    rows = batch_sizing.batch_rows(table)
+    if args.budget is not None:
+        rows = memory_budget.batch_records(args.budget, rows)
+    return rows
+
+def numbered_batches(path, size=CHUNK_SIZE, skip=(), skipped=None,
+                     workers=feed_reader.DECODE_WORKERS, block_bytes=feed_reader.BLOCK_BYTES):
+    # (feed row numbers, records) per batch. size is a record count or a
+    # function returning the next one, so batches change size as the load
+    # is tuned. Chunks in skip, committed by an earlier run, are cut at their
+    # recorded bounds and left out; skipped(records) is called for each.
+    committed = sorted(tuple(map(int, key.split(":"))) for key in skip)
+    feed = iter(feed_reader.read_feed(path, workers, block_bytes))
+    row_offset = 0
+    while True:
+        while committed and committed[0][1] <= row_offset:
+            committed.pop(0)
+        resumed = bool(committed) and committed[0][0] == row_offset
+        if resumed:
+            take = committed[0][1] - row_offset
+        else:
+            take = size() if callable(size) else size
+            if committed:
+                take = min(take, committed[0][0] - row_offset)
+        with metrics.stage("parse"):
+            records = list(islice(feed, take))
+        if not records:
+            return
+        rows = range(row_offset, row_offset + len(records))
+        row_offset += len(records)
+        metrics.count("rows_in", len(records))
+        if resumed:
+            metrics.count("resumed", len(records))
+            if skipped:
+                skipped(records)
+            continue
+        yield rows, records
+
+# --- Pipelined load mode ---
+# Reader, transform and writer run on their own threads joined by bounded
+# queues, so the next batch is parsed and transformed while the previous one
+# is in flight to MySQL. A full queue blocks the stage feeding it, which
+# bounds memory to PIPELINE_DEPTH batches per queue. Each stage records time
+# spent working and time spent blocked on its neighbours.
+
+PIPELINE_DEPTH = 2
+PIPELINE_STAGES = ("reader", "transform", "writer")
+
+def _pipeline_stage(name, stats, source, sink, work, source_blocks=True):
+    # Pulls items from source, passes work(item) to sink and always ends the
+    # output with None so the next stage stops, even when this one fails.
+    # Time spent in sink, and in source when it is a queue, counts as blocked.
+    busy = waited = 0.0
+    try:
+        items = iter(source)
+        while True:
+            start = time.perf_counter()
+            item = next(items, None)
+            got = time.perf_counter()
+            if item is None:
+                break
+            result = work(item)
+            done = time.perf_counter()
+            sink(result)
+            if source_blocks:
+                busy += done - got
+                waited += got - start
+            else:
+                busy += done - start
+            waited += time.perf_counter() - done
+    except BaseException as e:
+        stats[name]["error"] = e
+    finally:
+        stats[name]["busy"], stats[name]["waiting"] = busy, waited
+        sink(None)
+
+def _queue_items(q):
+    return iter(q.get, None)
+
+def load_pipelined(session, args, store, counts, checkpoint, done=(), keyset=None,
+                   depth=PIPELINE_DEPTH):
+    stats = {name: {"busy": 0.0, "waiting": 0.0, "error": None} for name in PIPELINE_STAGES}
+    parsed = queue.Queue(depth)
+    transformed = queue.Queue(depth)
+
+    def transform(item):
+        rows, records = item
+        if rows is None:
+            remember_keys(keyset, records, args)
+            return None, None
+        return rows, transform_batch(records, rows, args, store, counts, keyset=keyset)
+
+    def write(item):
+        rows, transformed_batch = item
+        if rows is None:
+            return
+        if not write_transformed(session, args, *transformed_batch, store, counts):
+            checkpoint(rows)
+
+    # Skipped chunks go through the transform thread too, which owns the key set
+    skipped = (lambda records: parsed.put((None, records))) if keyset is not None else None
+    threads = [
+        threading.Thread(target=_pipeline_stage, daemon=True, args=(
+            "reader", stats, numbered_batches(args.json_path, lambda: batch_records(args),
+                                                 done, skipped, args.decode_workers,
+                                                 memory_budget.block_bytes(args.budget)),
+            parsed.put, lambda item: item, False)),
+        threading.Thread(target=_pipeline_stage, daemon=True, args=(
+            "transform", stats, _queue_items(parsed), transformed.put, transform)),
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    _pipeline_stage("writer", stats, _queue_items(transformed), lambda item: None, write)
+    wall = time.perf_counter() - start
+
+    for name in PIPELINE_STAGES:
+        if stats[name]["error"] is not None:
+            # Upstream threads may be blocked on a full queue; they are daemons
+            raise stats[name]["error"]
+    for thread in threads:
+        thread.join()
+    return stats, wall
+
+def report_pipeline(stats, wall):
+    # The stage with the highest utilisation is the bottleneck
+    for name in PIPELINE_STAGES:
+        busy, waited = stats[name]["busy"], stats[name]["waiting"]
+        share = busy / wall if wall else 0.0
+        print(f"{name}: busy {busy:.2f}s ({share:.0%}), blocked {waited:.2f}s")
+    bottleneck = max(PIPELINE_STAGES, key=lambda name: stats[name]["busy"])
+    print(f"Pipeline wall time {wall:.2f}s, bottleneck: {bottleneck}")
+
+# --- Parallel load mode ---
+# The coordinator parses the feed and hash-partitions records by natural key
+# over --workers processes. Every key always lands on the same worker, so no
+# two workers ever insert the same property. Each worker owns its connection
+# and validates, transforms and loads its shard through the staging tables.
+# Shared auto-increment ranges rule out lastrowid arithmetic here.
+
+SHARD_QUEUE_DEPTH = 2  # batches waiting per worker before the coordinator blocks
+
+def shard_for(prop, shards):
+    # crc32 rather than hash(): stable across processes and runs
+    return zlib.crc32(store_key(record_match_key(prop)).encode("utf-8")) % shards
+
+def shard_worker(shard, batches, results, args, reject_lock, feed):
+    counts = dict.fromkeys(COUNTS, 0)
+    error = None
+    session = {"conn": None, "cursor": None, "load": None}
+    keyset = None
+    try:
+        session = new_session(args, f"{args.export_tag}-{shard}")
+        # Workers share the checkpoint file; the timeout waits out their commits
+        state = open_store(args.state_db, timeout=30)
+        keyset = open_key_set(args)
+        for key, rows, records in iter(batches.get, None):
+            if rows is None:
+                # A chunk committed by an earlier run, sent only for its keys
+                remember_keys(keyset, records, args)
+            elif not process_batch(session, records, rows, args, None, counts, reject_lock,
+                                   keyset):
+                mark_committed(state, feed, key, len(rows))
+        state.close()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        end_session(session, keep=error is None)
+        if keyset is not None:
+            seen_keys.close_key_set(keyset)
+    results.put((shard, counts, metrics.snapshot(), batch_sizing.summary(), error))
+
+def _send(batches, item, worker):
+    # Blocks while the worker's queue is full, unless the worker has died
+    while True:
+        try:
+            batches.put(item, timeout=1)
+            return True
+        except queue.Full:
+            if not worker.is_alive():
+                return False
+
+def load_parallel(args, feed, done=()):
+    batches = [multiprocessing.Queue(SHARD_QUEUE_DEPTH) for _ in range(args.workers)]
+    results = multiprocessing.Queue()
+    reject_lock = multiprocessing.Lock()
+    workers = [
+        multiprocessing.Process(target=shard_worker, daemon=True,
+                                args=(shard, batches[shard], results, args, reject_lock, feed))
+        for shard in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # (chunk key, feed row numbers, records) per shard. A shard's chunks are
+    # numbered in feed order, so the keys repeat as long as the feed and the
+    # worker count do, which is what --resume relies on.
+    sent = [0] * len(workers)
+
+    def chunk(shard):
+        key = f"{shard}/{len(workers)}:{sent[shard]}"
+        sent[shard] += 1
+        return key, [], []
+
+    buffers = [chunk(shard) for shard in range(len(workers))]
+
+    def flush(shard):
+        key, rows, records = buffers[shard]
+        if key in done:
+            metrics.count("resumed", len(records))
+            if args.duplicates == "merge":
+                return True
+            return _send(batches[shard], (key, None, records), workers[shard])
+        return _send(batches[shard], buffers[shard], workers[shard])
+
+    row = -1
+    source = feed_reader.read_feed(args.json_path, args.decode_workers,
+                                   memory_budget.block_bytes(args.budget))
+    for row, prop in enumerate(metrics.timed_iter("parse", source)):
+        shard = shard_for(prop, args.workers)
+        _, rows, records = buffers[shard]
+        rows.append(row)
+        records.append(prop)
+        if len(records) == CHUNK_SIZE:
+            if not flush(shard):
+                break
+            buffers[shard] = chunk(shard)
+    for shard, worker in enumerate(workers):
+        if buffers[shard][1]:
+            flush(shard)
+        _send(batches[shard], None, worker)
+    metrics.count("rows_in", row + 1)
+
+    counts = dict.fromkeys(COUNTS, 0)
+    errors = {}
+    reported = set()
+    while len(reported) < len(workers):
+        try:
+            shard, shard_counts, snapshot, sizes, error = results.get(timeout=1)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        reported.add(shard)
+        for name, value in shard_counts.items():
+            counts[name] += value
+        # Seconds are summed over workers, so rows/s is per worker
+        metrics.merge(snapshot)
+        batch_sizing.merge(shard, sizes)
+        if error:
+            errors[shard] = error
+    for shard, worker in enumerate(workers):
+        worker.join()
+        # Batches queued for a worker that died are dropped, not flushed at exit
+        batches[shard].cancel_join_thread()
+        if shard not in reported:
+            errors[shard] = f"exited with code {worker.exitcode}"
+    return counts, errors
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load the property feed into MySQL.")
+    parser.add_argument("json_path", nargs="?", default=JSON_PATH,
+                        help="feed file, or a quoted glob of .json/.ndjson files, optionally "
+                             ".gz or .zst compressed (default: %(default)s)")
+    parser.add_argument("--decode-workers", type=int, default=feed_reader.DECODE_WORKERS,
+                        help="processes parsing NDJSON input; 1 parses in the reading process "
+                             "(default: %(default)s)")
+    parser.add_argument("--load-mode", choices=("lastrowid", "staging"), default="lastrowid",
+                        help="how child rows get their property_id: lastrowid arithmetic "
+                             "(single loader) or server-side staging joins (concurrency safe)")
+    parser.add_argument("--validate", action="store_true",
+                        help="validate and coerce each chunk before loading; rejects are logged")
+    parser.add_argument("--reject-log", default=LOG_FILE,
+                        help="where --validate writes rejected rows (default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip records whose fingerprint matches the last committed run")
+    parser.add_argument("--state-db", default=STATE_PATH,
+                        help="SQLite store for chunk checkpoints and --incremental fingerprints "
+                             "(default: %(default)s)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip chunks of the feed that an earlier run already committed")
+    parser.add_argument("--retries", type=int, default=RETRIES,
+                        help="retries per batch after a deadlock, lock wait timeout or lost "
+                             "connection (default: %(default)s)")
+    parser.add_argument("--retry-backoff", type=float, default=RETRY_BACKOFF,
+                        help="seconds before the first retry, doubled each time "
+                             "(default: %(default)s)")
+    parser.add_argument("--bulk-load", action="store_true",
+                        help="for empty targets: load children without foreign key checks "
+                             "and secondary indexes, then rebuild them and verify")
+    parser.add_argument("--refresh", action="store_true",
+                        help="full reload into shadow tables, verified and then swapped in "
+                             "with one RENAME TABLE; the replaced tables are kept for rollback")
+    parser.add_argument("--no-summary", dest="summary", action="store_false",
+                        help="do not refresh property_summary after each batch; rebuild it "
+                             "later with scripts/property_summary.py. Until then other "
+                             "processes' property_bundles.py caches can serve bundles up to "
+                             "60 s old, even with check_versions")
+    parser.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default="merge",
+                        help="when a natural key repeats in the feed: merge children into the "
+                             "first record, keep the first, or let the last replace it "
+                             "(default: %(default)s)")
+    parser.add_argument("--dedup-memory", type=int, default=seen_keys.MEMORY_MB, metavar="MB",
+                        help="memory for the keys seen by --duplicates first/last before they "
+                             "spill to disk behind a Bloom filter (default: %(default)s)")
+    parser.add_argument("--max-memory", type=int, metavar="MB",
+                        help="memory ceiling per run: batch, block and buffer sizes are chosen "
+                             "to fit and a batch's child rows spill to temporary files past "
+                             "their share (default: no ceiling)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="loader processes, each with its own connection and a hash "
+                             "partition of the natural keys (needs --load-mode staging)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="parse, transform and write on separate threads so parsing "
+                             "overlaps database round trips")
+    parser.add_argument("--pipeline-depth", type=int, default=PIPELINE_DEPTH,
+                        help="batches buffered between pipeline stages (default: %(default)s)")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="write a JSON run report with counters, latency histograms "
+                             "and stage times")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="write the same metrics as a Prometheus textfile")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="run under cProfile, save the stats to PATH and print the top "
+                             "functions (main process only with --workers)")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="trace allocations and print the peak and top allocation sites")
+    parser.add_argument("--target", action="append", choices=TARGETS, metavar="TARGET",
+                        help=f"where batches go, one of {', '.join(TARGETS)}; repeat to write "
+                             f"several (default: mysql)")
+    parser.add_argument("--export-dir", default=EXPORT_DIR,
+                        help="directory of the parquet and arrow targets (default: %(default)s)")
+    parser.add_argument("--partition-by", choices=file_sinks.PARTITIONS, default="state",
+                        help="partition column of the exported files (default: %(default)s)")
+    parser.add_argument("--sink", action="append", default=[], metavar="[TABLE=]BACKEND",
+                        help=f"row writer, one of {', '.join(SINKS)}; repeat with TABLE= "
+                             f"to choose per table (default: executemany)")
+    args = parser.parse_args(argv)
+
+    args.sinks = {"default": "executemany"}
+    for spec in args.sink:
+        table, _, backend = spec.rpartition("=")
+        if backend not in SINKS:
+            parser.error(f"unknown sink {backend!r}, expected one of {', '.join(SINKS)}")
+        args.sinks[table or "default"] = backend
+
+    args.targets = list(dict.fromkeys(args.target or ["mysql"]))
+    # Names the exported files of this run; workers add their shard
+    args.export_tag = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    if "mysql" not in args.targets and (args.bulk_load or args.refresh):
+        parser.error("--bulk-load and --refresh need the mysql target")
+    if args.resume and any(target in file_sinks.FORMATS for target in args.targets):
+        parser.error("--resume cannot add to the files of an earlier run; rerun the export")
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.load_mode != "staging" and "mysql" in args.targets:
+        parser.error("--workers needs --load-mode staging; lastrowid ids are not "
+                     "consecutive when several loaders insert at once")
+    if args.pipeline_depth < 1:
+        parser.error("--pipeline-depth must be at least 1")
+    if args.workers > 1 and args.pipeline:
+        parser.error("--pipeline runs a single loader; use it without --workers")
+    if args.workers > 1 and args.incremental:
+        parser.error("--incremental keeps one local checkpoint store and runs with one worker")
+    if (args.bulk_load or args.refresh) and args.incremental:
+        parser.error("--bulk-load and --refresh are full loads; --incremental deletes child "
+                     "rows by property_id, which needs the indexes they drop")
+    if (args.bulk_load or args.refresh) and args.duplicates == "last":
+        parser.error("--bulk-load and --refresh are full loads; --duplicates last replaces "
+                     "child rows by property_id, which needs the indexes they drop; use first")
+    # Full loads rebuild property_summary once the child keys are back
+    args.summary = args.summary and "mysql" in args.targets \
+        and not (args.bulk_load or args.refresh)
+    # Table name suffix the loader writes to
+    args.table_suffix = shadow_tables.SHADOW_SUFFIX if args.refresh else ""
+
+    processes = args.workers + 1 if args.workers > 1 else 1
+    if args.max_memory is not None and args.max_memory < memory_budget.MIN_MB * processes:
+        parser.error(f"--max-memory must be at least {memory_budget.MIN_MB} MB per process "
+                     f"({processes} with --workers {args.workers})")
+    args.budget = open_budget(args, processes)
+    if args.budget is not None:
+        args.dedup_memory = max(1, min(args.dedup_memory,
+                                       memory_budget.share(args.budget, "dedup") // 2**20))
+    return args
+
+def open_budget(args, processes):
+    # Splits --max-memory evenly over the loader processes, then over the
+    # buffers this run uses (memory_budget.py). In parallel mode batches stay
+    # CHUNK_SIZE records, since the chunk keys --resume relies on count them.
+    if args.max_memory is None:
+        return None
+    uses = {"reader", "batches"}
+    if "mysql" in args.targets:
+        uses.add("children")
+    if args.duplicates != "merge":
+        uses.add("dedup")
+    if any(target in file_sinks.FORMATS for target in args.targets):
+        uses.add("export")
+    # A batch being read, transformed and written plus those queued between
+    in_flight = 2 * args.pipeline_depth + 3 if args.pipeline else 1
+    return memory_budget.open_budget(args.max_memory // processes, uses, in_flight,
+                                     args.decode_workers)
+
+def run_load(args):
+    # Returns (counts, worker errors, pipeline stats or None)
+    feed = feed_id(args.json_path)
+    # Checked from the pipeline's transform and writer threads
+    state = open_store(args.state_db, check_same_thread=False)
+    if args.resume:
+        done = committed_chunks(state, feed)
+        print(f"Resuming: {len(done)} committed chunks of {args.json_path} are skipped")
+    else:
+        clear_chunks(state, feed)
+        done = set()
+
+    if args.workers > 1:
+        state.close()
+        counts, errors = load_parallel(args, feed, done)
+        return counts, errors, None
+
+    def checkpoint(rows):
+        mark_committed(state, feed, chunk_key(rows), len(rows))
+
+    store = state if args.incremental else None
+    session = new_session(args, args.export_tag)
+    keyset = open_key_set(args)
+    counts = dict.fromkeys(COUNTS, 0)
+    pipeline = None
+    completed = False
+    try:
+        if args.pipeline:
+            pipeline = load_pipelined(session, args, store, counts, checkpoint, done, keyset,
+                                      args.pipeline_depth)
+        else:
+            skipped = (lambda records: remember_keys(keyset, records, args)) \
+                if keyset is not None else None
+            # Source records are transformed a batch at a time and dropped;
+            # only the transformed rows of the current batch are kept.
+            batches = numbered_batches(args.json_path, lambda: batch_records(args), done,
+                                       skipped, args.decode_workers,
+                                       memory_budget.block_bytes(args.budget))
+            for rows, records in batches:
+                if not process_batch(session, records, rows, args, store, counts,
+                                     keyset=keyset):
+                    checkpoint(rows)
+        completed = True
+    finally:
+        end_session(session, keep=completed)
+        state.close()
+        if keyset is not None:
+            seen_keys.close_key_set(keyset)
+    return counts, {}, pipeline
+
+def run_bulk_step(step):
+    # ALTER TABLE commits implicitly, so key changes get a connection of their own
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        return step(cursor, conn)
+    finally:
+        cursor.close()
+        conn.close()
+
+def report_memory(limit=10):
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"Traced memory: {current / 2**20:.1f} MiB at exit, {peak / 2**20:.1f} MiB peak")
+    for stat in tracemalloc.take_snapshot().statistics("lineno")[:limit]:
+        print(f"  {stat}")
+
+def report_budget(memory, budget):
+    per_process = budget["max_mb"]
+    print(f"Memory: peak RSS {memory['peak_rss_mb']:.0f} MiB, largest child process "
+          f"{memory['peak_child_rss_mb']:.0f} MiB, budget {per_process} MiB per process")
+    if max(memory["peak_rss_mb"], memory["peak_child_rss_mb"]) > per_process:
+        print("Memory: the peak went over --max-memory; lower --decode-workers or "
+              "--pipeline-depth, or raise the budget")
+    if memory["spill_rows"]:
+        print(f"Spilled {memory['spill_rows']} child rows "
+              f"({memory['spill_bytes'] / 2**20:.1f} MiB) "
+              f"to {memory['spill_files']} temporary files")
+
+def main():
+    args = parse_args()
+    if args.validate and not args.resume:
+        open(args.reject_log, "w").close()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    started = time.time()
+
+    if args.refresh:
+        # Checkpoints only mean something while the shadow tables they went to exist
+        args.resume = run_bulk_step(
+            lambda cursor, conn: shadow_tables.create_shadow(cursor, args.resume))
+    elif args.bulk_load:
+        run_bulk_step(lambda cursor, conn: bulk_load.start(cursor))
+    counts, errors, pipeline = run_load(args)
+    problems = []
+    if args.refresh:
+        problems = run_bulk_step(shadow_tables.verify_shadow)
+        if counts["failed"]:
+            problems.append(f"{counts['failed']} rows failed to load")
+        if errors or problems:
+            print("Refresh: live tables left unchanged; the shadow tables are kept for "
+                  "inspection or --refresh --resume")
+        else:
+            run_bulk_step(lambda cursor, conn: shadow_tables.swap(cursor))
+    elif args.bulk_load:
+        # Keys are rebuilt even after a worker failed, so the tables are never
+        # left without them; --resume --bulk-load drops them again
+        problems = run_bulk_step(bulk_load.finish)
+
+    finished = time.time()
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    if args.tracemalloc:
+        report_memory()
+
+    for name, value in counts.items():
+        metrics.count(name, value)
+    if "mysql" in args.targets:
+        print(f"Inserted new properties: {counts['inserted']} | "
+              f"Skipped duplicates: {counts['duplicates']}")
+    else:
+        print(f"Transformed properties: {counts['inserted']} (to {', '.join(args.targets)})")
+    if args.validate:
+        print(f"Rejected invalid records: {counts['rejected']} (see {args.reject_log})")
+    if args.incremental:
+        print(f"Skipped unchanged records: {counts['unchanged']}")
+    if args.duplicates != "merge":
+        print(f"Dropped repeated natural keys ({args.duplicates} wins): {counts['repeats']}")
+    if counts["failed"]:
+        print(f"Failed rows: {counts['failed']}")
+    report_throughput()
+    if pipeline:
+        report_pipeline(*pipeline)
+    memory = memory_budget.report(args.budget) if args.budget is not None else None
+    if memory:
+        report_budget(memory, args.budget)
+
+    if args.metrics_json:
+        stages = pipeline[0] if pipeline else {}
+        metrics.write_report(
+            args.metrics_json,
+            feed=args.json_path, started=started, finished=finished,
+            wall_seconds=finished - started,
+            options={k: v for k, v in vars(args).items()
+                     if k not in ("sink", "json_path", "budget")},
+            pipeline={name: {"busy": stats["busy"], "waiting": stats["waiting"]}
+                      for name, stats in stages.items()},
+            worker_errors=errors,
+            verification_problems=problems,
+            batch_sizes=batch_sizing.report(),
+            memory=memory,
+        )
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
 
-    cursor.close()
-    conn.close()
+    for shard, error in sorted(errors.items()):
+        print(f"Worker {shard} failed: {error}")
+    for problem in problems:
+        print(f"Verification failed: {problem}")
+    if errors or problems:
+        sys.exit(1)
     print("ETL completed successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+import glob
+import gzip
+import io
+import json
+import marshal
+import mmap
+import multiprocessing
+import os
+from collections import deque
+
+# Reads the property feed from one file or a glob of them. Each file is
+# .json or .ndjson, optionally compressed as .gz or .zst. A file whose first
+# non-blank character is "[" is a JSON array, anything else is one record per
+# line, whatever the name says.
+#
+# NDJSON is cut into blocks of whole lines that a pool of processes parses,
+# at most DECODE_AHEAD blocks per worker ahead of the consumer. Records come
+# back in feed order, so row numbers and chunk keys do not depend on the
+# number of workers. Uncompressed files are mmap'd and the workers are sent
+# byte ranges, so the reading process never copies them; compressed files are
+# decompressed by the reader, which is several times faster than parsing, and
+# the workers are sent the decompressed blocks. Parsed blocks come back
+# marshalled: rebuilding the dicts from marshal costs the reader about 30%
+# less than json.loads and pickle would cost about as much as parsing. JSON
+# arrays cannot be cut without parsing them and are streamed by load_data in
+# the reading process.
+
+FEED_SUFFIXES = (".json", ".ndjson")
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+READ_SIZE = 1 << 16  # characters read from a JSON array per refill
+BLOCK_BYTES = 1 << 23  # NDJSON bytes per parse task
+DECODE_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))  # a core is left to the reader
+DECODE_AHEAD = 2  # blocks queued per worker
+
+def feed_files(pattern):
+    # The files a feed path names: the path itself, or the sorted matches
+    # of a glob such as "feeds/2024-06-*.ndjson.zst"
+    if os.path.isfile(pattern):
+        return [pattern]
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No feed files match {pattern}")
+    for path in paths:
+        if not feed_suffix(path):
+            raise ValueError(f"{path} is not a .json or .ndjson feed file "
+                             f"(optionally {' or '.join(COMPRESSED_SUFFIXES)})")
+    return paths
+
+def compression(path):
+    suffix = os.path.splitext(path)[1]
+    return suffix if suffix in COMPRESSED_SUFFIXES else None
+
+def feed_suffix(path):
+    base = path[:-len(compression(path))] if compression(path) else path
+    suffix = os.path.splitext(base)[1]
+    return suffix if suffix in FEED_SUFFIXES else None
+
+def _zstd_reader(path):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f"Reading {path} needs the zstandard package "
+                           "(pip install zstandard)") from None
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+
+def open_binary(path):
+    kind = compression(path)
+    if kind == ".gz":
+        return gzip.open(path, "rb")
+    if kind == ".zst":
+        return _zstd_reader(path)
+    return open(path, "rb")
+
+def is_array(path):
+    with open_binary(path) as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return False
+            chunk = chunk.lstrip()
+            if chunk:
+                return chunk[:1] == b"["
+
+# --- JSON arrays ---
+
+def _refill(f, buf, pos, read_size):
+    chunk = f.read(read_size)
+    return buf[pos:] + chunk, 0, not chunk
+
+def load_data(path, read_size=READ_SIZE):
+    # Streams the top-level JSON array one record at a time so memory stays
+    # bounded by the largest record plus the read buffer, not the file size.
+    decoder = json.JSONDecoder()
+    with io.TextIOWrapper(open_binary(path), encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+        started = False
+        while True:
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos, eof = _refill(f, buf, pos, read_size)
+
+            if pos >= len(buf):
+                raise ValueError(f"Unexpected end of JSON array in {path}")
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"Expected a top-level JSON array in {path}")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                buf, pos, eof = _refill(f, buf, pos, read_size)
+                continue
+
+            yield record
+            pos = end
+
+# --- NDJSON blocks ---
+
+def parse_lines(data, path, offset):
+    # Records of a block of whole lines; offset is where the block starts in
+    # the (decompressed) file, for error messages
+    records = []
+    for line in data.split(b"\n"):
+        if line.strip():
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"Bad NDJSON record in {path} at byte {offset}: {e}") from None
+        offset += len(line) + 1
+    return records
+
+def _parse_range(path, start, end):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_lines(data[start:end], path, start)
+
+def _parse_block(block, path, offset):
+    return parse_lines(block, path, offset)
+
+def _decode(parse, args):
+    # Pool task: a block's records, marshalled for the trip back
+    return marshal.dumps(parse(*args))
+
+def _ranges(path, block_bytes):
+    # (start, end) byte ranges of about block_bytes, ending after a newline
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < size:
+                end = data.find(b"\n", start + block_bytes)
+                end = size if end < 0 else end + 1
+                yield start, end
+                start = end
+
+def _line_blocks(f, block_bytes):
+    # Decompressed blocks of whole lines
+    rest = b""
+    while True:
+        chunk = f.read(block_bytes)
+        if not chunk:
+            if rest:
+                yield rest
+            return
+        data = rest + chunk
+        cut = data.rfind(b"\n") + 1
+        rest = data[cut:]
+        if cut:
+            yield data[:cut]
+
+def _tasks(paths, block_bytes):
+    # (parse function, arguments) per block in feed order; JSON arrays come
+    # through as (None, path)
+    for path in paths:
+        if is_array(path):
+            yield None, path
+        elif compression(path) is None:
+            for start, end in _ranges(path, block_bytes):
+                yield _parse_range, (path, start, end)
+        else:
+            offset = 0
+            with open_binary(path) as f:
+                for block in _line_blocks(f, block_bytes):
+                    yield _parse_block, (block, path, offset)
+                    offset += len(block)
+
+def read_feed(pattern, workers=DECODE_WORKERS, block_bytes=BLOCK_BYTES):
+    # Every record of the feed files, in order
+    paths = feed_files(pattern)
+    if workers <= 1:
+        for parse, task in _tasks(paths, block_bytes):
+            yield from load_data(task) if parse is None else parse(*task)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for parse, task in _tasks(paths, block_bytes):
+            if parse is None:
+                while pending:
+                    yield from marshal.loads(pending.popleft().get())
+                yield from load_data(task)
+                continue
+            pending.append(pool.apply_async(_decode, (parse, task)))
+            if len(pending) > workers * DECODE_AHEAD:
+                yield from marshal.loads(pending.popleft().get())
+        while pending:
+            yield from marshal.loads(pending.popleft().get())
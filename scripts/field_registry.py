@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import namedtuple
+from operator import itemgetter
+
+# Single source of truth for the source field -> column mapping.
+# data/Field Config.xlsx says which table each source field belongs to and
+# sql/Creation tables.sql gives the column order and SQL types. Both are read
+# once at import, cross-checked, and compiled into per-table extractors and
+# INSERT statements that every loader shares.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FIELD_CONFIG_PATH = os.path.join(ROOT, "data", "Field Config.xlsx")
+DDL_PATH = os.path.join(ROOT, "sql", "Creation tables.sql")
+
+# "Target Table" values in the field config -> normalised table. Leads and
+# Taxes attributes are stored on properties in this schema.
+TARGET_TABLES = {
+    "property": "properties",
+    "leads": "properties",
+    "taxes": "properties",
+    "valuation": "valuations",
+    "hoa": "hoa_fees",
+    "rehab": "rehab_estimates",
+}
+
+# Nested list in the source record that holds each child table's rows
+CHILD_SOURCES = {
+    "valuations": "Valuation",
+    "hoa_fees": "HOA",
+    "rehab_estimates": "Rehab",
+}
+
+# Columns the loader or the server fills rather than copying from a source
+# field; properties.location is generated from latitude and longitude
+GENERATED_COLUMNS = {"id", "property_id", "row_hash", "location"}
+
+# Low-cardinality properties attributes stored once in a dimension table
+# (id, name) and referenced by <column>_id. City and state stay inline: they
+# are part of the (address, city, state) natural key every lookup joins on.
+DIMENSIONS = {
+    column: f"dim_{column}" for column in (
+        "reviewed_status", "most_recent_status", "source", "market", "occupancy", "flood",
+        "property_type", "highway", "train", "water", "sewage", "parking", "layout",
+        "selling_reason", "final_reviewer",
+    )
+}
+
+_XLSX_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+def column_name(field):
+    # BasementYesNo -> basement_yes_no, HOA_Flag -> hoa_flag
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", "_", field).lower()
+
+def read_field_config(path=FIELD_CONFIG_PATH):
+    # Reads the first sheet with the standard library so the loader does not
+    # need openpyxl; returns [(source field, target table), ...] in sheet order
+    with zipfile.ZipFile(path) as book:
+        shared = []
+        if "xl/sharedStrings.xml" in book.namelist():
+            for item in ET.fromstring(book.read("xl/sharedStrings.xml")).findall("m:si", _XLSX_NS):
+                shared.append("".join(t.text or "" for t in item.iter(f"{{{_XLSX_NS['m']}}}t")))
+        sheet = ET.fromstring(book.read("xl/worksheets/sheet1.xml"))
+
+    rows = []
+    for row in sheet.iter(f"{{{_XLSX_NS['m']}}}row"):
+        values = []
+        for cell in row.findall("m:c", _XLSX_NS):
+            value = cell.find("m:v", _XLSX_NS)
+            text = value.text if value is not None else None
+            if cell.get("t") == "s" and text is not None:
+                text = shared[int(text)]
+            values.append(text)
+        rows.append(values)
+
+    header, body = rows[0], rows[1:]
+    if header[:2] != ["Column Name", "Target Table"]:
+        raise ValueError(f"Unexpected header in {path}: {header}")
+    return [(field.strip(), target.strip()) for field, target, *_ in body if field and target]
+
+def read_ddl(path=DDL_PATH):
+    # {table: [(column, sql type), ...]} in declaration order
+    with open(path) as f:
+        sql = f.read()
+    tables = {}
+    for name, body in re.findall(r"CREATE TABLE\s+(\w+)\s*\((.*?)\n\);", sql, re.S | re.I):
+        columns = []
+        for line in body.splitlines():
+            line = line.strip().rstrip(",")
+            match = re.match(r"(\w+)\s+([A-Z]+(?:\(\d+(?:,\d+)?\))?)", line)
+            if not match or match.group(1).upper() in ("PRIMARY", "FOREIGN", "UNIQUE", "KEY",
+                                                       "INDEX", "CONSTRAINT", "SPATIAL"):
+                continue
+            columns.append((match.group(1), match.group(2)))
+        tables[name] = columns
+    return tables
+
+def read_ddl_keys(path=DDL_PATH):
+    # {table: [index or foreign key clause, ...]} in declaration order; the
+    # primary key is left out
+    with open(path) as f:
+        sql = f.read()
+    keys = {}
+    for name, body in re.findall(r"CREATE TABLE\s+(\w+)\s*\((.*?)\n\);", sql, re.S | re.I):
+        keys[name] = [
+            line for line in (line.strip().rstrip(",") for line in body.splitlines())
+            if re.match(r"(UNIQUE|KEY|INDEX|FOREIGN|SPATIAL|FULLTEXT|CONSTRAINT)\b", line, re.I)
+        ]
+    return keys
+
+def compile_extractor(fields):
+    # itemgetter builds the tuple in C; records missing a field fall back to
+    # dict.get so absent keys still become None
+    fields = tuple(fields)
+    if len(fields) == 1:
+        getter = itemgetter(fields[0])
+        fast = lambda record: (getter(record),)
+    else:
+        fast = itemgetter(*fields)
+
+    def extract(record):
+        try:
+            return fast(record)
+        except KeyError:
+            return tuple(map(record.get, fields))
+    return extract
+
+def insert_statement(table, columns, suffix=""):
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}){suffix}"
+    )
+
+# fields/columns are parallel tuples in DDL order, types maps column -> SQL
+# type and extract(record) returns the column values as a tuple. dimensions
+# maps each <column>_id column to its dimension table; extract() returns the
+# name there, typed as the dimension's name column, and the loader swaps in
+# the id.
+TableMapping = namedtuple("TableMapping", "table fields columns types extract dimensions")
+
+def table_mapping(table, fields, columns, types, dimensions=None):
+    return TableMapping(table, tuple(fields), tuple(columns), dict(zip(columns, types)),
+                        compile_extractor(fields), dimensions or {})
+
+def dimension_column(column):
+    return f"{column}_id"
+
+def decimal_scales(mapping):
+    scales = {}
+    for column, sql_type in mapping.types.items():
+        match = re.match(r"DECIMAL\((\d+),(\d+)\)", sql_type)
+        if match:
+            scales[column] = int(match.group(2))
+    return scales
+
+def field_types(mapping):
+    # Source field -> (DECIMAL precision, scale) or None for INT, and source
+    # field -> VARCHAR/CHAR length, for validation.py
+    numeric, strings = {}, {}
+    for field, column in zip(mapping.fields, mapping.columns):
+        sql_type = mapping.types[column]
+        match = re.match(r"(DECIMAL|VARCHAR|CHAR)\((\d+)(?:,(\d+))?\)", sql_type)
+        if sql_type == "INT":
+            numeric[field] = None
+        elif match and match.group(1) == "DECIMAL":
+            numeric[field] = (int(match.group(2)), int(match.group(3)))
+        elif match:
+            strings[field] = int(match.group(2))
+    return numeric, strings
+
+def build_registry(config_path=FIELD_CONFIG_PATH, ddl_path=DDL_PATH):
+    fields_by_table = {}
+    for field, target in read_field_config(config_path):
+        table = TARGET_TABLES.get(target.lower())
+        if table is None:
+            raise ValueError(f"Unknown target table {target!r} for {field} in {config_path}")
+        column = column_name(field)
+        if table == "properties" and column in DIMENSIONS:
+            column = dimension_column(column)
+        fields_by_table.setdefault(table, {})[column] = field
+
+    ddl = read_ddl(ddl_path)
+    dimensions = {dimension_column(column): dim for column, dim in DIMENSIONS.items()}
+    for dim in dimensions.values():
+        if dim not in ddl:
+            raise ValueError(f"Dimension table {dim} is not created in {ddl_path}")
+    registry = {}
+    for table, by_column in fields_by_table.items():
+        if table not in ddl:
+            raise ValueError(f"{table} is mapped in {config_path} but not created in {ddl_path}")
+        # A dimension column takes the type of the name it stands for
+        declared = [(col, dict(ddl[dimensions[col]])["name"] if col in dimensions else sql_type)
+                    for col, sql_type in ddl[table] if col not in GENERATED_COLUMNS]
+        missing = set(by_column) - {col for col, _ in declared}
+        if missing:
+            raise ValueError(f"{table} has no column for {', '.join(sorted(missing))} "
+                             f"in {ddl_path}")
+        # DDL order, so statements and row fingerprints line up with the schema
+        mapped = [(col, sql_type) for col, sql_type in declared if col in by_column]
+        registry[table] = table_mapping(
+            table,
+            [by_column[col] for col, _ in mapped],
+            [col for col, _ in mapped],
+            [sql_type for _, sql_type in mapped],
+            {col: dimensions[col] for col, _ in mapped if col in dimensions},
+        )
+    return registry
+
+REGISTRY = build_registry()
+
+PROPERTIES = REGISTRY["properties"]
+VALUATIONS = REGISTRY["valuations"]
+HOA_FEES = REGISTRY["hoa_fees"]
+REHAB_ESTIMATES = REGISTRY["rehab_estimates"]
+CHILD_MAPPINGS = (VALUATIONS, HOA_FEES, REHAB_ESTIMATES)
+
+def expected_ddl_columns(table):
+    mapping = REGISTRY[table]
+    return [(col, mapping.types[col]) for col in mapping.columns]
+
+def check_schema(cursor, schema=None):
+    # Compares the registry with the live database; returns a list of problems
+    problems = []
+    for table, mapping in REGISTRY.items():
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = COALESCE(%s, DATABASE()) AND table_name = %s",
+            (schema, table)
+        )
+        live = {row[0] for row in cursor.fetchall()}
+        for column in mapping.columns:
+            if column not in live:
+                problems.append(f"{table}.{column} is mapped but missing from the database")
+    return problems
+
+def benchmark(number=200000):
+    # Per-record cost of the old hand-written prop.get() chain versus the
+    # compiled extractor, on a fully populated and a sparse record
+    fields = PROPERTIES.fields
+    full = {field: i for i, field in enumerate(fields)}
+    sparse = {field: i for i, field in enumerate(fields) if i % 3}
+
+    chain = eval("lambda prop: (" + ", ".join(f"prop.get({f!r})" for f in fields) + ",)")
+    for label, record in (("full record", full), ("sparse record", sparse)):
+        for name, func in (("dict.get chain", chain), ("compiled", PROPERTIES.extract)):
+            seconds = min(timeit.repeat(lambda: func(record), number=number, repeat=3))
+            print(f"{label:>13} | {name:<14} | {seconds / number * 1e9:7.0f} ns/record")
+
+if __name__ == "__main__":
+    for mapping in REGISTRY.values():
+        print(f"{mapping.table}: {len(mapping.columns)} columns")
+        for field, column in zip(mapping.fields, mapping.columns):
+            via = f" via {mapping.dimensions[column]}" if column in mapping.dimensions else ""
+            print(f"  {field:<24} -> {column} {mapping.types[column]}{via}")
+    if "--benchmark" in sys.argv:
+        benchmark()
@@ -0,0 +1,211 @@
+import os
+import time
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from urllib.parse import quote
+
+import metrics
+from field_registry import CHILD_MAPPINGS, PROPERTIES
+
+# Writes transformed batches to Parquet or Arrow IPC files instead of, or
+# next to, MySQL. There is one directory per table, partitioned Hive-style by
+# state or market (export/valuations/state=TX/part-<run>.parquet). A child row
+# goes to the partition of its property. Columns are typed from
+# sql/Creation tables.sql: DECIMAL(p,s) as decimal128(p,s), INT as int32,
+# CHAR/VARCHAR as string and row_hash as binary(16). Dimension columns hold
+# the name rather than the id. Child files carry the (address, city, state)
+# natural key in place of property_id, which only MySQL assigns. The
+# partition column is in the path, not the files, so
+# pyarrow.dataset(..., partitioning="hive") reads it back.
+#
+# Rows are buffered per partition and written as row groups of up to
+# ROW_GROUP_ROWS. Every file is written under a hidden name and renamed when
+# the export closes, so readers never see a partial run. pyarrow is only
+# needed when a file target is used.
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+PARTITIONS = ("state", "market")
+ROW_GROUP_ROWS = 50000
+BUFFER_ROWS = 250000  # buffered rows across all partitions before everything is flushed
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+KEY_COLUMNS = ("address", "city", "state")
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet and Arrow targets need the pyarrow package "
+                           "(pip install pyarrow)") from None
+    return pyarrow
+
+def export_column(column):
+    # market_id -> market: files hold the dimension name
+    return column[:-len("_id")] if column in PROPERTIES.dimensions else column
+
+def arrow_type(pa, sql_type):
+    if sql_type == "INT":
+        return pa.int32()
+    if sql_type.startswith("DECIMAL"):
+        precision, scale = map(int, sql_type[len("DECIMAL("):-1].split(","))
+        return pa.decimal128(precision, scale)
+    if sql_type.startswith("BINARY"):
+        return pa.binary(int(sql_type[len("BINARY("):-1]))
+    return pa.string()
+
+def _converter(sql_type):
+    # Feed value -> value of the Arrow type, or None when it does not fit;
+    # unvalidated feeds still produce a file, with the bad values counted
+    if sql_type == "INT":
+        def convert(value):
+            number = int(value)
+            if number != value and not isinstance(value, str):
+                raise ValueError(value)
+            return number
+    elif sql_type.startswith("DECIMAL"):
+        precision, scale = map(int, sql_type[len("DECIMAL("):-1].split(","))
+        quantum = Decimal(1).scaleb(-scale)
+
+        def convert(value):
+            number = Decimal(str(value)).quantize(quantum, rounding=ROUND_HALF_UP)
+            if not number.is_finite() or number.adjusted() >= precision - scale:
+                raise ValueError(value)
+            return number
+    elif sql_type.startswith("BINARY"):
+        return lambda value: value
+    else:
+        convert = str
+
+    def checked(value):
+        if value is None:
+            return None
+        try:
+            return convert(value)
+        except (ValueError, TypeError, InvalidOperation):
+            metrics.count("export_bad_values")
+            return None
+    return checked
+
+def table_layouts(partition_by):
+    # {table: (export columns, SQL types)}; the partition column is left out
+    prop_columns = [(export_column(col), PROPERTIES.types[col]) for col in PROPERTIES.columns]
+    key = [(col, PROPERTIES.types[col]) for col in KEY_COLUMNS]
+    layouts = {"properties": prop_columns}
+    for mapping in CHILD_MAPPINGS:
+        layouts[mapping.table] = key + [(col, mapping.types[col]) for col in mapping.columns] \
+            + [("row_hash", "BINARY(16)")]
+    return {table: [(col, sql_type) for col, sql_type in columns if col != partition_by]
+            for table, columns in layouts.items()}
+
+def open_export(directory, fmt, partition_by="state", tag=None, buffer_rows=BUFFER_ROWS):
+    pa = _pyarrow()
+    layouts = table_layouts(partition_by)
+    return {
+        "pa": pa,
+        "directory": directory,
+        "format": fmt,
+        "partition_by": partition_by,
+        "partition_index": PROPERTIES.columns.index(
+            partition_by if partition_by == "state" else f"{partition_by}_id"),
+        "tag": tag or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}",
+        "schemas": {table: pa.schema([(col, arrow_type(pa, t)) for col, t in columns])
+                    for table, columns in layouts.items()},
+        "converters": {table: [_converter(t) for _, t in columns]
+                       for table, columns in layouts.items()},
+        "buffers": {},  # (table, partition) -> [rows]
+        "buffered": 0,
+        "buffer_rows": buffer_rows,
+        "writers": {},  # (table, partition) -> (hidden path, final path, writer, file)
+    }
+
+def _partition_path(export, table, partition):
+    value = NULL_PARTITION if partition is None else quote(str(partition), safe=" ")
+    directory = os.path.join(export["directory"], table, f"{export['partition_by']}={value}")
+    name = f"part-{export['tag']}{FORMATS[export['format']]}"
+    return os.path.join(directory, "." + name), os.path.join(directory, name)
+
+def _writer(export, table, partition):
+    key = (table, partition)
+    if key not in export["writers"]:
+        pa, schema = export["pa"], export["schemas"][table]
+        hidden, final = _partition_path(export, table, partition)
+        os.makedirs(os.path.dirname(hidden), exist_ok=True)
+        if export["format"] == "parquet":
+            writer, sink = pa.parquet.ParquetWriter(hidden, schema), None
+        else:
+            sink = pa.OSFile(hidden, "wb")
+            writer = pa.ipc.new_file(sink, schema)
+        export["writers"][key] = (hidden, final, writer, sink)
+    return export["writers"][key][2]
+
+def _flush(export, table, partition):
+    rows = export["buffers"].pop((table, partition), None)
+    if not rows:
+        return
+    export["buffered"] -= len(rows)
+    start = time.perf_counter()
+    pa, schema = export["pa"], export["schemas"][table]
+    arrays = [pa.array([convert(row[i]) for row in rows], type=field.type)
+              for i, (field, convert) in enumerate(zip(schema, export["converters"][table]))]
+    batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+    writer = _writer(export, table, partition)
+    if export["format"] == "parquet":
+        writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+    metrics.observe("insert_latency_seconds", time.perf_counter() - start,
+                    table=table, sink=export["format"])
+    metrics.count("rows_out", len(rows), table=table, sink=export["format"])
+
+def write_export(export, batch):
+    # Buffers a transformed batch of (key, parent row, children); returns the
+    # number of parent rows taken
+    index = export["partition_index"]
+    buffers = export["buffers"]
+    drop_key_column = export["partition_by"] in KEY_COLUMNS
+    added = 0
+    for key, prop_row, children in batch:
+        partition = prop_row[index]
+        buffers.setdefault(("properties", partition), []).append(
+            prop_row[:index] + prop_row[index + 1:])
+        if drop_key_column:
+            key = tuple(value for col, value in zip(KEY_COLUMNS, key)
+                        if col != export["partition_by"])
+        for mapping, rows in zip(CHILD_MAPPINGS, children):
+            if rows:
+                buffers.setdefault((mapping.table, partition), []).extend(
+                    key + row for row in rows)
+                added += len(rows)
+    export["buffered"] += len(batch) + added
+
+    if export["buffered"] > export["buffer_rows"]:
+        for table, partition in list(buffers):
+            _flush(export, table, partition)
+    else:
+        for (table, partition), rows in list(buffers.items()):
+            if len(rows) >= ROW_GROUP_ROWS:
+                _flush(export, table, partition)
+    return len(batch)
+
+def close_export(export, keep=True):
+    # Flushes and closes every file, then renames them into place; with
+    # keep=False (a failed run) the files are deleted instead. Returns the
+    # paths written.
+    if keep:
+        for table, partition in list(export["buffers"]):
+            _flush(export, table, partition)
+    written = []
+    for hidden, final, writer, sink in export["writers"].values():
+        writer.close()
+        if sink is not None:
+            sink.close()
+        if keep:
+            os.replace(hidden, final)
+            written.append(final)
+        else:
+            os.remove(hidden)
+    export["writers"] = {}
+    export["buffers"] = {}
+    metrics.count("export_files", len(written), sink=export["format"])
+    return written
@@ -0,0 +1,200 @@
+import argparse
+import gzip
+import json
+import random
+import re
+
+from field_registry import CHILD_MAPPINGS, CHILD_SOURCES, PROPERTIES
+
+# Writes a synthetic property feed in the same shape as the real one: a
+# top-level JSON array of property records with nested Valuation, HOA and
+# Rehab lists. Fields and value ranges follow the field registry, so the feed
+# stays loadable as the schema changes. Records are written as they are made,
+# so a 10M record feed needs no more memory than a 10k one.
+
+OUTPUT_PATH = "fake_property_data.json"
+
+STREETS = (
+    "Main St", "Oak Ave", "Pine St", "Maple Dr", "Cedar Ln", "Elm St", "Lake Rd",
+    "Hill St", "Park Ave", "Washington Blvd", "Sunset Dr", "River Rd",
+)
+
+# (city, state, latitude, longitude, zip prefix)
+CITIES = (
+    ("Dallas", "TX", 32.78, -96.80, "752"), ("Houston", "TX", 29.76, -95.37, "770"),
+    ("Atlanta", "GA", 33.75, -84.39, "303"), ("Phoenix", "AZ", 33.45, -112.07, "850"),
+    ("Memphis", "TN", 35.15, -90.05, "381"), ("Tampa", "FL", 27.95, -82.46, "336"),
+    ("Charlotte", "NC", 35.23, -80.84, "282"), ("Columbus", "OH", 39.96, -83.00, "432"),
+    ("Indianapolis", "IN", 39.77, -86.16, "462"), ("Kansas City", "MO", 39.10, -94.58, "641"),
+)
+
+CHOICES = {
+    "Reviewed_Status": ("Reviewed", "Pending", "Rejected"),
+    "Most_Recent_Status": ("Active", "Pending", "Sold", "Off Market"),
+    "Source": ("MLS", "Wholesaler", "Auction", "Off Market"),
+    "Occupancy": ("Vacant", "Tenant", "Owner"),
+    "Flood": ("Zone X", "Zone A", "Zone AE"),
+    "Property_Type": ("Single Family", "Duplex", "Townhouse", "Condo"),
+    "Highway": ("Yes", "No"),
+    "Train": ("Yes", "No"),
+    "Water": ("Municipal", "Well"),
+    "Sewage": ("Municipal", "Septic"),
+    "Parking": ("Garage", "Driveway", "Street", "Carport"),
+    "Layout": ("Ranch", "Two Story", "Split Level"),
+    "Selling_Reason": ("Relocation", "Inherited", "Downsizing", "Financial"),
+    "Final_Reviewer": ("A. Smith", "B. Jones", "C. Lee", "D. Patel"),
+}
+
+# Field -> (low, high) for numeric fields where the column range is not realistic
+RANGES = {
+    "Tax_Rate": (0.5, 3.0), "SQFT_Basement": (0, 1500), "Year_Built": (1900, 2023),
+    "SQFT_MU": (0, 800), "SQFT_Total": (600, 4500), "Bed": (1, 6), "Bath": (1, 4),
+    "Net_Yield": (2.0, 12.0), "IRR": (4.0, 20.0), "Neighborhood_Rating": (1, 10),
+    "Taxes": (500.0, 12000.0), "School_Average": (1.0, 10.0),
+    "List_Price": (60000.0, 650000.0), "Previous_Rent": (700.0, 3500.0),
+    "ARV": (80000.0, 750000.0), "Expected_Rent": (800.0, 4000.0),
+    "Zestimate": (60000.0, 700000.0), "Rent_Zestimate": (700.0, 3800.0),
+    "Low_FMR": (600.0, 1500.0), "High_FMR": (1500.0, 3500.0),
+    "Redfin_Value": (60000.0, 700000.0), "HOA": (0.0, 450.0),
+    "Underwriting_Rehab": (0.0, 90000.0), "Rehab_Calculation": (0.0, 90000.0),
+}
+
+# Ways a generated record is made invalid; each trips one validation rule
+INVALID_KINDS = (
+    ("Zip", None),
+    ("Tax_Rate", 250),
+    ("Tax_Rate", "n/a"),
+    ("Bed", -1),
+    ("Bed", "three"),
+    ("Latitude", None),
+    ("Pool", "Maybe"),
+    ("State", "Texas"),
+    ("Year_Built", "unknown"),
+)
+
+def value_generator(field, sql_type):
+    # Returns rng -> value for one source field, from its range, choices or
+    # DDL type
+    decimal = re.match(r"DECIMAL\((\d+),(\d+)\)", sql_type)
+    length = re.match(r"(?:VAR)?CHAR\((\d+)\)", sql_type)
+    if field in CHOICES:
+        choices = CHOICES[field]
+        return lambda rng: rng.choice(choices)
+    if decimal:
+        precision, scale = int(decimal.group(1)), int(decimal.group(2))
+        low, high = RANGES.get(field, (0, 10 ** min(precision - scale, 6) - 1))
+        return lambda rng: round(rng.uniform(low, high), scale)
+    if sql_type == "INT":
+        low, high = RANGES.get(field, (0, 5000))
+        return lambda rng: rng.randint(low, high)
+    if length and int(length.group(1)) <= 10:
+        return lambda rng: rng.choice(("Yes", "No"))
+    return lambda rng: f"{field.replace('_', ' ')} {rng.randint(1, 50)}"
+
+def mapping_generators(mapping, skip=()):
+    return [(field, value_generator(field, mapping.types[column]))
+            for field, column in zip(mapping.fields, mapping.columns) if field not in skip]
+
+# Fields derived from the property key rather than drawn independently
+KEY_FIELDS = ("Property_Title", "Address", "Street_Address", "City", "State", "Zip",
+              "Latitude", "Longitude", "Market", "Subdivision")
+
+PROPERTY_GENERATORS = mapping_generators(PROPERTIES, skip=KEY_FIELDS)
+CHILD_GENERATORS = [(CHILD_SOURCES[m.table], mapping_generators(m)) for m in CHILD_MAPPINGS]
+
+def key_fields(key_id, rng):
+    # Every key id maps to one distinct (address, city, state)
+    street = STREETS[key_id % len(STREETS)]
+    number = key_id // len(STREETS) + 1
+    city, state, lat, lng, zip_prefix = CITIES[(key_id * 7919) % len(CITIES)]
+    address = f"{number} {street}"
+    return {
+        "Property_Title": f"{address}, {city}",
+        "Address": address,
+        "Street_Address": address,
+        "City": city,
+        "State": state,
+        "Zip": f"{zip_prefix}{key_id % 100:02d}",
+        "Latitude": round(lat + rng.uniform(-0.2, 0.2), 6),
+        "Longitude": round(lng + rng.uniform(-0.2, 0.2), 6),
+        "Market": city,
+        "Subdivision": f"{street.split()[0]} Estates",
+    }
+
+def fan_out(rng, mean):
+    # Whole part plus one more with probability of the fraction, so a mean
+    # of 1.5 gives one or two children per record
+    whole = int(mean)
+    return whole + (rng.random() < mean - whole)
+
+def generate_records(count, valuations=1.0, hoas=1.0, rehabs=1.0,
+                     duplicate_ratio=0.0, invalid_ratio=0.0, seed=0):
+    rng = random.Random(seed)
+    means = dict(zip((source for source, _ in CHILD_GENERATORS), (valuations, hoas, rehabs)))
+    keys = 0
+    for _ in range(count):
+        # A duplicate repeats an earlier key with freshly drawn attributes
+        if keys and rng.random() < duplicate_ratio:
+            key_id = rng.randrange(keys)
+        else:
+            key_id, keys = keys, keys + 1
+
+        record = key_fields(key_id, rng)
+        for field, generate in PROPERTY_GENERATORS:
+            record[field] = generate(rng)
+        for source, generators in CHILD_GENERATORS:
+            record[source] = [
+                {field: generate(rng) for field, generate in generators}
+                for _ in range(fan_out(rng, means[source]))
+            ]
+
+        if rng.random() < invalid_ratio:
+            field, value = rng.choice(INVALID_KINDS)
+            if value is None and field == "Zip":
+                del record[field]
+            else:
+                record[field] = value
+        yield record
+
+def write_feed(path, records):
+    # A JSON array, or one record per line for .ndjson and .ndjson.gz
+    ndjson = path.endswith((".ndjson", ".ndjson.gz"))
+    count = 0
+    with (gzip.open if path.endswith(".gz") else open)(path, "wt") as f:
+        if not ndjson:
+            f.write("[")
+        for record in records:
+            if not ndjson:
+                f.write(",\n" if count else "\n")
+            f.write(json.dumps(record, separators=(",", ":")))
+            if ndjson:
+                f.write("\n")
+            count += 1
+        if not ndjson:
+            f.write("\n]\n")
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic property feed")
+    parser.add_argument("output", nargs="?", default=OUTPUT_PATH)
+    parser.add_argument("--count", type=int, default=10000, help="property records to write")
+    parser.add_argument("--valuations", type=float, default=1.0,
+                        help="mean Valuation rows per record")
+    parser.add_argument("--hoas", type=float, default=1.0, help="mean HOA rows per record")
+    parser.add_argument("--rehabs", type=float, default=1.0, help="mean Rehab rows per record")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05,
+                        help="share of records that repeat an earlier (address, city, state)")
+    parser.add_argument("--invalid-ratio", type=float, default=0.02,
+                        help="share of records that fail validation")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    records = generate_records(args.count, args.valuations, args.hoas, args.rehabs,
+                               args.duplicate_ratio, args.invalid_ratio, args.seed)
+    written = write_feed(args.output, records)
+    print(f"Wrote {written} records to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+
+# Bounding-box and radius search over properties.location, the SRID 4326
+# point MySQL generates from latitude and longitude (sql/Creation
+# tables.sql). The SPATIAL index is reached with MBRContains over the box as
+# a polygon. MBRContains compares bounding rectangles only, so the polygon's
+# edges, which are geodesics in SRID 4326 rather than parallels, do not
+# matter: the rectangle always covers the corners. Candidates are then cut
+# to the exact latitude/longitude box and, for radius searches, to the
+# distance on the sphere. Rows with missing or out-of-range coordinates
+# carry POINT(0 0) and are left out by the same range check that
+# validation.py applies. Results are ordered by distance from the centre.
+#
+# Boxes do not wrap around the antimeridian (west must be below east).
+
+SRID = 4326
+EARTH_RADIUS_M = 6370986  # the sphere ST_Distance_Sphere uses by default
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+LIMIT = 100
+BENCHMARK_QUERIES = 50
+BENCHMARK_RADIUS_M = 5000
+BENCHMARK_MIN_ROWS = 1000000  # smaller tables understate what the index saves
+
+RESULT_COLUMNS = ("id", "address", "city", "state", "latitude", "longitude", "distance_m")
+
+VALID_COORDINATES = "p.latitude BETWEEN -90 AND 90 AND p.longitude BETWEEN -180 AND 180"
+
+def point_wkt(lat, lon):
+    # SRID 4326 reads WKT latitude first
+    return f"POINT({lat!r} {lon!r})"
+
+def box_wkt(south, west, north, east):
+    corners = [(south, west), (north, west), (north, east), (south, east), (south, west)]
+    return f"POLYGON(({', '.join(f'{lat!r} {lon!r}' for lat, lon in corners)}))"
+
+def radius_box(lat, lon, radius_m):
+    # The latitude/longitude box around a circle; a degree of longitude
+    # shrinks with the cosine of the latitude, so the poleward edge decides
+    dlat = radius_m / METERS_PER_DEGREE
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    widest = max(abs(south), abs(north))
+    dlon = 180.0 if widest >= 90 else min(180.0, dlat / math.cos(math.radians(widest)))
+    return south, max(-180.0, lon - dlon), north, min(180.0, lon + dlon)
+
+def check_box(south, west, north, east):
+    if not (-90 <= south <= north <= 90):
+        raise ValueError(f"South {south} and north {north} must be in -90..90, south first")
+    if not (-180 <= west <= east <= 180):
+        raise ValueError(f"West {west} and east {east} must be in -180..180, west first")
+
+def _search(cursor, box, center, radius_m=None, market=None, state=None, limit=LIMIT,
+            use_index=True):
+    south, west, north, east = box
+    center_wkt = point_wkt(*center)
+    distance = f"ST_Distance_Sphere(p.location, ST_PointFromText(%s, {SRID}))"
+    clauses = [VALID_COORDINATES, "p.latitude BETWEEN %s AND %s",
+               "p.longitude BETWEEN %s AND %s"]
+    params = [south, north, west, east]
+    if use_index:
+        clauses.insert(0, f"MBRContains(ST_PolygonFromText(%s, {SRID}), p.location)")
+        params.insert(0, box_wkt(*box))
+    if radius_m is not None:
+        clauses.append(f"{distance} <= %s")
+        params += [center_wkt, radius_m]
+    if state:
+        clauses.append("p.state = %s")
+        params.append(state)
+    if market:
+        clauses.append("p.market_id = (SELECT id FROM dim_market WHERE name = %s)")
+        params.append(market)
+    query = (
+        f"SELECT p.id, p.address, p.city, p.state, p.latitude, p.longitude, "
+        f"{distance} AS distance_m FROM properties p "
+        f"WHERE {' AND '.join(clauses)} ORDER BY distance_m, p.id LIMIT %s"
+    )
+    cursor.execute(query, [center_wkt] + params + [limit])
+    return cursor.fetchall()
+
+def search_box(cursor, south, west, north, east, market=None, state=None, limit=LIMIT,
+               use_index=True):
+    # Properties inside the box, nearest to its centre first
+    check_box(south, west, north, east)
+    center = ((south + north) / 2, (west + east) / 2)
+    return _search(cursor, (south, west, north, east), center, None, market, state, limit,
+                   use_index)
+
+def search_radius(cursor, lat, lon, radius_m, market=None, state=None, limit=LIMIT,
+                  use_index=True):
+    # Properties within radius_m meters of (lat, lon), nearest first
+    if radius_m <= 0:
+        raise ValueError(f"Radius must be positive, got {radius_m}")
+    box = radius_box(lat, lon, radius_m)
+    check_box(*box)
+    return _search(cursor, box, (lat, lon), radius_m, market, state, limit, use_index)
+
+# --- Benchmark ---
+
+def sample_centers(cursor, count, rng):
+    # Coordinates of random existing properties, so searches land where the data is
+    cursor.execute("SELECT MIN(id), MAX(id) FROM properties")
+    low, high = cursor.fetchone()
+    if low is None:
+        raise RuntimeError("properties is empty; load a feed before benchmarking")
+    ids = rng.sample(range(low, high + 1), min(count * 4, high - low + 1))
+    cursor.execute(
+        f"SELECT latitude, longitude FROM properties p "
+        f"WHERE id IN ({', '.join(['%s'] * len(ids))}) AND {VALID_COORDINATES}", ids)
+    centers = [(float(lat), float(lon)) for lat, lon in cursor.fetchall()]
+    if not centers:
+        raise RuntimeError("No properties with valid coordinates to search around")
+    rng.shuffle(centers)
+    return centers[:count]
+
+def query_plan(cursor, lat, lon, radius_m, use_index):
+    # (access type, key) of properties in the radius query's plan
+    box = radius_box(lat, lon, radius_m)
+    cursor.execute("EXPLAIN SELECT 1 FROM properties p WHERE "
+                   + (f"MBRContains(ST_PolygonFromText(%s, {SRID}), p.location) AND "
+                      if use_index else "")
+                   + "p.latitude BETWEEN %s AND %s AND p.longitude BETWEEN %s AND %s",
+                   ([box_wkt(*box)] if use_index else []) + [box[0], box[2], box[1], box[3]])
+    columns = [d[0] for d in cursor.description]
+    row = dict(zip(columns, cursor.fetchone()))
+    return row.get("type"), row.get("key")
+
+def benchmark(cursor, queries=BENCHMARK_QUERIES, radius_m=BENCHMARK_RADIUS_M, limit=LIMIT,
+              seed=0):
+    # Runs the same radius searches with the SPATIAL index and as a full
+    # scan; returns {mode: timings and plan} and the searches whose results differ
+    cursor.execute("SELECT COUNT(*) FROM properties")
+    total = cursor.fetchone()[0]
+    centers = sample_centers(cursor, queries, random.Random(seed))
+    results = {}
+    found = {}
+    for mode, use_index in (("index", True), ("scan", False)):
+        timings, rows = [], 0
+        for i, (lat, lon) in enumerate(centers):
+            start = time.perf_counter()
+            hits = search_radius(cursor, lat, lon, radius_m, limit=limit, use_index=use_index)
+            timings.append(time.perf_counter() - start)
+            rows += len(hits)
+            found.setdefault(i, []).append({row[0] for row in hits})
+        timings.sort()
+        results[mode] = {
+            "median_ms": statistics.median(timings) * 1000,
+            "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            "rows_per_query": rows / max(1, len(centers)),
+            "plan": query_plan(cursor, *centers[0], radius_m, use_index),
+        }
+    mismatches = [centers[i] for i, (a, b) in found.items() if a != b]
+    return total, results, mismatches
+
+# --- Command line ---
+
+def print_rows(rows):
+    for row in rows:
+        values = dict(zip(RESULT_COLUMNS, row))
+        print(f"{values['distance_m']:10.0f} m  #{values['id']}  {values['address']}, "
+              f"{values['city']}, {values['state']}  ({values['latitude']}, {values['longitude']})")
+    print(f"{len(rows)} properties")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search properties by location")
+    commands = parser.add_subparsers(dest="command", required=True)
+    box = commands.add_parser("box", help="properties inside a latitude/longitude box")
+    for name in ("south", "west", "north", "east"):
+        box.add_argument(name, type=float)
+    radius = commands.add_parser("radius", help="properties within a distance of a point")
+    radius.add_argument("lat", type=float)
+    radius.add_argument("lon", type=float)
+    radius.add_argument("meters", type=float)
+    for command in (box, radius):
+        command.add_argument("--market", help="only this market")
+        command.add_argument("--state", help="only this two-letter state")
+        command.add_argument("--limit", type=int, default=LIMIT)
+        command.add_argument("--scan", action="store_true",
+                             help="skip the SPATIAL index, to compare with a full scan")
+    bench = commands.add_parser("benchmark",
+                                help="time indexed radius searches against full scans")
+    bench.add_argument("--queries", type=int, default=BENCHMARK_QUERIES)
+    bench.add_argument("--radius", type=float, default=BENCHMARK_RADIUS_M, help="meters")
+    bench.add_argument("--limit", type=int, default=LIMIT)
+    bench.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    from etl_script import get_connection
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if args.command == "box":
+            print_rows(search_box(cursor, args.south, args.west, args.north, args.east,
+                                  args.market, args.state, args.limit, not args.scan))
+        elif args.command == "radius":
+            print_rows(search_radius(cursor, args.lat, args.lon, args.meters,
+                                     args.market, args.state, args.limit, not args.scan))
+        else:
+            total, results, mismatches = benchmark(cursor, args.queries, args.radius,
+                                                   args.limit, args.seed)
+            if total < BENCHMARK_MIN_ROWS:
+                print(f"Note: properties has {total} rows; load at least "
+                      f"{BENCHMARK_MIN_ROWS} for representative numbers")
+            print(f"{args.queries} radius searches of {args.radius:.0f} m over {total} properties")
+            for mode, r in results.items():
+                access, key = r["plan"]
+                print(f"  {mode:5s}  median {r['median_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+                      f"{r['rows_per_query']:6.1f} rows/query  plan {access} on {key or '-'}")
+            if results["index"]["median_ms"]:
+                speedup = results["scan"]["median_ms"] / results["index"]["median_ms"]
+                print(f"  index is {speedup:.1f}x faster at the median")
+            for lat, lon in mismatches:
+                print(f"Results differ between index and scan around ({lat}, {lon})")
+            if mismatches:
+                sys.exit(1)
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
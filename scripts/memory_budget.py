@@ -0,0 +1,173 @@
+import pickle
+import resource
+import sys
+import tempfile
+
+import feed_reader
+import metrics
+
+# --max-memory: a ceiling for one loader process, shared out over the buffers
+# whose size a run can choose. BASE_MB is left for the interpreter, the
+# modules and the MySQL driver. The rest is split by SHARES over the buffers
+# the run uses, and each one is sized from its share:
+#
+#   reader    NDJSON block size, for the parsed blocks and decode results in
+#             flight (feed_reader.py)
+#   batches   records per batch, from the measured size of a source record
+#             plus its transformed rows, times the batches in flight at once
+#   children  child rows of one batch waiting for their insert; past their
+#             share they spill to a temporary file (SpillList below)
+#   dedup     --dedup-memory of the seen-key set (seen_keys.py)
+#   export    rows buffered for the Parquet and Arrow files (file_sinks.py)
+#
+# Nothing else grows with the feed: checkpoints and seen keys past their
+# share live on disk, and the dimension and bundle caches are bounded. The
+# budget is kept by sizing buffers, not by a hard limit, so the run reports
+# its peak RSS next to the budget.
+
+BASE_MB = 100
+MIN_MB = 256
+SHARES = {"reader": 0.15, "batches": 0.45, "children": 0.15, "dedup": 0.1, "export": 0.15}
+PARSE_EXPANSION = 7  # parsed dicts per byte of NDJSON; ~6.2 measured on generate_feed.py feeds
+EXPORT_ROW_BYTES = 1000  # a buffered export row; ~920 measured, a parent per three children
+MIN_BLOCK_BYTES = 1 << 16
+SAMPLE_RECORDS = 20  # records per batch measured for the record size estimate
+SAMPLE_EVERY = 64  # extends between row size measurements of a SpillList
+
+def open_budget(max_mb, uses, in_flight=1, decode_workers=1, spill_dir=None):
+    # uses names the SHARES this run needs; in_flight is the number of
+    # batches that can be alive at once
+    weights = {name: SHARES[name] for name in uses}
+    usable = (max_mb - BASE_MB) * 2**20
+    return {
+        "max_mb": max_mb,
+        "shares": {name: int(usable * w / sum(weights.values())) for name, w in weights.items()},
+        "in_flight": in_flight,
+        "decode_workers": decode_workers,
+        "spill_dir": spill_dir,
+        "record_bytes": 0.0,
+    }
+
+def share(budget, name):
+    return budget["shares"].get(name, 0)
+
+def deep_size(obj):
+    # Bytes held by a record or row: containers plus everything they hold
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(v) for v in obj)
+    return size
+
+def _sample(items):
+    step = max(1, len(items) // SAMPLE_RECORDS)
+    return items[::step][:SAMPLE_RECORDS]
+
+# --- Sizes ---
+
+def block_bytes(budget):
+    # NDJSON bytes per parse task: every decode worker holds a parsed block,
+    # the reader holds one more, and each worker queues DECODE_AHEAD results
+    if budget is None:
+        return feed_reader.BLOCK_BYTES
+    workers = max(1, budget["decode_workers"])
+    blocks = PARSE_EXPANSION * (workers + 1) + 2 * workers * feed_reader.DECODE_AHEAD
+    return max(MIN_BLOCK_BYTES, min(feed_reader.BLOCK_BYTES, share(budget, "reader") // blocks))
+
+def measure_batch(budget, records, transformed):
+    # Updates the bytes per record from a sample of a batch, before and after
+    # its transform; both are alive until the batch is written
+    if not records or not transformed:
+        return
+    record_bytes = sum(map(deep_size, _sample(records))) / len(_sample(records)) \
+        + sum(map(deep_size, _sample(transformed))) / len(_sample(transformed))
+    # Weighted like batch_sizing.py, but a bigger record counts straight away
+    previous = budget["record_bytes"]
+    budget["record_bytes"] = max(record_bytes, 0.8 * previous + 0.2 * record_bytes)
+
+def batch_records(budget, default):
+    # default, or fewer records if the batches in flight would outgrow their share
+    if not budget["record_bytes"]:
+        return default
+    fits = int(share(budget, "batches") / budget["in_flight"] / budget["record_bytes"])
+    return max(1, min(default, fits))
+
+def export_rows(budget, default):
+    if budget is None:
+        return default
+    return max(1, min(default, share(budget, "export") // EXPORT_ROW_BYTES))
+
+# --- Spilled rows ---
+
+class SpillList(list):
+    # Rows of one table waiting for their insert. Once their estimated size
+    # passes the limit they are pickled to a temporary file and the list is
+    # emptied; row_chunks() streams them back in the order they were added.
+    # The children share is split over the lists of a batch, half for the
+    # rows held and half for a chunk read back.
+
+    def __init__(self, budget, table, lists=1):
+        super().__init__()
+        self.table = table
+        self.limit = max(1, share(budget, "children") // (2 * lists))
+        self.spill_dir = budget["spill_dir"]
+        self.row_bytes = 0.0
+        self.extends = 0
+        self.file = None
+
+    def extend(self, rows):
+        list.extend(self, rows)
+        if not self:
+            return
+        if not self.row_bytes or self.extends % SAMPLE_EVERY == 0:
+            self.row_bytes = max(self.row_bytes, deep_size(self[-1]))
+        self.extends += 1
+        if len(self) * self.row_bytes > self.limit:
+            self.spill()
+
+    def spill(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix="etl_rows_", dir=self.spill_dir)
+            metrics.count("spill_files", table=self.table)
+        start = self.file.tell()
+        pickle.dump(self[:], self.file, pickle.HIGHEST_PROTOCOL)
+        metrics.count("spill_bytes", self.file.tell() - start, table=self.table)
+        metrics.count("spill_rows", len(self), table=self.table)
+        del self[:]
+
+def row_chunks(rows):
+    # rows as lists to insert one after another: the spilled ones first, then
+    # those still in memory. A SpillList's file is closed, and so deleted,
+    # once it has been read.
+    spilled = getattr(rows, "file", None)
+    if spilled is not None:
+        rows.file = None
+        with spilled:
+            spilled.seek(0)
+            while True:
+                try:
+                    chunk = pickle.load(spilled)
+                except EOFError:
+                    break
+                yield chunk
+    if rows:
+        yield rows
+
+# --- Report ---
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux; RUSAGE_CHILDREN gives the largest child
+    return resource.getrusage(who).ru_maxrss / 1024
+
+def report(budget):
+    return {
+        "max_memory_mb": budget["max_mb"],
+        "shares_mb": {name: round(size / 2**20, 1) for name, size in budget["shares"].items()},
+        "record_bytes": round(budget["record_bytes"]),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_child_rss_mb": round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        "spill_bytes": sum(metrics.counter_totals("spill_bytes").values()),
+        "spill_files": sum(metrics.counter_totals("spill_files").values()),
+        "spill_rows": sum(metrics.counter_totals("spill_rows").values()),
+    }
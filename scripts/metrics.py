@@ -0,0 +1,211 @@
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Run metrics shared by the loaders: counters, latency and size histograms
+# and wall time per stage, all keyed by name plus optional labels. State is
+# per process; worker processes send snapshot() to the coordinator, which
+# folds them in with merge(). At the end of a run the same numbers are
+# written as a JSON report and as a Prometheus textfile.
+
+PREFIX = "etl"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Histogram name -> bucket upper bounds; +Inf is implicit
+BUCKETS = {
+    "insert_latency_seconds": LATENCY_BUCKETS,
+    "commit_latency_seconds": LATENCY_BUCKETS,
+    "batch_size": SIZE_BUCKETS,
+    "statement_rows": SIZE_BUCKETS,
+}
+
+HELP = {
+    "rows_in": "Source records read from the feed",
+    "rows_out": "Rows written, per table and sink",
+    "rejected": "Source records rejected by validation",
+    "duplicates": "Records whose property already existed",
+    "unchanged": "Records skipped by incremental mode",
+    "failed": "Rows that failed to load",
+    "inserted": "New properties inserted",
+    "dimension_cache_hits": "Dimension names resolved from the in-process cache",
+    "dimension_cache_misses": "Dimension names looked up in the database",
+    "dimension_rows_added": "Names added to a dimension table",
+    "dedup_spilled_keys": "Seen natural keys written to sorted run files",
+    "dedup_disk_lookups": "Bloom filter positives checked against the run files",
+    "dedup_run_merges": "External merges of the seen-key run files",
+    "spill_files": "Temporary files child rows spilled to under --max-memory, per table",
+    "spill_bytes": "Bytes of child rows spilled to temporary files, per table",
+    "spill_rows": "Child rows spilled to temporary files, per table",
+    "export_files": "Parquet or Arrow files written, per format",
+    "export_bad_values": "Values written as null because they do not fit their column type",
+    "bundle_cache_hits": "Property bundles served from the in-process cache",
+    "bundle_cache_misses": "Property bundles read from the database",
+    "bundle_cache_stale": "Cached property bundles another write had made out of date",
+    "bundle_queries": "Queries issued by the property bundle read API",
+    "retries": "Batches replayed after a transient error, per MySQL error number",
+    "resumed": "Source records in chunks skipped by --resume",
+    "insert_latency_seconds": "Time per insert statement or LOAD DATA, per table and sink",
+    "commit_latency_seconds": "Time per commit",
+    "batch_size": "Records per loaded batch",
+    "statement_rows": "Rows per INSERT statement, per table",
+    "stage_seconds": "Wall time per loader stage",
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_stages = {}      # stage -> seconds
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def count(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    bounds = BUCKETS[name]
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(bounds) + 1) + [0.0]
+        hist[bisect.bisect_left(bounds, value)] += 1
+        hist[-1] += value
+
+def add_stage_time(stage, seconds):
+    with _lock:
+        _stages[stage] = _stages.get(stage, 0.0) + seconds
+
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(name, time.perf_counter() - start)
+
+def timed_iter(name, items):
+    # Charges the time spent producing each item, e.g. parsing, to a stage
+    items = iter(items)
+    while True:
+        start = time.perf_counter()
+        item = next(items, None)
+        add_stage_time(name, time.perf_counter() - start)
+        if item is None:
+            return
+        yield item
+
+def timed_commit(conn):
+    start = time.perf_counter()
+    conn.commit()
+    observe("commit_latency_seconds", time.perf_counter() - start)
+
+def value(name, **labels):
+    return _counters.get(_key(name, labels), 0)
+
+def counter_totals(name):
+    # {labels: value} for one counter
+    with _lock:
+        return {labels: val for (n, labels), val in _counters.items() if n == name}
+
+def histogram_totals(name):
+    # {labels: (observations, sum)} for one histogram
+    return {
+        labels: (sum(hist[:-1]), hist[-1])
+        for (hist_name, labels), hist in _histograms.items() if hist_name == name
+    }
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": list(_counters.items()),
+            "histograms": [(key, list(hist)) for key, hist in _histograms.items()],
+            "stages": dict(_stages),
+        }
+
+def merge(snap):
+    with _lock:
+        for key, val in snap["counters"]:
+            _counters[key] = _counters.get(key, 0) + val
+        for key, hist in snap["histograms"]:
+            mine = _histograms.setdefault(key, [0] * (len(hist) - 1) + [0.0])
+            for i, val in enumerate(hist):
+                mine[i] += val
+        for name, seconds in snap["stages"].items():
+            _stages[name] = _stages.get(name, 0.0) + seconds
+
+def _buckets(name, hist):
+    bounds = [str(b) for b in BUCKETS[name]] + ["+Inf"]
+    cumulative, total = [], 0
+    for bound, n in zip(bounds, hist[:-1]):
+        total += n
+        cumulative.append((bound, total))
+    return cumulative
+
+def report(**extra):
+    with _lock:
+        counters, histograms, stages = dict(_counters), dict(_histograms), dict(_stages)
+    result = dict(extra)
+    result["counters"] = [
+        {"name": name, "labels": dict(labels), "value": val}
+        for (name, labels), val in sorted(counters.items())
+    ]
+    result["histograms"] = [
+        {"name": name, "labels": dict(labels), "count": sum(hist[:-1]), "sum": hist[-1],
+         "buckets": dict(_buckets(name, hist))}
+        for (name, labels), hist in sorted(histograms.items())
+    ]
+    result["stage_seconds"] = stages
+    return result
+
+def write_report(path, **extra):
+    with open(path, "w") as f:
+        json.dump(report(**extra), f, indent=2, default=str)
+
+def _labels(labels, **more):
+    pairs = list(labels) + sorted(more.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def prometheus_text():
+    with _lock:
+        counters, histograms, stages = dict(_counters), dict(_histograms), dict(_stages)
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        metric = f"{PREFIX}_{name}_total"
+        lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} counter"]
+        lines += [f"{metric}{_labels(labels)} {val}"
+                  for (n, labels), val in sorted(counters.items()) if n == name]
+    for name in sorted({name for name, _ in histograms}):
+        metric = f"{PREFIX}_{name}"
+        lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} histogram"]
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            lines += [f"{metric}_bucket{_labels(labels, le=bound)} {total}"
+                      for bound, total in _buckets(name, hist)]
+            lines.append(f"{metric}_sum{_labels(labels)} {hist[-1]}")
+            lines.append(f"{metric}_count{_labels(labels)} {sum(hist[:-1])}")
+    if stages:
+        metric = f"{PREFIX}_stage_seconds"
+        lines += [f"# HELP {metric} {HELP['stage_seconds']}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{stage="{name}"}} {seconds}'
+                  for name, seconds in sorted(stages.items())]
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path):
+    # Written beside the target and renamed, so the textfile collector never
+    # reads a half-written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+import property_summary
+from etl_script import get_connection, match_key
+from field_registry import CHILD_MAPPINGS, CHILD_SOURCES, PROPERTIES
+
+# Read API for downstream services: a property with its valuations, HOA fees
+# and rehab estimates, in the shape of a source feed record. Parent fields
+# are keyed by source field name, with dimension names rather than ids, and
+# the children are listed under "Valuation", "HOA" and "Rehab". Values are
+# returned as MySQL gives them (DECIMAL as Decimal).
+#
+# A call takes a list of property ids or (address, city, state) keys and
+# costs at most four queries, whatever its size: one for the parents
+# through the property_details view and one IN (...) query per child table.
+# A call answered from the cache costs none. Each child row is read once,
+# where a join of all three tables would return the product of their counts.
+#
+# Bundles are kept in a bounded LRU cache per process, and a write by any
+# process is seen once the cached bundle is CACHE_SECONDS old. Callers that
+# need a write sooner pass check_versions=True: cached bundles are then
+# compared with property_summary.refreshed_at, which every loader updates
+# for the properties it writes, in one more query, and the changed ones are
+# read again. Loads that skip the summary (--no-summary, and --bulk-load
+# until its rebuild) change no versions, so CACHE_SECONDS still bounds what
+# the check misses. Bundles are shared with the cache, so callers must not
+# modify them.
+
+CACHE_SIZE = 10000  # bundles kept per process
+CACHE_SECONDS = 60.0  # age after which a cached bundle is read again anyway
+
+KEY_FIELDS = ("Address", "City", "State")
+
+# Parent columns read from property_details, which has the dimension names
+# under the column name without _id
+PARENT_COLUMNS = tuple(column[:-len("_id")] if column in PROPERTIES.dimensions else column
+                       for column in PROPERTIES.columns)
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # property id -> (time cached, version, bundle)
+_ids = {}  # match key -> property id, for the cached bundles
+
+def bundle_key(bundle):
+    return match_key(tuple(bundle.get(field) for field in KEY_FIELDS))
+
+# --- Cache ---
+
+def _cached(property_id, now):
+    # The cached (version, bundle), or None when it is missing or too old;
+    # needs _lock
+    entry = _cache.get(property_id)
+    if entry is None:
+        return None
+    if now - entry[0] > CACHE_SECONDS:
+        _forget(property_id)
+        return None
+    _cache.move_to_end(property_id)
+    return entry[1:]
+
+def _forget(property_id):
+    # Needs _lock
+    entry = _cache.pop(property_id, None)
+    # After --refresh the key may already belong to another cached id
+    if entry is not None and _ids.get(bundle_key(entry[2])) == property_id:
+        del _ids[bundle_key(entry[2])]
+
+def _store(bundles, now):
+    # bundles maps property ids to (version, bundle)
+    with _lock:
+        for property_id, (version, bundle) in bundles.items():
+            _forget(property_id)
+            _cache[property_id] = (now, version, bundle)
+            _ids[bundle_key(bundle)] = property_id
+        while len(_cache) > CACHE_SIZE:
+            _forget(next(iter(_cache)))
+
+def _current(cursor, cached):
+    # The ids of cached {property id: (version, bundle)} whose summary row
+    # still has the cached version. Another process may have written the
+    # rest, so they are dropped and read again.
+    ids = list(cached)
+    cursor.execute(
+        f"SELECT property_id, refreshed_at FROM {property_summary.TABLE} "
+        f"WHERE property_id IN ({_placeholders(len(ids))})", ids
+    )
+    versions = dict(cursor.fetchall())
+    metrics.count("bundle_queries")
+    current = {property_id for property_id in ids
+               if versions.get(property_id) == cached[property_id][0]}
+    stale = [property_id for property_id in ids if property_id not in current]
+    if stale:
+        metrics.count("bundle_cache_stale", len(stale))
+        with _lock:
+            for property_id in stale:
+                _forget(property_id)
+    return current
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _ids.clear()
+
+# --- Queries ---
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+def _fetch(cursor, where, params):
+    # {property id: (version, bundle)} of the parents matching where, a
+    # condition on property_details d, with their children. The version is
+    # read first, so a write that lands during the fetch leaves the bundle
+    # with an older version than its rows, and the next call reads it again.
+    cursor.execute(
+        f"SELECT d.id, s.refreshed_at, {', '.join('d.' + col for col in PARENT_COLUMNS)} "
+        f"FROM property_details d "
+        f"LEFT JOIN {property_summary.TABLE} s ON s.property_id = d.id WHERE {where}", params
+    )
+    versions, bundles = {}, {}
+    for row in cursor.fetchall():
+        versions[row[0]] = row[1]
+        bundles[row[0]] = dict(zip(PROPERTIES.fields, row[2:]))
+    metrics.count("bundle_queries")
+    if not bundles:
+        return {}
+    for bundle in bundles.values():
+        for mapping in CHILD_MAPPINGS:
+            bundle[CHILD_SOURCES[mapping.table]] = []
+
+    ids = list(bundles)
+    for mapping in CHILD_MAPPINGS:
+        cursor.execute(
+            f"SELECT property_id, {', '.join(mapping.columns)} FROM {mapping.table} "
+            f"WHERE property_id IN ({_placeholders(len(ids))}) ORDER BY property_id, id",
+            ids
+        )
+        source = CHILD_SOURCES[mapping.table]
+        for row in cursor.fetchall():
+            bundles[row[0]][source].append(dict(zip(mapping.fields, row[1:])))
+        metrics.count("bundle_queries")
+    return {property_id: (versions[property_id], bundle) for property_id, bundle in bundles.items()}
+
+def bundles_by_id(cursor, ids, check_versions=False):
+    # {property id: bundle}; ids without a property are left out. With
+    # check_versions, cached bundles written since are read again.
+    now = time.monotonic()
+    cached, missing = {}, []
+    with _lock:
+        for property_id in dict.fromkeys(ids):
+            entry = _cached(property_id, now)
+            if entry is None:
+                missing.append(property_id)
+            else:
+                cached[property_id] = entry
+    current = _current(cursor, cached) if cached and check_versions else set(cached)
+    found = {property_id: cached[property_id][1] for property_id in current}
+    missing.extend(property_id for property_id in cached if property_id not in current)
+    metrics.count("bundle_cache_hits", len(found))
+    if missing:
+        metrics.count("bundle_cache_misses", len(missing))
+        fetched = _fetch(cursor, f"d.id IN ({_placeholders(len(missing))})", missing)
+        _store(fetched, now)
+        found.update((property_id, bundle) for property_id, (_, bundle) in fetched.items())
+    return found
+
+def bundles_by_key(cursor, keys, check_versions=False):
+    # {(address, city, state): bundle} for the keys as given; keys without a
+    # property are left out
+    now = time.monotonic()
+    cached, missing = {}, []  # cached: key -> (property id, version, bundle)
+    with _lock:
+        for key in dict.fromkeys(tuple(key) for key in keys):
+            property_id = _ids.get(match_key(key))
+            entry = _cached(property_id, now) if property_id is not None else None
+            if entry is None:
+                missing.append(key)
+            else:
+                cached[key] = (property_id,) + entry
+    # A stale key is read again by key: after --refresh its id may belong to
+    # another property
+    if cached and check_versions:
+        current = _current(cursor, {property_id: (version, bundle)
+                                    for property_id, version, bundle in cached.values()})
+    else:
+        current = {property_id for property_id, _, _ in cached.values()}
+    found = {}
+    for key, (property_id, _, bundle) in cached.items():
+        if property_id in current:
+            found[key] = bundle
+        else:
+            missing.append(key)
+    metrics.count("bundle_cache_hits", len(found))
+    if missing:
+        metrics.count("bundle_cache_misses", len(missing))
+        fetched = _fetch(
+            cursor,
+            f"(d.address, d.city, d.state) IN ({', '.join(['(%s, %s, %s)'] * len(missing))})",
+            [value for key in missing for value in key]
+        )
+        _store(fetched, now)
+        by_key = {bundle_key(bundle): bundle for _, bundle in fetched.values()}
+        for key in missing:
+            bundle = by_key.get(match_key(key))
+            if bundle is not None:
+                found[key] = bundle
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print property bundles as JSON")
+    parser.add_argument("ids", nargs="*", type=int, help="property ids")
+    parser.add_argument("--key", nargs=3, action="append", default=[],
+                        metavar=("ADDRESS", "CITY", "STATE"), help="a natural key; repeatable")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        bundles = list(bundles_by_id(cursor, args.ids).values()) \
+            + list(bundles_by_key(cursor, args.key).values())
+    finally:
+        cursor.close()
+        conn.close()
+    print(json.dumps(bundles, indent=2, default=str))
@@ -0,0 +1,125 @@
+import time
+
+import metrics
+from field_registry import HOA_FEES, REHAB_ESTIMATES, VALUATIONS, read_ddl
+
+# property_summary is a read model with one row per property: its latest
+# valuation (the highest id), the HOA total and flag, and the rehab cost
+# totals and flags. Dashboards read it by primary key instead of LEFT JOINing
+# properties to all three child tables, which returns the product of the
+# child counts for every property.
+#
+# The loader refreshes the rows of the properties each batch touched, after
+# the batch commits. Every row is recomputed from the child tables, so child
+# rows deleted by --incremental or --duplicates last drop out too. Each child
+# table is grouped only over the touched ids through its (property_id,
+# row_hash) index. --bulk-load and --refresh load without those indexes, so
+# bulk_load.finish() rebuilds the whole table once the keys are back.
+#
+# Summed HOA and rehab columns become <column>_total. A flag is "Yes" when
+# any row says so, otherwise the largest value ("No" for Yes/No flags).
+# Columns follow the registry, and the DDL in sql/Creation tables.sql is
+# checked against them at import.
+
+TABLE = "property_summary"
+REFRESH_IDS = 1000  # property ids per refresh statement
+REBUILD_IDS = 50000  # id range per statement of a full rebuild
+
+def _is_flag(sql_type):
+    return sql_type.startswith(("VARCHAR", "CHAR"))
+
+def _aggregates(mapping):
+    # [(summary column, aggregate over the child table)]
+    aggregates = []
+    for col in mapping.columns:
+        if _is_flag(mapping.types[col]):
+            aggregates.append((col, f"CASE WHEN MAX({col} = 'Yes') THEN 'Yes' ELSE MAX({col}) END"))
+        else:
+            aggregates.append((f"{col}_total", f"SUM({col})"))
+    return aggregates
+
+HOA_AGGREGATES = _aggregates(HOA_FEES)
+REHAB_AGGREGATES = _aggregates(REHAB_ESTIMATES)
+
+COLUMNS = (
+    ("property_id", "valuation_count") + VALUATIONS.columns
+    + ("hoa_count",) + tuple(col for col, _ in HOA_AGGREGATES)
+    + ("rehab_count",) + tuple(col for col, _ in REHAB_AGGREGATES)
+)
+
+def check_ddl():
+    declared = [col for col, _ in read_ddl().get(TABLE, [])]
+    expected = list(COLUMNS) + ["refreshed_at"]
+    if declared != expected:
+        raise ValueError(f"{TABLE} in sql/Creation tables.sql should have the columns "
+                         f"{', '.join(expected)}")
+
+check_ddl()
+
+def _grouped(mapping, aggregates, suffix, condition):
+    select = ", ".join(f"{expr} AS {col}" for col, expr in aggregates)
+    return (f"SELECT property_id, COUNT(*) AS n, {select} FROM {mapping.table}{suffix} "
+            f"WHERE {condition} GROUP BY property_id")
+
+def summary_query(suffix, condition):
+    # REPLACE of the summary rows of the properties matching condition, a
+    # predicate on property_id with its own placeholders; the statement takes
+    # the condition's parameters four times
+    ids = condition.replace("property_id", "p.id")
+    values = ", ".join(f"v.{col}" for col in VALUATIONS.columns)
+    hoa = ", ".join(f"h.{col}" for col, _ in HOA_AGGREGATES)
+    rehab = ", ".join(f"r.{col}" for col, _ in REHAB_AGGREGATES)
+    return (
+        f"REPLACE INTO {TABLE}{suffix} ({', '.join(COLUMNS)}) "
+        f"SELECT p.id, COALESCE(vl.n, 0), {values}, COALESCE(h.n, 0), {hoa}, "
+        f"COALESCE(r.n, 0), {rehab} "
+        f"FROM properties{suffix} p "
+        f"LEFT JOIN (SELECT property_id, COUNT(*) AS n, MAX(id) AS latest_id "
+        f"FROM {VALUATIONS.table}{suffix} WHERE {condition} GROUP BY property_id) vl "
+        f"ON vl.property_id = p.id "
+        f"LEFT JOIN {VALUATIONS.table}{suffix} v ON v.id = vl.latest_id "
+        f"LEFT JOIN ({_grouped(HOA_FEES, HOA_AGGREGATES, suffix, condition)}) h "
+        f"ON h.property_id = p.id "
+        f"LEFT JOIN ({_grouped(REHAB_ESTIMATES, REHAB_AGGREGATES, suffix, condition)}) r "
+        f"ON r.property_id = p.id "
+        f"WHERE {ids}"
+    )
+
+def _run(cursor, query, params, sink, rows=None):
+    start = time.perf_counter()
+    cursor.execute(query, params * 4)
+    metrics.observe("insert_latency_seconds", time.perf_counter() - start, table=TABLE, sink=sink)
+    metrics.count("rows_out", cursor.rowcount if rows is None else rows, table=TABLE, sink=sink)
+
+def refresh(cursor, property_ids, suffix=""):
+    # Recomputes the summary rows of property_ids; the caller commits
+    property_ids = sorted(set(property_ids))
+    for i in range(0, len(property_ids), REFRESH_IDS):
+        chunk = property_ids[i:i + REFRESH_IDS]
+        condition = f"property_id IN ({', '.join(['%s'] * len(chunk))})"
+        # rowcount would count every replaced row twice
+        _run(cursor, summary_query(suffix, condition), chunk, "summary-refresh", len(chunk))
+
+def rebuild(cursor, conn, suffix=""):
+    # Recomputes every row, one committed id range at a time
+    with metrics.stage("summary"):
+        cursor.execute(f"DELETE FROM {TABLE}{suffix}")
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM properties{suffix}")
+        low, high = cursor.fetchone()
+        query = summary_query(suffix, "property_id BETWEEN %s AND %s")
+        for start in range(low or 0, (high or -1) + 1, REBUILD_IDS):
+            _run(cursor, query, [start, start + REBUILD_IDS - 1], "summary-rebuild")
+            conn.commit()
+        conn.commit()
+    print(f"Summary: rebuilt {TABLE}{suffix}")
+
+if __name__ == "__main__":
+    # Fills the table after sql/add_property_summary.sql, or repairs it
+    from etl_script import get_connection
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        rebuild(cursor, conn)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,103 @@
+import argparse
+import sys
+
+import bulk_load
+import property_summary
+
+# Full refresh through shadow tables. The load writes into empty copies of
+# the live tables (properties__shadow, ...), built the bulk_load.py way, so it
+# never takes a lock readers wait on. Once the copies pass verification one
+# RENAME TABLE moves every live table to the previous generation and every
+# shadow table live. RENAME TABLE is atomic across all the tables it names,
+# and foreign keys follow their parent: the replaced children keep pointing
+# at properties__previous and the new ones at properties. property_summary
+# belongs to the generation too and is rebuilt when the shadow is verified.
+
+SHADOW_SUFFIX = "__shadow"
+PREVIOUS_SUFFIX = "__previous"
+
+TABLES = ("properties",) + bulk_load.BULK_TABLES + (property_summary.TABLE,)
+CHILDREN_FIRST = bulk_load.BULK_TABLES + (property_summary.TABLE, "properties")  # drop order
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return cursor.fetchone()[0] > 0
+
+def generation_exists(cursor, suffix):
+    return all(table_exists(cursor, table + suffix) for table in TABLES)
+
+def drop_generation(cursor, suffix):
+    cursor.execute("DROP TABLE IF EXISTS " + ", ".join(table + suffix for table in CHILDREN_FIRST))
+
+def row_count(cursor, table):
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+def create_shadow(cursor, resume=False):
+    # Returns True when an interrupted refresh is picked up where it stopped
+    if resume and generation_exists(cursor, SHADOW_SUFFIX):
+        print("Refresh: resuming into the existing shadow tables")
+        return True
+    drop_generation(cursor, SHADOW_SUFFIX)
+    for table in TABLES:
+        # LIKE copies the columns and indexes but not the foreign keys
+        cursor.execute(f"CREATE TABLE {table}{SHADOW_SUFFIX} LIKE {table}")
+    bulk_load.start(cursor, SHADOW_SUFFIX)
+    return False
+
+def verify_shadow(cursor, conn):
+    # Rebuilds the shadow keys and checks the copies; returns a list of problems
+    problems = bulk_load.finish(cursor, conn, SHADOW_SUFFIX)
+    if not row_count(cursor, "properties" + SHADOW_SUFFIX) and row_count(cursor, "properties"):
+        problems.append(f"properties{SHADOW_SUFFIX} is empty; the feed loaded nothing")
+    return problems
+
+def rename(cursor, moves):
+    # moves is [(table, new name), ...], applied in order by one statement
+    cursor.execute("RENAME TABLE " + ", ".join(f"{old} TO {new}" for old, new in moves))
+
+def swap(cursor):
+    drop_generation(cursor, PREVIOUS_SUFFIX)
+    moves = []
+    for table in TABLES:
+        moves += [(table, table + PREVIOUS_SUFFIX), (table + SHADOW_SUFFIX, table)]
+    rename(cursor, moves)
+    print(f"Refresh: published {row_count(cursor, 'properties')} properties; "
+          f"the previous generation is kept as *{PREVIOUS_SUFFIX}")
+
+def rollback(cursor):
+    # Puts the previous generation back; the one it replaces becomes the
+    # shadow, which the next refresh drops
+    if not generation_exists(cursor, PREVIOUS_SUFFIX):
+        raise RuntimeError(f"No previous generation (*{PREVIOUS_SUFFIX} tables) to roll back to")
+    drop_generation(cursor, SHADOW_SUFFIX)
+    moves = []
+    for table in TABLES:
+        moves += [(table, table + SHADOW_SUFFIX), (table + PREVIOUS_SUFFIX, table)]
+    rename(cursor, moves)
+    print(f"Rolled back to the previous generation; the replaced tables are *{SHADOW_SUFFIX}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the shadow and previous table generations")
+    parser.add_argument("action", choices=("rollback", "drop-previous", "drop-shadow"))
+    args = parser.parse_args()
+
+    from etl_script import get_connection
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if args.action == "rollback":
+            rollback(cursor)
+        else:
+            drop_generation(cursor, PREVIOUS_SUFFIX if args.action == "drop-previous"
+                            else SHADOW_SUFFIX)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
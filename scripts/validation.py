@@ -0,0 +1,199 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from field_registry import PROPERTIES, field_types
+
+# Chunk-at-a-time validation and type coercion for property records. A chunk
+# is turned into one list per source field, every rule runs over whole
+# columns, and the result is a reason-code bitmask per row. Numeric fields are
+# coerced to their DDL type (sql/Creation tables.sql, via field_registry.py)
+# so that values MySQL would reject or silently round are caught here instead.
+
+MISSING_ADDRESS = 1 << 0
+MISSING_CITY = 1 << 1
+MISSING_STATE = 1 << 2
+MISSING_ZIP = 1 << 3
+INVALID_COORDINATES = 1 << 4
+INVALID_TAX_RATE = 1 << 5
+INVALID_TAX_RATE_TYPE = 1 << 6
+NEGATIVE_BED = 1 << 7
+INVALID_BED = 1 << 8
+INVALID_POOL = 1 << 9
+INVALID_TYPE = 1 << 10  # value does not fit its DDL column type
+
+REASONS = {
+    MISSING_ADDRESS: "Missing Address",
+    MISSING_CITY: "Missing City",
+    MISSING_STATE: "Missing State",
+    MISSING_ZIP: "Missing Zip",
+    INVALID_COORDINATES: "Invalid coordinates",
+    INVALID_TAX_RATE: "Invalid Tax_Rate",
+    INVALID_TAX_RATE_TYPE: "Invalid Tax_Rate type",
+    NEGATIVE_BED: "Negative bed count",
+    INVALID_BED: "Invalid bed count",
+    INVALID_POOL: "Unexpected Pool value",
+    INVALID_TYPE: "Value does not fit column type",
+}
+
+REQUIRED_FIELDS = (
+    ("Address", MISSING_ADDRESS),
+    ("City", MISSING_CITY),
+    ("State", MISSING_STATE),
+    ("Zip", MISSING_ZIP),
+)
+
+POOL_VALUES = ("Yes", "No", None)
+
+# Degrees either side of zero; properties.location only holds points on the globe
+COORDINATE_LIMITS = {"Latitude": 90, "Longitude": 180}
+
+# Source field -> (DECIMAL precision, scale) or None for INT, and source
+# field -> VARCHAR/CHAR length, both read from the DDL by the field registry
+NUMERIC_FIELDS, STRING_FIELDS = field_types(PROPERTIES)
+
+INT_MIN, INT_MAX = -(1 << 31), (1 << 31) - 1
+
+MISSING = object()  # key absent from the record, as opposed to present and null
+
+def _to_decimal(value):
+    if isinstance(value, bool):
+        return Decimal(int(value))
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, (int, Decimal)):
+        return Decimal(value)
+    return Decimal(str(value).strip())
+
+def coerce_numeric(values, spec):
+    # Returns the coerced column and a parallel list of failure flags. Absent,
+    # null and blank values become None; everything else must parse and fit.
+    coerced, bad = [], []
+    if spec is None:
+        low, high, quantum = INT_MIN, INT_MAX, None
+    else:
+        precision, scale = spec
+        high = Decimal(10) ** (precision - scale)
+        low, quantum = -high, Decimal(1).scaleb(-scale)
+
+    for value in values:
+        if value is MISSING or value is None or (isinstance(value, str) and not value.strip()):
+            coerced.append(None)
+            bad.append(False)
+            continue
+        try:
+            number = _to_decimal(value)
+            if not number.is_finite():
+                raise InvalidOperation
+            if quantum is None:
+                if number != number.to_integral_value():
+                    raise InvalidOperation
+                number = int(number)
+                ok = low <= number <= high
+            else:
+                number = number.quantize(quantum, rounding=ROUND_HALF_UP)
+                ok = low < number < high
+        except (InvalidOperation, ValueError):
+            coerced.append(None)
+            bad.append(True)
+            continue
+        coerced.append(number if ok else None)
+        bad.append(not ok)
+    return coerced, bad
+
+def coerce_string(values, length):
+    coerced, bad = [], []
+    for value in values:
+        if value is MISSING or value is None:
+            coerced.append(None)
+            bad.append(False)
+            continue
+        text = value if isinstance(value, str) else str(value)
+        coerced.append(text)
+        bad.append(len(text) > length)
+    return coerced, bad
+
+def _flag(codes, flags, code):
+    return [c | code if f else c for c, f in zip(codes, flags)]
+
+def validate_chunk(records):
+    """Validate and coerce a chunk of property records in one call.
+
+    Returns ``(columns, codes, bad_fields)``: the coerced value lists keyed by
+    source field, one reason-code bitmask per row (0 means valid) and, for rows
+    with INVALID_TYPE, the fields that failed coercion.
+    """
+    raw = {
+        field: [record.get(field, MISSING) for record in records]
+        for field in set(NUMERIC_FIELDS) | set(STRING_FIELDS)
+    }
+    codes = [0] * len(records)
+
+    for field, code in REQUIRED_FIELDS:
+        codes = _flag(codes, [value is MISSING or not value for value in raw[field]], code)
+
+    columns, failures = {}, {}
+    for field, spec in NUMERIC_FIELDS.items():
+        columns[field], failures[field] = coerce_numeric(raw[field], spec)
+    for field, length in STRING_FIELDS.items():
+        columns[field], failures[field] = coerce_string(raw[field], length)
+
+    # A coordinate or bed count that is present but null or blank was always
+    # rejected, since float() and int() refuse it; coerce_numeric() only
+    # turns it into None, so the rules check the coerced value
+    for field, limit in COORDINATE_LIMITS.items():
+        flags = [bad or (value is not MISSING and degrees is None)
+                 or (degrees is not None and not -limit <= degrees <= limit)
+                 for bad, value, degrees in zip(failures[field], raw[field], columns[field])]
+        codes = _flag(codes, flags, INVALID_COORDINATES)
+
+    tax_rates = columns["Tax_Rate"]
+    codes = _flag(codes, failures["Tax_Rate"], INVALID_TAX_RATE_TYPE)
+    codes = _flag(codes, [rate is not None and not 0 <= rate <= 100 for rate in tax_rates],
+                  INVALID_TAX_RATE)
+
+    beds = columns["Bed"]
+    codes = _flag(codes, [bad or (value is not MISSING and bed is None)
+                          for bad, value, bed in zip(failures["Bed"], raw["Bed"], beds)],
+                  INVALID_BED)
+    codes = _flag(codes, [bed is not None and bed < 0 for bed in beds], NEGATIVE_BED)
+
+    codes = _flag(codes,
+                  [value not in POOL_VALUES and value is not MISSING for value in raw["Pool"]],
+                  INVALID_POOL)
+
+    # Rule-specific codes already cover these fields
+    ruled = {"Latitude", "Longitude", "Tax_Rate", "Bed"}
+    bad_fields = {}
+    for field, flags in failures.items():
+        if field in ruled:
+            continue
+        for row, bad in enumerate(flags):
+            if bad:
+                bad_fields.setdefault(row, []).append(field)
+    codes = _flag(codes, [row in bad_fields for row in range(len(records))], INVALID_TYPE)
+
+    return columns, codes, bad_fields
+
+def describe(code, bad_fields=()):
+    reasons = [message for bit, message in REASONS.items() if code & bit and bit != INVALID_TYPE]
+    if code & INVALID_TYPE:
+        reasons.append(f"{REASONS[INVALID_TYPE]}: {', '.join(bad_fields)}")
+    return reasons
+
+def apply_coerced(records, columns):
+    # Writes coerced values back so the row builders pick them up unchanged
+    for field, values in columns.items():
+        for record, value in zip(records, values):
+            if value is not None or field in record:
+                record[field] = value
+
+def write_rejects(path, rows, codes, bad_fields):
+    # One append per chunk instead of reopening the log for every bad row;
+    # rows holds the feed row number of each record in the chunk
+    lines = [
+        f"Row {row}: {describe(code, bad_fields.get(i, ()))}\n"
+        for i, (row, code) in enumerate(zip(rows, codes)) if code
+    ]
+    if lines:
+        with open(path, "a") as log:
+            log.writelines(lines)
+    return len(lines)
@@ -1,35 +1,135 @@
+-- Dimension tables for low-cardinality property attributes. properties
+-- stores <attribute>_id; the loader resolves names to ids through a cache
+-- (scripts/dimensions.py) and adds unseen names here. Names compare as exact
+-- binary strings, so the cache and the unique index agree on what is new.
+CREATE TABLE dim_reviewed_status (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_reviewed_status_name (name)
+);
+
+CREATE TABLE dim_most_recent_status (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_most_recent_status_name (name)
+);
+
+CREATE TABLE dim_source (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_source_name (name)
+);
+
+CREATE TABLE dim_market (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_market_name (name)
+);
+
+CREATE TABLE dim_occupancy (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_occupancy_name (name)
+);
+
+CREATE TABLE dim_flood (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_flood_name (name)
+);
+
+CREATE TABLE dim_property_type (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_property_type_name (name)
+);
+
+CREATE TABLE dim_highway (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_highway_name (name)
+);
+
+CREATE TABLE dim_train (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_train_name (name)
+);
+
+CREATE TABLE dim_water (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_water_name (name)
+);
+
+CREATE TABLE dim_sewage (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_sewage_name (name)
+);
+
+CREATE TABLE dim_parking (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_parking_name (name)
+);
+
+CREATE TABLE dim_layout (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_layout_name (name)
+);
+
+-- Selling reason and final reviewer are free text with many distinct values,
+-- and an insert that meets a name already there still uses up an id, so
+-- their ids are INT where the other dimensions fit in SMALLINT
+CREATE TABLE dim_selling_reason (
+    id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_selling_reason_name (name)
+);
+
+CREATE TABLE dim_final_reviewer (
+    id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_final_reviewer_name (name)
+);
+
+-- The (address, city, state) natural key compares as binary strings with
+-- trailing spaces ignored (utf8mb4_bin pads, and CHAR drops them), so the
+-- loaders' match_key() in scripts/etl_script.py can reproduce it exactly.
 CREATE TABLE properties (
     id INT AUTO_INCREMENT PRIMARY KEY,
     property_title VARCHAR(255),
-    address VARCHAR(255),
-    reviewed_status VARCHAR(50),
-    most_recent_status VARCHAR(50),
-    source VARCHAR(100),
-    market VARCHAR(100),
-    occupancy VARCHAR(50),
-    flood VARCHAR(100),
+    address VARCHAR(255) COLLATE utf8mb4_bin,
+    reviewed_status_id SMALLINT UNSIGNED,
+    most_recent_status_id SMALLINT UNSIGNED,
+    source_id SMALLINT UNSIGNED,
+    market_id SMALLINT UNSIGNED,
+    occupancy_id SMALLINT UNSIGNED,
+    flood_id SMALLINT UNSIGNED,
     street_address VARCHAR(255),
-    city VARCHAR(100),
-    state CHAR(2),
+    city VARCHAR(100) COLLATE utf8mb4_bin,
+    state CHAR(2) COLLATE utf8mb4_bin,
     zip VARCHAR(10),
-    property_type VARCHAR(100),
-    highway VARCHAR(50),
-    train VARCHAR(50),
+    property_type_id SMALLINT UNSIGNED,
+    highway_id SMALLINT UNSIGNED,
+    train_id SMALLINT UNSIGNED,
     tax_rate DECIMAL(5,2),
     sqft_basement INT,
     htw VARCHAR(10),
     pool VARCHAR(10),
     commercial VARCHAR(10),
-    water VARCHAR(50),
-    sewage VARCHAR(50),
+    water_id SMALLINT UNSIGNED,
+    sewage_id SMALLINT UNSIGNED,
     year_built INT,
     sqft_mu INT,
     sqft_total INT,
-    parking VARCHAR(100),
+    parking_id SMALLINT UNSIGNED,
     bed INT,
     bath INT,
     basement_yes_no VARCHAR(10),
-    layout VARCHAR(100),
+    layout_id SMALLINT UNSIGNED,
     net_yield DECIMAL(5,2),
     irr DECIMAL(5,2),
     rent_restricted VARCHAR(10),
@@ -38,10 +138,20 @@ CREATE TABLE properties (
     longitude DECIMAL(10,6),
     subdivision VARCHAR(100),
     taxes DECIMAL(10,2),
-    selling_reason VARCHAR(255),
+    selling_reason_id INT UNSIGNED,
     seller_retained_broker VARCHAR(10),
-    final_reviewer VARCHAR(100),
-    school_average DECIMAL(4,2)
+    final_reviewer_id INT UNSIGNED,
+    school_average DECIMAL(4,2),
+    -- Filled by the server from latitude/longitude; rows whose coordinates
+    -- are missing or off the globe get POINT(0 0), and scripts/geo_search.py
+    -- leaves them out. A SPATIAL index needs a NOT NULL column.
+    location POINT SRID 4326 GENERATED ALWAYS AS (ST_PointFromText(
+        IF(latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180,
+           CONCAT('POINT(', latitude, ' ', longitude, ')'), 'POINT(0 0)'),
+        4326)) STORED NOT NULL,
+    UNIQUE KEY uq_properties_natural_key (address, city, state),
+    KEY idx_properties_market_status (market_id, most_recent_status_id),
+    SPATIAL KEY idx_properties_location (location)
 );
 
 CREATE TABLE hoa_fees (
@@ -49,6 +159,8 @@ CREATE TABLE hoa_fees (
     property_id INT,
     hoa DECIMAL(10,2),
     hoa_flag VARCHAR(10),
+    row_hash BINARY(16) NOT NULL,
+    UNIQUE KEY uq_hoa_fees_row (property_id, row_hash),
     FOREIGN KEY (property_id) REFERENCES properties(id)
 );
 
@@ -68,6 +180,8 @@ CREATE TABLE rehab_estimates (
     windows_flag VARCHAR(10),
     landscaping_flag VARCHAR(10),
     trashout_flag VARCHAR(10),
+    row_hash BINARY(16) NOT NULL,
+    UNIQUE KEY uq_rehab_estimates_row (property_id, row_hash),
     FOREIGN KEY (property_id) REFERENCES properties(id)
 );
 
@@ -84,7 +198,79 @@ CREATE TABLE valuations (
     low_fmr DECIMAL(10,2),
     high_fmr DECIMAL(10,2),
     redfin_value DECIMAL(12,2),
+    row_hash BINARY(16) NOT NULL,
+    UNIQUE KEY uq_valuations_row (property_id, row_hash),
     FOREIGN KEY (property_id) REFERENCES properties(id) ON DELETE CASCADE
 );
 
+-- One row per property with its latest valuation, HOA total and rehab
+-- totals, kept current by the loaders (scripts/property_summary.py) so that
+-- dashboards read one row by primary key instead of joining the child tables
+-- refreshed_at changes with every refresh, so scripts/property_bundles.py
+-- uses it as the property's version; microseconds keep two writes apart
+CREATE TABLE property_summary (
+    property_id INT PRIMARY KEY,
+    valuation_count INT NOT NULL,
+    list_price DECIMAL(12,2),
+    previous_rent DECIMAL(10,2),
+    arv DECIMAL(12,2),
+    expected_rent DECIMAL(10,2),
+    zestimate DECIMAL(12,2),
+    rent_zestimate DECIMAL(10,2),
+    low_fmr DECIMAL(10,2),
+    high_fmr DECIMAL(10,2),
+    redfin_value DECIMAL(12,2),
+    hoa_count INT NOT NULL,
+    hoa_total DECIMAL(12,2),
+    hoa_flag VARCHAR(10),
+    rehab_count INT NOT NULL,
+    underwriting_rehab_total DECIMAL(14,2),
+    rehab_calculation_total DECIMAL(14,2),
+    paint VARCHAR(10),
+    flooring_flag VARCHAR(10),
+    foundation_flag VARCHAR(10),
+    roof_flag VARCHAR(10),
+    hvac_flag VARCHAR(10),
+    kitchen_flag VARCHAR(10),
+    bathroom_flag VARCHAR(10),
+    appliances_flag VARCHAR(10),
+    windows_flag VARCHAR(10),
+    landscaping_flag VARCHAR(10),
+    trashout_flag VARCHAR(10),
+    refreshed_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
 
+-- properties with the dimension names joined back in, for ad hoc queries
+CREATE VIEW property_details AS
+SELECT p.*,
+  d0.name AS reviewed_status,
+  d1.name AS most_recent_status,
+  d2.name AS source,
+  d3.name AS market,
+  d4.name AS occupancy,
+  d5.name AS flood,
+  d6.name AS property_type,
+  d7.name AS highway,
+  d8.name AS train,
+  d9.name AS water,
+  d10.name AS sewage,
+  d11.name AS parking,
+  d12.name AS layout,
+  d13.name AS selling_reason,
+  d14.name AS final_reviewer
+FROM properties p
+LEFT JOIN dim_reviewed_status d0 ON d0.id = p.reviewed_status_id
+LEFT JOIN dim_most_recent_status d1 ON d1.id = p.most_recent_status_id
+LEFT JOIN dim_source d2 ON d2.id = p.source_id
+LEFT JOIN dim_market d3 ON d3.id = p.market_id
+LEFT JOIN dim_occupancy d4 ON d4.id = p.occupancy_id
+LEFT JOIN dim_flood d5 ON d5.id = p.flood_id
+LEFT JOIN dim_property_type d6 ON d6.id = p.property_type_id
+LEFT JOIN dim_highway d7 ON d7.id = p.highway_id
+LEFT JOIN dim_train d8 ON d8.id = p.train_id
+LEFT JOIN dim_water d9 ON d9.id = p.water_id
+LEFT JOIN dim_sewage d10 ON d10.id = p.sewage_id
+LEFT JOIN dim_parking d11 ON d11.id = p.parking_id
+LEFT JOIN dim_layout d12 ON d12.id = p.layout_id
+LEFT JOIN dim_selling_reason d13 ON d13.id = p.selling_reason_id
+LEFT JOIN dim_final_reviewer d14 ON d14.id = p.final_reviewer_id;
@@ -0,0 +1,72 @@
+-- Adds the row_hash fingerprint and its (property_id, row_hash) unique index
+-- to child tables created before they were part of "Creation tables.sql".
+-- The hash is MD5 over the column values joined by CHAR(31), with NULL
+-- written as \N; row_fingerprint() in scripts/etl_script.py computes the
+-- same value for incoming rows. Exact duplicates are removed (lowest id kept)
+-- before the unique index is added.
+
+-- valuations
+ALTER TABLE valuations ADD COLUMN row_hash BINARY(16) NULL;
+
+UPDATE valuations SET row_hash = UNHEX(MD5(CONCAT_WS(CHAR(31),
+  COALESCE(CAST(list_price AS CHAR), '\\N'),
+  COALESCE(CAST(previous_rent AS CHAR), '\\N'),
+  COALESCE(CAST(arv AS CHAR), '\\N'),
+  COALESCE(CAST(expected_rent AS CHAR), '\\N'),
+  COALESCE(CAST(zestimate AS CHAR), '\\N'),
+  COALESCE(CAST(rent_zestimate AS CHAR), '\\N'),
+  COALESCE(CAST(low_fmr AS CHAR), '\\N'),
+  COALESCE(CAST(high_fmr AS CHAR), '\\N'),
+  COALESCE(CAST(redfin_value AS CHAR), '\\N')
+)));
+
+DELETE v FROM valuations v
+JOIN valuations keep
+  ON keep.property_id = v.property_id AND keep.row_hash = v.row_hash AND keep.id < v.id;
+
+ALTER TABLE valuations
+  MODIFY row_hash BINARY(16) NOT NULL,
+  ADD UNIQUE KEY uq_valuations_row (property_id, row_hash);
+
+-- hoa_fees
+ALTER TABLE hoa_fees ADD COLUMN row_hash BINARY(16) NULL;
+
+UPDATE hoa_fees SET row_hash = UNHEX(MD5(CONCAT_WS(CHAR(31),
+  COALESCE(CAST(hoa AS CHAR), '\\N'),
+  COALESCE(hoa_flag, '\\N')
+)));
+
+DELETE h FROM hoa_fees h
+JOIN hoa_fees keep
+  ON keep.property_id = h.property_id AND keep.row_hash = h.row_hash AND keep.id < h.id;
+
+ALTER TABLE hoa_fees
+  MODIFY row_hash BINARY(16) NOT NULL,
+  ADD UNIQUE KEY uq_hoa_fees_row (property_id, row_hash);
+
+-- rehab_estimates
+ALTER TABLE rehab_estimates ADD COLUMN row_hash BINARY(16) NULL;
+
+UPDATE rehab_estimates SET row_hash = UNHEX(MD5(CONCAT_WS(CHAR(31),
+  COALESCE(CAST(underwriting_rehab AS CHAR), '\\N'),
+  COALESCE(CAST(rehab_calculation AS CHAR), '\\N'),
+  COALESCE(paint, '\\N'),
+  COALESCE(flooring_flag, '\\N'),
+  COALESCE(foundation_flag, '\\N'),
+  COALESCE(roof_flag, '\\N'),
+  COALESCE(hvac_flag, '\\N'),
+  COALESCE(kitchen_flag, '\\N'),
+  COALESCE(bathroom_flag, '\\N'),
+  COALESCE(appliances_flag, '\\N'),
+  COALESCE(windows_flag, '\\N'),
+  COALESCE(landscaping_flag, '\\N'),
+  COALESCE(trashout_flag, '\\N')
+)));
+
+DELETE r FROM rehab_estimates r
+JOIN rehab_estimates keep
+  ON keep.property_id = r.property_id AND keep.row_hash = r.row_hash AND keep.id < r.id;
+
+ALTER TABLE rehab_estimates
+  MODIFY row_hash BINARY(16) NOT NULL,
+  ADD UNIQUE KEY uq_rehab_estimates_row (property_id, row_hash);
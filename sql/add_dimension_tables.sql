@@ -0,0 +1,263 @@
+-- Moves the low-cardinality properties attributes of a database created
+-- before "Creation tables.sql" had dimension tables into dim_* tables and
+-- replaces each text column with its <attribute>_id. Names are copied as
+-- exact binary strings, the same way scripts/dimensions.py adds them. Create
+-- the property_details view from "Creation tables.sql" afterwards.
+
+-- reviewed_status
+CREATE TABLE IF NOT EXISTS dim_reviewed_status (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_reviewed_status_name (name)
+);
+
+INSERT IGNORE INTO dim_reviewed_status (name)
+SELECT DISTINCT reviewed_status COLLATE utf8mb4_0900_bin FROM properties WHERE reviewed_status IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN reviewed_status_id SMALLINT UNSIGNED AFTER reviewed_status;
+
+UPDATE properties p
+JOIN dim_reviewed_status d ON d.name = p.reviewed_status COLLATE utf8mb4_0900_bin
+SET p.reviewed_status_id = d.id;
+
+-- most_recent_status
+CREATE TABLE IF NOT EXISTS dim_most_recent_status (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_most_recent_status_name (name)
+);
+
+INSERT IGNORE INTO dim_most_recent_status (name)
+SELECT DISTINCT most_recent_status COLLATE utf8mb4_0900_bin FROM properties WHERE most_recent_status IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN most_recent_status_id SMALLINT UNSIGNED AFTER most_recent_status;
+
+UPDATE properties p
+JOIN dim_most_recent_status d ON d.name = p.most_recent_status COLLATE utf8mb4_0900_bin
+SET p.most_recent_status_id = d.id;
+
+-- source
+CREATE TABLE IF NOT EXISTS dim_source (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_source_name (name)
+);
+
+INSERT IGNORE INTO dim_source (name)
+SELECT DISTINCT source COLLATE utf8mb4_0900_bin FROM properties WHERE source IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN source_id SMALLINT UNSIGNED AFTER source;
+
+UPDATE properties p
+JOIN dim_source d ON d.name = p.source COLLATE utf8mb4_0900_bin
+SET p.source_id = d.id;
+
+-- market
+CREATE TABLE IF NOT EXISTS dim_market (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_market_name (name)
+);
+
+INSERT IGNORE INTO dim_market (name)
+SELECT DISTINCT market COLLATE utf8mb4_0900_bin FROM properties WHERE market IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN market_id SMALLINT UNSIGNED AFTER market;
+
+UPDATE properties p
+JOIN dim_market d ON d.name = p.market COLLATE utf8mb4_0900_bin
+SET p.market_id = d.id;
+
+-- occupancy
+CREATE TABLE IF NOT EXISTS dim_occupancy (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_occupancy_name (name)
+);
+
+INSERT IGNORE INTO dim_occupancy (name)
+SELECT DISTINCT occupancy COLLATE utf8mb4_0900_bin FROM properties WHERE occupancy IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN occupancy_id SMALLINT UNSIGNED AFTER occupancy;
+
+UPDATE properties p
+JOIN dim_occupancy d ON d.name = p.occupancy COLLATE utf8mb4_0900_bin
+SET p.occupancy_id = d.id;
+
+-- flood
+CREATE TABLE IF NOT EXISTS dim_flood (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_flood_name (name)
+);
+
+INSERT IGNORE INTO dim_flood (name)
+SELECT DISTINCT flood COLLATE utf8mb4_0900_bin FROM properties WHERE flood IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN flood_id SMALLINT UNSIGNED AFTER flood;
+
+UPDATE properties p
+JOIN dim_flood d ON d.name = p.flood COLLATE utf8mb4_0900_bin
+SET p.flood_id = d.id;
+
+-- property_type
+CREATE TABLE IF NOT EXISTS dim_property_type (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_property_type_name (name)
+);
+
+INSERT IGNORE INTO dim_property_type (name)
+SELECT DISTINCT property_type COLLATE utf8mb4_0900_bin FROM properties WHERE property_type IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN property_type_id SMALLINT UNSIGNED AFTER property_type;
+
+UPDATE properties p
+JOIN dim_property_type d ON d.name = p.property_type COLLATE utf8mb4_0900_bin
+SET p.property_type_id = d.id;
+
+-- highway
+CREATE TABLE IF NOT EXISTS dim_highway (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_highway_name (name)
+);
+
+INSERT IGNORE INTO dim_highway (name)
+SELECT DISTINCT highway COLLATE utf8mb4_0900_bin FROM properties WHERE highway IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN highway_id SMALLINT UNSIGNED AFTER highway;
+
+UPDATE properties p
+JOIN dim_highway d ON d.name = p.highway COLLATE utf8mb4_0900_bin
+SET p.highway_id = d.id;
+
+-- train
+CREATE TABLE IF NOT EXISTS dim_train (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_train_name (name)
+);
+
+INSERT IGNORE INTO dim_train (name)
+SELECT DISTINCT train COLLATE utf8mb4_0900_bin FROM properties WHERE train IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN train_id SMALLINT UNSIGNED AFTER train;
+
+UPDATE properties p
+JOIN dim_train d ON d.name = p.train COLLATE utf8mb4_0900_bin
+SET p.train_id = d.id;
+
+-- water
+CREATE TABLE IF NOT EXISTS dim_water (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_water_name (name)
+);
+
+INSERT IGNORE INTO dim_water (name)
+SELECT DISTINCT water COLLATE utf8mb4_0900_bin FROM properties WHERE water IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN water_id SMALLINT UNSIGNED AFTER water;
+
+UPDATE properties p
+JOIN dim_water d ON d.name = p.water COLLATE utf8mb4_0900_bin
+SET p.water_id = d.id;
+
+-- sewage
+CREATE TABLE IF NOT EXISTS dim_sewage (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_sewage_name (name)
+);
+
+INSERT IGNORE INTO dim_sewage (name)
+SELECT DISTINCT sewage COLLATE utf8mb4_0900_bin FROM properties WHERE sewage IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN sewage_id SMALLINT UNSIGNED AFTER sewage;
+
+UPDATE properties p
+JOIN dim_sewage d ON d.name = p.sewage COLLATE utf8mb4_0900_bin
+SET p.sewage_id = d.id;
+
+-- parking
+CREATE TABLE IF NOT EXISTS dim_parking (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_parking_name (name)
+);
+
+INSERT IGNORE INTO dim_parking (name)
+SELECT DISTINCT parking COLLATE utf8mb4_0900_bin FROM properties WHERE parking IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN parking_id SMALLINT UNSIGNED AFTER parking;
+
+UPDATE properties p
+JOIN dim_parking d ON d.name = p.parking COLLATE utf8mb4_0900_bin
+SET p.parking_id = d.id;
+
+-- layout
+CREATE TABLE IF NOT EXISTS dim_layout (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_layout_name (name)
+);
+
+INSERT IGNORE INTO dim_layout (name)
+SELECT DISTINCT layout COLLATE utf8mb4_0900_bin FROM properties WHERE layout IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN layout_id SMALLINT UNSIGNED AFTER layout;
+
+UPDATE properties p
+JOIN dim_layout d ON d.name = p.layout COLLATE utf8mb4_0900_bin
+SET p.layout_id = d.id;
+
+-- selling_reason
+CREATE TABLE IF NOT EXISTS dim_selling_reason (
+    id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_selling_reason_name (name)
+);
+
+INSERT IGNORE INTO dim_selling_reason (name)
+SELECT DISTINCT selling_reason COLLATE utf8mb4_0900_bin FROM properties WHERE selling_reason IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN selling_reason_id INT UNSIGNED AFTER selling_reason;
+
+UPDATE properties p
+JOIN dim_selling_reason d ON d.name = p.selling_reason COLLATE utf8mb4_0900_bin
+SET p.selling_reason_id = d.id;
+
+-- final_reviewer
+CREATE TABLE IF NOT EXISTS dim_final_reviewer (
+    id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) COLLATE utf8mb4_0900_bin NOT NULL,
+    UNIQUE KEY uq_dim_final_reviewer_name (name)
+);
+
+INSERT IGNORE INTO dim_final_reviewer (name)
+SELECT DISTINCT final_reviewer COLLATE utf8mb4_0900_bin FROM properties WHERE final_reviewer IS NOT NULL;
+
+ALTER TABLE properties ADD COLUMN final_reviewer_id INT UNSIGNED AFTER final_reviewer;
+
+UPDATE properties p
+JOIN dim_final_reviewer d ON d.name = p.final_reviewer COLLATE utf8mb4_0900_bin
+SET p.final_reviewer_id = d.id;
+
+ALTER TABLE properties
+  DROP COLUMN reviewed_status,
+  DROP COLUMN most_recent_status,
+  DROP COLUMN source,
+  DROP COLUMN market,
+  DROP COLUMN occupancy,
+  DROP COLUMN flood,
+  DROP COLUMN property_type,
+  DROP COLUMN highway,
+  DROP COLUMN train,
+  DROP COLUMN water,
+  DROP COLUMN sewage,
+  DROP COLUMN parking,
+  DROP COLUMN layout,
+  DROP COLUMN selling_reason,
+  DROP COLUMN final_reviewer,
+  ADD KEY idx_properties_market_status (market_id, most_recent_status_id);
@@ -0,0 +1,10 @@
+-- Adds the (address, city, state) unique index to a database created before
+-- it was part of "Creation tables.sql". Existing duplicates must be merged
+-- first, otherwise the ALTER fails; this lists them.
+SELECT address, city, state, COUNT(*) AS copies, MIN(id) AS keep_id
+FROM properties
+GROUP BY address, city, state
+HAVING COUNT(*) > 1;
+
+ALTER TABLE properties
+  ADD UNIQUE KEY uq_properties_natural_key (address, city, state);
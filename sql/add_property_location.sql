@@ -0,0 +1,17 @@
+-- Adds the generated location point and its SPATIAL index to a database
+-- created before they were part of "Creation tables.sql". The ALTER copies
+-- properties once, computing the point of every existing row. WKT in SRID
+-- 4326 is read latitude first. Rows with missing or out-of-range coordinates
+-- get POINT(0 0) and are left out by scripts/geo_search.py.
+ALTER TABLE properties
+  ADD COLUMN location POINT SRID 4326 GENERATED ALWAYS AS (ST_PointFromText(
+      IF(latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180,
+         CONCAT('POINT(', latitude, ' ', longitude, ')'), 'POINT(0 0)'),
+      4326)) STORED NOT NULL,
+  ADD SPATIAL KEY idx_properties_location (location);
+
+-- Rows the searches leave out
+SELECT COUNT(*) AS without_location
+FROM properties
+WHERE NOT (latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180)
+   OR latitude IS NULL OR longitude IS NULL;
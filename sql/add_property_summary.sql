@@ -0,0 +1,35 @@
+-- Adds the property_summary read model to a database created before it was
+-- part of "Creation tables.sql". Fill it afterwards with
+-- `python scripts/property_summary.py`; from then on the loaders keep the
+-- rows of every property they touch up to date.
+CREATE TABLE property_summary (
+    property_id INT PRIMARY KEY,
+    valuation_count INT NOT NULL,
+    list_price DECIMAL(12,2),
+    previous_rent DECIMAL(10,2),
+    arv DECIMAL(12,2),
+    expected_rent DECIMAL(10,2),
+    zestimate DECIMAL(12,2),
+    rent_zestimate DECIMAL(10,2),
+    low_fmr DECIMAL(10,2),
+    high_fmr DECIMAL(10,2),
+    redfin_value DECIMAL(12,2),
+    hoa_count INT NOT NULL,
+    hoa_total DECIMAL(12,2),
+    hoa_flag VARCHAR(10),
+    rehab_count INT NOT NULL,
+    underwriting_rehab_total DECIMAL(14,2),
+    rehab_calculation_total DECIMAL(14,2),
+    paint VARCHAR(10),
+    flooring_flag VARCHAR(10),
+    foundation_flag VARCHAR(10),
+    roof_flag VARCHAR(10),
+    hvac_flag VARCHAR(10),
+    kitchen_flag VARCHAR(10),
+    bathroom_flag VARCHAR(10),
+    appliances_flag VARCHAR(10),
+    windows_flag VARCHAR(10),
+    landscaping_flag VARCHAR(10),
+    trashout_flag VARCHAR(10),
+    refreshed_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
@@ -0,0 +1,9 @@
+-- Switches the natural key columns of a database created before they had an
+-- explicit collation to utf8mb4_bin, which the loaders' match_key() mirrors.
+-- The default utf8mb4_0900_ai_ci also matches keys that differ in accents,
+-- which the loaders could not tell apart. A binary collation only makes the
+-- unique index stricter, so existing rows never conflict.
+ALTER TABLE properties
+  MODIFY address VARCHAR(255) COLLATE utf8mb4_bin,
+  MODIFY city VARCHAR(100) COLLATE utf8mb4_bin,
+  MODIFY state CHAR(2) COLLATE utf8mb4_bin;
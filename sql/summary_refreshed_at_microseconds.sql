@@ -0,0 +1,6 @@
+-- Gives property_summary.refreshed_at microsecond precision on a database
+-- created before it had it. scripts/property_bundles.py compares it to tell
+-- whether a cached bundle is current, and with whole seconds two writes in
+-- the same second would look like one.
+ALTER TABLE property_summary
+  MODIFY refreshed_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6);
@@ -41,4 +41,23 @@ LEFT JOIN hoa_fees h ON p.id = h.property_id
 LEFT JOIN rehab_estimates r ON p.id = r.property_id
 LIMIT 10;
 
+-- The same figures from the property_summary read model, one row per
+-- property without the child fan-out
+SELECT
+  p.id, p.address, p.city, p.state,
+  s.list_price, s.expected_rent,
+  s.hoa_total, s.rehab_calculation_total
+FROM properties p
+JOIN property_summary s ON s.property_id = p.id
+LIMIT 10;
+
+-- Properties missing from property_summary (should be empty)
+SELECT p.id, p.address FROM properties p
+LEFT JOIN property_summary s ON s.property_id = p.id
+WHERE s.property_id IS NULL;
 
+-- Duplicate natural keys (should be empty with uq_properties_natural_key)
+SELECT address, city, state, COUNT(*) AS copies
+FROM properties
+GROUP BY address, city, state
+HAVING COUNT(*) > 1;
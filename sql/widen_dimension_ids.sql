@@ -0,0 +1,9 @@
+-- Widens the ids of the free-text dimensions on a database that was
+-- converted with an earlier add_dimension_tables.sql, where they were
+-- SMALLINT. Their names have many distinct values, and an insert that meets
+-- a name already there still uses up an id, so 65,535 can run out.
+ALTER TABLE dim_selling_reason MODIFY id INT UNSIGNED NOT NULL AUTO_INCREMENT;
+ALTER TABLE dim_final_reviewer MODIFY id INT UNSIGNED NOT NULL AUTO_INCREMENT;
+ALTER TABLE properties
+  MODIFY selling_reason_id INT UNSIGNED,
+  MODIFY final_reviewer_id INT UNSIGNED;
@@ -0,0 +1,46 @@
+import copy
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts"))
+
+from checkpoints import filter_changed, open_store, save_fingerprints, store_key  # noqa: E402
+from generate_feed import generate_records  # noqa: E402
+from validation import apply_coerced, validate_chunk  # noqa: E402
+
+def key(record):
+    return (record.get("Address"), record.get("City"), record.get("State"))
+
+def validated(records):
+    # What transform_batch hands filter_changed under --validate
+    records = copy.deepcopy(records)
+    columns, codes, _ = validate_chunk(records)
+    apply_coerced(records, columns)
+    return [record for record, code in zip(records, codes) if not code]
+
+class ValidateIncrementalTest(unittest.TestCase):
+    # --validate --incremental fingerprints records holding Decimal values
+
+    def setUp(self):
+        self.store = open_store(":memory:")
+        self.records = list(generate_records(200, seed=1))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_coerced_records_are_fingerprinted(self):
+        kept, changed, fingerprints = filter_changed(self.store, validated(self.records), key)
+        self.assertTrue(kept)
+        self.assertFalse(changed)
+        self.assertEqual(len(fingerprints), len({store_key(key(r)) for r in kept}))
+
+    def test_rerun_skips_unchanged_records(self):
+        _, _, fingerprints = filter_changed(self.store, validated(self.records), key)
+        save_fingerprints(self.store, fingerprints)
+        kept, changed, pending = filter_changed(self.store, validated(self.records), key)
+        self.assertEqual((kept, changed, pending), ([], set(), {}))
+
+if __name__ == "__main__":
+    unittest.main()
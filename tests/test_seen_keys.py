@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts"))
+
+import seen_keys  # noqa: E402
+
+class SpilledKeySetTest(unittest.TestCase):
+    # A key set past its memory budget, spilled to sorted runs
+
+    def setUp(self):
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.keyset = seen_keys.open_key_set(0, spill_dir=self.spill_dir.name)
+        self.keyset["budget"] = 50
+        self.digests = [seen_keys.key_digest(f"key {i}") for i in range(2000)]
+        for start in range(0, len(self.digests), 40):
+            seen_keys.add(self.keyset, self.digests[start:start + 40])
+
+    def tearDown(self):
+        seen_keys.close_key_set(self.keyset)
+        self.spill_dir.cleanup()
+
+    def test_every_added_key_is_seen(self):
+        self.assertTrue(self.keyset["runs"])
+        self.assertEqual(seen_keys.seen_before(self.keyset, self.digests), set(self.digests))
+
+    def test_new_keys_are_not_seen(self):
+        new = [seen_keys.key_digest(f"other {i}") for i in range(500)]
+        self.assertEqual(seen_keys.seen_before(self.keyset, new), set())
+
+    def test_runs_leave_no_files_behind(self):
+        # Run files are unlinked while open, so a killed run cannot leave them
+        self.assertEqual(os.listdir(self.spill_dir.name), [])
+
+if __name__ == "__main__":
+    unittest.main()
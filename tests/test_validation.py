@@ -0,0 +1,145 @@
+import os
+import sys
+import unittest
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts"))
+
+from generate_feed import generate_records  # noqa: E402
+from validation import (INVALID_BED, INVALID_COORDINATES, INVALID_TAX_RATE,  # noqa: E402
+                        INVALID_TAX_RATE_TYPE, INVALID_TYPE, apply_coerced, describe,
+                        validate_chunk)
+
+def baseline_reasons(prop):
+    # validate_property() from data/etl_with_validation.py before the rules
+    # moved to scripts/validation.py, without the Pool value in its reason
+    errors = []
+    for field in ("Address", "City", "State", "Zip"):
+        if not prop.get(field):
+            errors.append(f"Missing {field}")
+    try:
+        float(prop.get("Latitude", 0))
+        float(prop.get("Longitude", 0))
+    except (ValueError, TypeError):
+        errors.append("Invalid coordinates")
+    try:
+        if prop.get("Tax_Rate") and not (0 <= float(prop["Tax_Rate"]) <= 100):
+            errors.append("Invalid Tax_Rate")
+    except (ValueError, TypeError):
+        errors.append("Invalid Tax_Rate type")
+    try:
+        if int(prop.get("Bed", 0)) < 0:
+            errors.append("Negative bed count")
+    except (ValueError, TypeError):
+        errors.append("Invalid bed count")
+    if prop.get("Pool") not in ("Yes", "No", None):
+        errors.append("Unexpected Pool value")
+    return errors
+
+def base_record():
+    record = next(iter(generate_records(1, seed=1)))
+    record.update(Latitude="30.25", Longitude="-97.75", Tax_Rate="1.5", Bed="3", Bath="2",
+                  Pool="No", State="TX", Year_Built="1990")
+    return record
+
+def with_value(field, value):
+    record = base_record()
+    if value is Ellipsis:
+        del record[field]
+    else:
+        record[field] = value
+    return record
+
+def validated(records):
+    _, codes, bad_fields = validate_chunk(records)
+    return [describe(code, bad_fields.get(i, ())) for i, code in enumerate(codes)]
+
+# Values whose outcome is the same as under validate_property; Ellipsis
+# removes the field from the record
+UNCHANGED = {
+    "Address": [Ellipsis, None, ""],
+    "City": [Ellipsis, ""],
+    "State": [Ellipsis, None],
+    "Zip": [Ellipsis, ""],
+    "Latitude": [Ellipsis, None, "", "  ", "north", "45.5", -12],
+    "Longitude": [Ellipsis, None, "", "  ", "west", "-120.25"],
+    "Tax_Rate": [Ellipsis, None, "", 0, "abc", "150", -1, "99.99"],
+    "Bed": [Ellipsis, None, "", " ", "many", "2.5", "-1", -4, "0", 7],
+    "Pool": [Ellipsis, None, "Yes", "No", "Maybe", "yes"],
+}
+
+class BaselineRulesTest(unittest.TestCase):
+    # validate_chunk gives the reasons the per-record rules gave
+
+    def test_base_record_is_valid(self):
+        self.assertEqual(validated([base_record()]), [[]])
+
+    def test_same_reasons_as_validate_property(self):
+        for field, values in UNCHANGED.items():
+            records = [with_value(field, value) for value in values]
+            for value, record, reasons in zip(values, records, validated(records)):
+                with self.subTest(field=field, value=value):
+                    self.assertEqual(sorted(reasons), sorted(baseline_reasons(record)))
+
+    def test_blank_coordinates_and_bed_are_rejected(self):
+        records = [with_value("Latitude", ""), with_value("Longitude", "  "),
+                   with_value("Bed", "")]
+        _, codes, _ = validate_chunk(records)
+        self.assertEqual([code & (INVALID_COORDINATES | INVALID_BED) for code in codes],
+                         [INVALID_COORDINATES, INVALID_COORDINATES, INVALID_BED])
+
+    def test_rows_are_independent(self):
+        records = [base_record(), with_value("Bed", "x"), base_record(), with_value("Zip", "")]
+        self.assertEqual(validated(records),
+                         [[], ["Invalid bed count"], [], ["Missing Zip"]])
+
+class ChangedRulesTest(unittest.TestCase):
+    # Deliberate differences from validate_property
+
+    def test_pool_reason_leaves_out_the_value(self):
+        self.assertEqual(validated([with_value("Pool", "Maybe")]), [["Unexpected Pool value"]])
+
+    def test_tax_rate_outside_its_column_is_a_type_error(self):
+        _, codes, _ = validate_chunk([with_value("Tax_Rate", "5000")])
+        self.assertEqual(codes, [INVALID_TAX_RATE_TYPE])
+        _, codes, _ = validate_chunk([with_value("Tax_Rate", "150")])
+        self.assertEqual(codes, [INVALID_TAX_RATE])
+
+    def test_coordinates_off_the_globe_are_rejected(self):
+        _, codes, _ = validate_chunk([with_value("Latitude", "90.5"),
+                                      with_value("Longitude", -180.5)])
+        self.assertEqual(codes, [INVALID_COORDINATES, INVALID_COORDINATES])
+
+    def test_fields_without_a_rule_must_fit_their_column(self):
+        cases = [("Year_Built", "nineteen ninety"), ("Year_Built", "1990.5"), ("State", "TEX"),
+                 ("Bath", "2.5"), ("Bath", 1.5)]
+        _, codes, bad_fields = validate_chunk([with_value(field, value) for field, value in cases])
+        self.assertEqual(codes, [INVALID_TYPE] * len(cases))
+        self.assertEqual([bad_fields[row] for row in range(len(cases))],
+                         [[field] for field, _ in cases])
+
+    def test_fractional_bed_is_rejected(self):
+        _, codes, _ = validate_chunk([with_value("Bed", 2.5), with_value("Bed", "2.0")])
+        self.assertEqual(codes, [INVALID_BED, 0])
+
+class ApplyCoercedTest(unittest.TestCase):
+
+    def test_values_take_their_column_type(self):
+        records = [base_record()]
+        columns, codes, _ = validate_chunk(records)
+        apply_coerced(records, columns)
+        record = records[0]
+        self.assertEqual(codes, [0])
+        self.assertEqual((record["Latitude"], record["Tax_Rate"], record["Bed"], record["Pool"]),
+                         (Decimal("30.250000"), Decimal("1.50"), 3, "No"))
+
+    def test_missing_fields_stay_missing(self):
+        records = [with_value("Bed", Ellipsis), with_value("Tax_Rate", "")]
+        columns, _, _ = validate_chunk(records)
+        apply_coerced(records, columns)
+        self.assertNotIn("Bed", records[0])
+        self.assertIsNone(records[1]["Tax_Rate"])
+
+if __name__ == "__main__":
+    unittest.main()